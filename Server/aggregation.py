@@ -0,0 +1,313 @@
+"""
+Aggregation strategies for federated model updates, selected by the contract's "aggregation".
+Reference: McMahan, H. B., et al. (2017). "Communication-Efficient Learning of Deep Networks from Decentralized Data." AISTATS.
+
+Each strategy folds client updates in with add(update, weight) and returns the
+new global weights from aggregate(global_weights); reset() starts a new round.
+"""
+import numpy as np
+
+
+class StreamingAggregator:
+    """
+    Folds client updates into a running weighted sum as they arrive (FedAvg, McMahan et al. 2017).
+    Memory stays O(model size) regardless of how many clients report.
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Start a new round with an empty accumulator."""
+        self.weighted_sum = None
+        self.total_weight = 0.0
+        self.num_updates = 0
+
+    def add(self, update, weight=1.0):
+        """Fold one update into the accumulator, weighted by its sample count."""
+        update = np.asarray(update, dtype=np.float64)
+        weight = float(weight)
+        if weight <= 0:
+            raise ValueError(f"Update weight must be positive, got {weight}")
+        if self.weighted_sum is None:
+            self.weighted_sum = np.zeros(update.shape[0], dtype=np.float64)
+        elif update.shape != self.weighted_sum.shape:
+            raise ValueError(f"Update has {update.size} weights, expected {self.weighted_sum.size}")
+        # weighted_sum += weight * update without a temporary copy of the update
+        if weight == 1.0:
+            np.add(self.weighted_sum, update, out=self.weighted_sum)
+        else:
+            self.weighted_sum += weight * update
+        self.total_weight += weight
+        self.num_updates += 1
+
+    def add_partial(self, weighted_sum, total_weight, num_updates):
+        """
+        Fold in another accumulator's weighted_sum and total_weight, e.g. an edge
+        server's pre-aggregated clients; the weighted average is unchanged by the grouping.
+        """
+        weighted_sum = np.asarray(weighted_sum, dtype=np.float64)
+        total_weight = float(total_weight)
+        if total_weight <= 0 or num_updates <= 0:
+            raise ValueError(f"Partial aggregate must cover positive weight, got {total_weight}")
+        if self.weighted_sum is None:
+            self.weighted_sum = weighted_sum.copy()
+        elif weighted_sum.shape != self.weighted_sum.shape:
+            raise ValueError(f"Partial has {weighted_sum.size} weights, expected {self.weighted_sum.size}")
+        else:
+            np.add(self.weighted_sum, weighted_sum, out=self.weighted_sum)
+        self.total_weight += total_weight
+        self.num_updates += num_updates
+
+    def checkpoint_state(self):
+        """Arrays and values that must survive a restart, besides the logged updates."""
+        return {}
+
+    def restore_state(self, state):
+        pass
+
+    def result(self):
+        """Weighted average of all folded updates."""
+        if self.num_updates == 0:
+            raise ValueError("No updates to aggregate")
+        return self.weighted_sum / self.total_weight
+
+
+class FedAvg(StreamingAggregator):
+    """Sample-count-weighted average of the client models (McMahan et al. 2017)."""
+    @classmethod
+    def from_params(cls, params):
+        return cls()
+
+    def aggregate(self, global_weights):
+        return self.result()
+
+
+class FedAvgM(StreamingAggregator):
+    """
+    FedAvg with server momentum (Hsu et al. 2019). The averaged round delta is
+    treated as a pseudo-gradient: v <- momentum * v + (w - avg), w <- w - server_lr * v.
+    Reference: Hsu, T. H., Qi, H., & Brown, M. (2019). "Measuring the Effects of Non-Identical
+    Data Distribution for Federated Visual Classification." arXiv:1909.06335.
+    """
+    def __init__(self, server_lr=1.0, momentum=0.9):
+        self.server_lr = server_lr
+        self.momentum = momentum
+        # Velocity carries over between rounds
+        self.velocity = None
+        super().__init__()
+
+    @classmethod
+    def from_params(cls, params):
+        return cls(server_lr=params.get("server_lr", 1.0), momentum=params.get("momentum", 0.9))
+
+    def checkpoint_state(self):
+        return {} if self.velocity is None else {"velocity": self.velocity}
+
+    def restore_state(self, state):
+        if "velocity" in state:
+            self.velocity = np.array(state["velocity"], dtype=np.float64)
+
+    def aggregate(self, global_weights):
+        pseudo_gradient = global_weights - self.result()
+        if self.velocity is None:
+            self.velocity = pseudo_gradient
+        else:
+            self.velocity *= self.momentum
+            self.velocity += pseudo_gradient
+        return global_weights - self.server_lr * self.velocity
+
+
+class FedNova(StreamingAggregator):
+    """
+    Normalized averaging (Wang et al. 2020). Clients that ran more local steps
+    move further from the global weights, so FedAvg leans towards them. FedNova
+    divides each client's change by its local steps tau_i, averages the
+    normalized changes by sample count p_i, and scales the result by the
+    effective step count tau_eff = sum(p_i tau_i):
+    w <- w + tau_eff * sum(p_i (w_i - w) / tau_i). With equal tau_i it equals FedAvg.
+    Reference: Wang, J., Liu, Q., Liang, H., Joshi, G., & Poor, H. V. (2020). "Tackling the Objective
+    Inconsistency Problem in Heterogeneous Federated Optimization." NeurIPS.
+    """
+    @classmethod
+    def from_params(cls, params):
+        return cls()
+
+    def reset(self):
+        super().reset()
+        # Sum of sample counts and of sample count x local steps; the running sum is weighted by p_i / tau_i
+        self.sample_weight = 0.0
+        self.weighted_steps = 0.0
+
+    def add(self, update, weight=1.0, local_steps=1):
+        """Fold one update in, weighted by its sample count over the local steps that produced it."""
+        local_steps = float(local_steps)
+        if local_steps <= 0:
+            raise ValueError(f"Local steps must be positive, got {local_steps}")
+        super().add(update, float(weight) / local_steps)
+        self.sample_weight += float(weight)
+        self.weighted_steps += float(weight) * local_steps
+
+    def add_partial(self, weighted_sum, total_weight, num_updates):
+        raise ValueError("FedNova needs each client's local steps and cannot combine partial aggregates")
+
+    def aggregate(self, global_weights):
+        # sum(p_i (w_i - w) / tau_i) = total_weight / sample_weight * (result() - w)
+        tau_eff = self.weighted_steps / self.sample_weight
+        scale = tau_eff * self.total_weight / self.sample_weight
+        return global_weights + scale * (self.result() - global_weights)
+
+
+def local_steps(metadata):
+    """Local SGD steps behind an upload, from its training_metadata (epochs for older clients)."""
+    training_metadata = (metadata or {}).get("training_metadata") or {}
+    steps = training_metadata.get("local_steps") or training_metadata.get("epochs_completed")
+    return steps or 1
+
+
+class CoordinateWiseAggregator:
+    """
+    Base for robust coordinate-wise statistics (Yin et al. 2018), which need every
+    update of the round. Updates are copied into the columns of a preallocated
+    params x clients matrix, reused across rounds and doubled when it fills up, so
+    each coordinate's values are contiguous for np.partition.
+    The statistics are unweighted: sample counts reported by clients are not trusted.
+    Reference: Yin, D., Chen, Y., Ramchandran, K., & Bartlett, P. (2018). "Byzantine-Robust
+    Distributed Learning: Towards Optimal Statistical Rates." ICML.
+    """
+    def __init__(self, capacity=8):
+        self.capacity = max(1, capacity)
+        self.updates = None
+        self.reset()
+
+    def reset(self):
+        self.num_updates = 0
+
+    def checkpoint_state(self):
+        return {}
+
+    def restore_state(self, state):
+        pass
+
+    def add(self, update, weight=1.0):
+        update = np.asarray(update, dtype=np.float64)
+        if self.num_updates and update.shape != self.updates.shape[:1]:
+            raise ValueError(f"Update has {update.size} weights, expected {self.updates.shape[0]}")
+        if self.updates is None or self.updates.shape[0] != update.shape[0]:
+            # Only at the start of a round, e.g. after the model size changed
+            self.updates = np.empty((update.shape[0], self.capacity), dtype=np.float64)
+        elif self.num_updates == self.updates.shape[1]:
+            grown = np.empty((self.updates.shape[0], 2 * self.updates.shape[1]), dtype=np.float64)
+            grown[:, :self.num_updates] = self.updates
+            self.updates = grown
+        self.updates[:, self.num_updates] = update
+        self.num_updates += 1
+
+    def _columns(self):
+        if self.num_updates == 0:
+            raise ValueError("No updates to aggregate")
+        return self.updates[:, :self.num_updates]
+
+
+class TrimmedMean(CoordinateWiseAggregator):
+    """Coordinate-wise mean after dropping the trim_ratio largest and smallest values (Yin et al. 2018)."""
+    def __init__(self, trim_ratio=0.1, capacity=8):
+        if not 0 <= trim_ratio < 0.5:
+            raise ValueError(f"trim_ratio must be in [0, 0.5), got {trim_ratio}")
+        self.trim_ratio = trim_ratio
+        super().__init__(capacity)
+
+    @classmethod
+    def from_params(cls, params, capacity=8):
+        return cls(trim_ratio=params.get("trim_ratio", 0.1), capacity=capacity)
+
+    def aggregate(self, global_weights):
+        values = self._columns()
+        n = self.num_updates
+        k = int(self.trim_ratio * n)
+        if k:
+            # Two O(n) selections in place instead of a sort: the k largest go to the
+            # end, then the k smallest of the rest to the front
+            values.partition(n - k - 1, axis=1)
+            values[:, :n - k].partition(k, axis=1)
+        return values[:, k:n - k].mean(axis=1)
+
+
+class Median(CoordinateWiseAggregator):
+    """Coordinate-wise median (Yin et al. 2018), by in-place selection with np.partition."""
+    @classmethod
+    def from_params(cls, params, capacity=8):
+        return cls(capacity=capacity)
+
+    def aggregate(self, global_weights):
+        values = self._columns()
+        n = self.num_updates
+        values.partition(n // 2, axis=1)
+        upper = values[:, n // 2].copy()
+        if n % 2:
+            return upper
+        # Even count: the lower middle value is the largest of the lower half
+        upper += values[:, :n // 2].max(axis=1)
+        upper *= 0.5
+        return upper
+
+
+# Synchronous strategies by contract "aggregation" name
+STRATEGIES = {
+    "FedAvg": FedAvg,
+    "FedAvgM": FedAvgM,
+    "FedNova": FedNova,
+    "TrimmedMean": TrimmedMean,
+    "Median": Median,
+}
+
+
+def create_strategy(name, params=None, expected_clients=8):
+    """Build the strategy named in the contract; expected_clients sizes the robust strategies' matrix."""
+    if name not in STRATEGIES:
+        raise ValueError(f"Unknown aggregation strategy: {name} (expected one of {', '.join(STRATEGIES)})")
+    strategy = STRATEGIES[name]
+    if issubclass(strategy, CoordinateWiseAggregator):
+        return strategy.from_params(params or {}, capacity=expected_clients)
+    return strategy.from_params(params or {})
+
+
+def polynomial_staleness(staleness, exponent=0.5):
+    """
+    Polynomial staleness discount s(t - tau) = (1 + t - tau)^(-a) (Xie et al. 2019, FedAsync).
+    Reference: Xie, C., Koyejo, S., & Gupta, I. (2019). "Asynchronous Federated Optimization." arXiv:1903.03934.
+    """
+    return (1.0 + staleness) ** -exponent
+
+
+class BufferedAsyncAggregator(StreamingAggregator):
+    """
+    Buffered asynchronous aggregation (FedBuff, Nguyen et al. 2022).
+    Client deltas are folded in as they arrive, each discounted by its staleness,
+    and applied to the global weights once buffer_size of them have been buffered:
+    w <- w + server_lr * sum(n_i * s_i * delta_i) / sum(n_i).
+    Reference: Nguyen, J., et al. (2022). "Federated Learning with Buffered Asynchronous Aggregation." AISTATS.
+    """
+    def __init__(self, buffer_size=10, server_lr=1.0, staleness_exponent=0.5):
+        self.buffer_size = buffer_size
+        self.server_lr = server_lr
+        self.staleness_exponent = staleness_exponent
+        super().__init__()
+
+    def reset(self):
+        super().reset()
+        self.total_staleness = 0
+
+    def add(self, delta, weight=1.0, staleness=0):
+        """Fold one delta into the buffer; the discount scales the delta but not its weight."""
+        total_weight = self.total_weight
+        discount = polynomial_staleness(staleness, self.staleness_exponent)
+        super().add(delta, weight * discount)
+        self.total_weight = total_weight + float(weight)
+        self.total_staleness += staleness
+
+    def ready(self):
+        return self.num_updates >= self.buffer_size
+
+    def aggregate(self, weights):
+        """New global weights from the buffered deltas."""
+        return weights + self.server_lr * self.result()
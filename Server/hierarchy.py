@@ -0,0 +1,165 @@
+"""
+Hierarchical aggregation: edge servers take uploads from a subset of the clients
+and forward one pre-aggregated partial to the root server, which closes the round.
+Reference: Liu, L., Zhang, J., Song, S. H., & Letaief, K. B. (2020). "Client-Edge-Cloud
+Hierarchical Federated Learning." ICC.
+
+FedAvg's result sum_i(n_i * w_i) / sum_i(n_i) does not depend on how the sums are
+grouped, so an edge folds its clients' updates into a weighted sum and total
+weight, and the root adds up those partials (RoundState.submit_partial) exactly
+as if every client had uploaded to it. The root receives one dense vector per
+partial instead of one per client.
+
+An edge mirrors the root's published rounds (RoundState.mirror) to answer
+/join and /sync and to decode compressed uploads locally.
+"""
+import os
+import threading
+import time
+import numpy as np
+import requests
+from aggregation import StreamingAggregator
+from flclient import wire
+from flclient.api import ServerAPI
+from flclient.compression import xor_delta_decode
+
+
+class EdgeAggregator:
+    """
+    Edge side of hierarchical aggregation. Client updates are folded into a
+    partial weighted sum; every batch_size updates (and on flush) the partial is
+    sent to the root's /partial endpoint. A partial the root did not acknowledge
+    is kept and resent with the same partial_id, which the root deduplicates.
+    """
+    def __init__(self, root_url, state, join_code, edge_id=None, batch_size=10):
+        self.api = ServerAPI(root_url, wire_format="binary")
+        self.state = state
+        self.join_code = join_code
+        self.edge_id = edge_id or f"edge-{os.getpid()}"
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        # Partial ids are unique across restarts of the edge
+        self._nonce = os.urandom(4).hex()
+        self._seq = 0
+        self.partial = StreamingAggregator()
+        self.clients = {}
+        # Clients already counted for each recent round_id, so retried uploads are dropped
+        self.contributors = {}
+        # Partials that could not be delivered yet
+        self.unsent = []
+        self.etag = None
+        self.partials_sent = 0
+
+    def refresh(self):
+        """Mirror the root's current round. Returns True if a new round was published."""
+        round_id, weights = self.state.current()
+        known_round = round_id if weights is not None else None
+        data = self.api.sync_contract(self.join_code, etag=self.etag, known_round=known_round,
+                                      known_tag=self.state.tag(round_id) if weights is not None else None)
+        if data is None:
+            return False
+        self.etag = data.get("etag")
+        if "initial_weights" in data:
+            weights = np.asarray(data["initial_weights"], dtype=np.float64)
+        elif "weights_delta" in data:
+            base = self.state.snapshot(data["weights_delta"]["base_round"])
+            weights = xor_delta_decode(data["weights_delta"], base)
+        return self.state.mirror(data["round_id"], weights)
+
+    def connect(self, timeout=30):
+        """Join the root, waiting up to timeout seconds for it to start."""
+        deadline = time.time() + timeout
+        while True:
+            try:
+                data = self.api.join_round(self.join_code, {"username": self.edge_id})
+                break
+            except requests.ConnectionError:
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.2)
+        self.etag = None
+        self.state.mirror(data["round_id"], np.asarray(data["initial_weights"], dtype=np.float64))
+
+    def submit(self, client_id, update, weight, metadata, update_round=None):
+        """
+        Fold one client's dense update into the partial. Returns (status, batch),
+        where batch is a partial to forward now, or None.
+        """
+        round_id, weights = self.state.current()
+        update_round = round_id if update_round is None else update_round
+        if weights is not None and len(update) != weights.shape[0]:
+            raise ValueError(f"Update has {len(update)} weights, expected {weights.shape[0]}")
+        with self._lock:
+            if client_id in self.contributors.get(update_round, ()) or client_id in self.clients:
+                return "duplicate", None
+            self.partial.add(update, weight)
+            self.clients[client_id] = metadata
+            self.contributors.setdefault(update_round, set()).add(client_id)
+            for old_round in [r for r in self.contributors if r <= round_id - self.state.snapshot_history]:
+                del self.contributors[old_round]
+            if self.partial.num_updates < self.batch_size:
+                return "received", None
+            return "received", self._take()
+
+    def _take(self):
+        """Turn the open partial into a batch to forward, under the lock."""
+        if self.partial.num_updates == 0:
+            return None
+        self._seq += 1
+        batch = {
+            "join_code": self.join_code,
+            "partial_id": f"{self.edge_id}-{self._nonce}-{self._seq}",
+            "round_id": self.state.round_id,
+            "weighted_sum": self.partial.weighted_sum,
+            "total_weight": self.partial.total_weight,
+            "clients": self.clients,
+        }
+        self.partial.reset()
+        self.clients = {}
+        return batch
+
+    def flush(self, batch=None):
+        """
+        Forward batch (or the open partial) and any earlier undelivered partials
+        to the root. Returns the root's current round, or None if it was unreachable.
+        """
+        with self._lock:
+            if batch is None:
+                batch = self._take()
+            pending, self.unsent = self.unsent, []
+        if batch is not None:
+            pending.append(batch)
+        current_round = None
+        for i, batch in enumerate(pending):
+            try:
+                response = self.api._post("/partial", data=wire.encode(batch), headers={
+                    "Content-Type": wire.CONTENT_TYPE, "Accept": wire.JSON_CONTENT_TYPE})
+                result = self.api._handle_response(response, "forward partial")
+            except (requests.ConnectionError, requests.Timeout) as e:
+                print(f"Root unreachable, keeping {len(pending) - i} partials: {e}")
+                with self._lock:
+                    self.unsent = pending[i:] + self.unsent
+                return current_round
+            except Exception as e:
+                # The root rejected the partial; resending it would fail the same way
+                print(f"Dropping partial {batch['partial_id']} of {len(batch['clients'])} updates: {e}")
+                continue
+            self.partials_sent += 1
+            current_round = result.get("current_round")
+        if current_round is not None and current_round > self.state.round_id:
+            try:
+                self.refresh()
+            except Exception as e:
+                # The background sync picks the round up later
+                print(f"Could not fetch round {current_round} from the root: {e}")
+        return current_round
+
+    def run(self, interval, stop=None):
+        """Every interval seconds, forward the open partial and pick up the root's new rounds."""
+        stop = stop or threading.Event()
+        while not stop.wait(interval):
+            try:
+                self.flush()
+                self.refresh()
+            except Exception as e:
+                print(f"Edge sync with root failed: {e}")
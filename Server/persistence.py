@@ -0,0 +1,175 @@
+"""
+Crash-safe persistence of the round state: per-round checkpoints plus a
+write-ahead log (WAL) of the updates received since the last checkpoint.
+Reference: Mohan, C., et al. (1992). "ARIES: A Transaction Recovery Method Supporting
+Fine-Granularity Locking and Partial Rollbacks Using Write-Ahead Logging." ACM TODS.
+
+Directory layout:
+    checkpoint-<round>.flw   global weights of a round, plus the state needed to resume it
+    wal-<round>.log          updates folded into the open round, one framed record each
+
+Checkpoints are written to a temporary file, fsynced and atomically renamed, so
+a crash leaves either the old or the new checkpoint. Each WAL record is framed
+as uint32 length | uint32 CRC-32 | wire-encoded record; a torn record at the end
+of the log (from a crash mid-write) fails its length or CRC check and is dropped.
+
+Durability uses group commit: request threads append records without syncing,
+then wait until an fsync covers them. One waiting thread issues the fsync for
+every record written so far while the others wait for it, so under load many
+uploads share one fsync.
+"""
+import glob
+import os
+import struct
+import threading
+import zlib
+from flclient import wire
+
+_FRAME = struct.Struct("<II")
+
+
+class StateStore:
+    """
+    Checkpoints and write-ahead log in a directory.
+    durability is "fsync" (acknowledge after the record reaches disk) or
+    "flush" (after it reaches the OS, which survives a crash of the server
+    process but not of the machine).
+    """
+    def __init__(self, directory, durability="fsync", keep_checkpoints=5):
+        if durability not in ("fsync", "flush"):
+            raise ValueError(f"Unknown durability: {durability}")
+        self.directory = directory
+        self.durability = durability
+        self.keep_checkpoints = keep_checkpoints
+        os.makedirs(directory, exist_ok=True)
+        self._wal = None
+        self._wal_round = None
+        # Group commit: records written vs. covered by an fsync, and whether one is running
+        self._cond = threading.Condition()
+        self._written = 0
+        self._synced = 0
+        self._syncing = False
+        self.fsyncs = 0
+
+    def _path(self, kind, round_id):
+        suffix = "flw" if kind == "checkpoint" else "log"
+        return os.path.join(self.directory, f"{kind}-{round_id:08d}.{suffix}")
+
+    def _rounds(self, kind):
+        names = glob.glob(os.path.join(self.directory, f"{kind}-*"))
+        return sorted(int(os.path.basename(n).split("-")[1].split(".")[0]) for n in names)
+
+    def _fsync_directory(self):
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def checkpoint(self, round_id, state):
+        """
+        Atomically write the checkpoint of round_id (a dict of JSON values and arrays),
+        then start the round's WAL and drop older logs and checkpoints.
+        """
+        path = self._path("checkpoint", round_id)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(wire.encode(dict(state, round_id=round_id)))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        self._fsync_directory()
+        self._open_wal(round_id)
+        for old in self._rounds("wal"):
+            if old < round_id:
+                os.remove(self._path("wal", old))
+        for old in self._rounds("checkpoint")[:-self.keep_checkpoints]:
+            os.remove(self._path("checkpoint", old))
+
+    def _open_wal(self, round_id):
+        with self._cond:
+            # Wait for a running fsync on the old log before closing it
+            while self._syncing:
+                self._cond.wait()
+            if self._wal is not None:
+                self._wal.close()
+            # Everything logged so far is covered by the checkpoint just written
+            self._synced = self._written
+            self._cond.notify_all()
+            self._wal = open(self._path("wal", round_id), "ab", buffering=0)
+            self._wal_round = round_id
+
+    def append(self, record):
+        """
+        Append a record to the open round's WAL. Returns a ticket to pass to
+        wait_durable once any locks held by the caller are released.
+        """
+        payload = wire.encode(record)
+        frame = _FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+        with self._cond:
+            self._wal.write(frame)
+            self._written += 1
+            return self._written
+
+    def wait_durable(self, ticket):
+        """Block until the record with this ticket is on disk (fsync durability)."""
+        if self.durability != "fsync":
+            return
+        with self._cond:
+            while self._synced < ticket:
+                if self._syncing:
+                    self._cond.wait()
+                    continue
+                # Become the leader: one fsync covers every record written so far
+                self._syncing = True
+                target = self._written
+                fd = self._wal.fileno()
+                self._cond.release()
+                try:
+                    os.fsync(fd)
+                finally:
+                    self._cond.acquire()
+                    self._syncing = False
+                    self._synced = max(self._synced, target)
+                    self.fsyncs += 1
+                    self._cond.notify_all()
+
+    def recover(self):
+        """
+        Load what a previous run left behind. Returns (checkpoints, records) where
+        checkpoints maps round_id to the decoded checkpoint of every kept round and
+        records are the WAL records of the latest round, or (None, []) if empty.
+        A torn record at the end of the log is truncated away.
+        """
+        rounds = self._rounds("checkpoint")
+        if not rounds:
+            return None, []
+        checkpoints = {}
+        for round_id in rounds:
+            with open(self._path("checkpoint", round_id), "rb") as f:
+                checkpoints[round_id] = wire.decode(f.read())
+        latest = rounds[-1]
+        records = []
+        wal_path = self._path("wal", latest)
+        if os.path.exists(wal_path):
+            with open(wal_path, "rb") as f:
+                data = f.read()
+            offset = 0
+            while offset + _FRAME.size <= len(data):
+                length, crc = _FRAME.unpack_from(data, offset)
+                payload = data[offset + _FRAME.size:offset + _FRAME.size + length]
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    break
+                records.append(wire.decode(payload))
+                offset += _FRAME.size + length
+            if offset < len(data):
+                with open(wal_path, "r+b") as f:
+                    f.truncate(offset)
+        self._open_wal(latest)
+        return checkpoints, records
+
+    def close(self):
+        with self._cond:
+            if self._wal is not None:
+                self._wal.close()
+                self._wal = None
@@ -0,0 +1,55 @@
+"""
+Sampling profiler for a running server, served at /debug/profile when the server
+is started with --profile.
+Reference: Gregg, B. (2016). "The Flame Graph." Communications of the ACM, 59(6).
+
+Every interval seconds the stacks of all other threads are read with
+sys._current_frames() and counted, without tracing hooks, so request threads run
+at full speed between samples. Results are folded stacks ("outer;...;inner count"),
+which flamegraph.pl and speedscope render directly.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# Leaf functions of threads that are blocked waiting for work, not running
+IDLE_FUNCTIONS = frozenset(["wait", "select", "poll", "accept", "sleep", "_wait_for_tstate_lock", "handle_request"])
+
+
+def _frame_name(code):
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def sample_stacks(seconds, interval=0.005, include_idle=False):
+    """
+    Sample the stacks of every thread but the caller's for the given seconds.
+    Returns (Counter of folded stack -> samples, number of sampling passes).
+    """
+    own = threading.get_ident()
+    stacks = Counter()
+    passes = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            if not include_idle and frame.f_code.co_name in IDLE_FUNCTIONS:
+                continue
+            names = []
+            while frame is not None:
+                names.append(_frame_name(frame.f_code))
+                frame = frame.f_back
+            stacks[";".join(reversed(names))] += 1
+        passes += 1
+        time.sleep(interval)
+    return stacks, passes
+
+
+def format_folded(stacks, passes, interval, limit=None):
+    """Folded stacks, hottest first, with a summary comment line."""
+    lines = [f"# {sum(stacks.values())} samples over {passes} passes every {interval * 1000:g} ms"]
+    for stack, count in stacks.most_common(limit):
+        lines.append(f"{stack} {count}")
+    return "\n".join(lines) + "\n"
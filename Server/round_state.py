@@ -0,0 +1,326 @@
+"""
+Round state shared by the server's request threads.
+"""
+import hashlib
+import threading
+import time
+import numpy as np
+from aggregation import BufferedAsyncAggregator, FedNova, create_strategy, local_steps
+from flclient.weights import WeightVector, normalize_layout
+
+# Contract "aggregation" values that apply updates asynchronously instead of in rounds
+ASYNC_AGGREGATIONS = ("FedBuff", "FedAsync")
+
+
+def weights_tag(weights):
+    """Short hash of a set of global weights, which tells apart rounds with the same id after a restart."""
+    data = np.ascontiguousarray(weights, dtype=np.float64)
+    return hashlib.blake2b(memoryview(data).cast("B"), digest_size=8).hexdigest()
+
+
+class RoundState:
+    """
+    Global weights, recent weight snapshots and the open round's aggregate.
+
+    Uploads are folded in under a lock, so each one is counted exactly once even
+    when many request threads upload at the same time. The published
+    (round_id, global_weights) pair is swapped atomically, so /join and /sync
+    read it without locking.
+
+    In asynchronous mode (FedBuff) round_id is the global model version: every
+    buffer_size updates, whatever round each client trained on, publish a new one.
+
+    With a store attached (see attach), every published round is checkpointed and
+    every folded update is logged before submit returns.
+    """
+    def __init__(self, min_clients=2, snapshot_history=5):
+        self.min_clients = min_clients
+        self.snapshot_history = snapshot_history
+        self._lock = threading.Lock()
+        self._published = (1, None)
+        # Layer layout of the global weights when they are a WeightVector, kept across rounds and restarts
+        self.layout = None
+        # Global weight snapshots keyed by round_id, used for delta syncs and compressed uploads
+        self.weight_history = {}
+        # weights_tag of each snapshot in weight_history. A server restarted without
+        # its state publishes new weights under the same round ids; the tags differ
+        self.weight_tags = {}
+        # Per-round client metadata; the weights themselves are folded into the aggregator
+        self.client_updates = {}
+        # Clients already counted for each recent round_id, so retried uploads are dropped
+        # even when they arrive after their round closed
+        self.contributors = {}
+        self.aggregator = create_strategy("FedAvg")
+        self.asynchronous = False
+        # Oldest version an asynchronous update may have trained on, relative to the current one
+        self.max_staleness = None
+        # Upload traffic for the open round, compared with sending dense float64 weights
+        self.traffic = {"bytes_received": 0, "bytes_dense": 0}
+        self.updates_received = 0
+        # perf_counter() when the open round was published and when its first update arrived
+        self._round_started = time.perf_counter()
+        self._first_update = None
+        # persistence.StateStore, or None to keep the state in memory only
+        self.store = None
+
+    @property
+    def round_id(self):
+        return self._published[0]
+
+    @property
+    def global_weights(self):
+        return self._published[1]
+
+    def current(self):
+        """Return the published (round_id, global_weights) pair."""
+        return self._published
+
+    def snapshot(self, round_id):
+        """Global weights of a recent round, or None if no longer kept."""
+        return self.weight_history.get(round_id)
+
+    def tag(self, round_id):
+        """weights_tag of a recent round's global weights, or None if no longer kept."""
+        return self.weight_tags.get(round_id)
+
+    def snapshot_matching(self, round_id, tag):
+        """Global weights of a recent round if they are the weights tag describes, else None."""
+        if tag is None or self.weight_tags.get(round_id) != tag:
+            return None
+        return self.weight_history.get(round_id)
+
+    def configure(self, aggregation="FedAvg", params=None):
+        """
+        Choose a synchronous strategy (see aggregation.STRATEGIES) or buffered
+        asynchronous aggregation ("FedBuff"; "FedAsync" is the same with a buffer
+        of one update) from the contract's "aggregation" and "aggregation_params".
+        Raises ValueError for an unknown strategy.
+        """
+        with self._lock:
+            self._configure(aggregation, params or {})
+
+    def _configure(self, aggregation, params):
+        self.asynchronous = aggregation in ASYNC_AGGREGATIONS
+        if not self.asynchronous:
+            self.aggregator = create_strategy(aggregation, params, expected_clients=self.min_clients)
+            return
+        buffer_size = 1 if aggregation == "FedAsync" else params.get("buffer_size", 10)
+        self.aggregator = BufferedAsyncAggregator(
+            buffer_size=buffer_size,
+            server_lr=params.get("server_lr", 1.0),
+            staleness_exponent=params.get("staleness_exponent", 0.5),
+        )
+        self.max_staleness = params.get("max_staleness", 20)
+        # Deltas are taken against the version each client trained on
+        self.snapshot_history = max(self.snapshot_history, self.max_staleness + 1)
+
+    def initialize(self, weights, aggregation="FedAvg", params=None):
+        """
+        Publish the initial global weights and configure aggregation (see configure),
+        unless another request already did.
+        """
+        with self._lock:
+            if self._published[1] is not None:
+                return False
+            self._configure(aggregation, params or {})
+            self._publish(self._published[0], weights)
+            if self.store is not None:
+                self._checkpoint()
+            return True
+
+    def attach(self, store, aggregation="FedAvg", params=None):
+        """
+        Persist the state in store and resume from whatever it holds: the kept
+        checkpoints become the weight snapshots and the updates logged for the
+        open round are folded in again. Returns the number of replayed updates,
+        or None if the store was empty.
+        """
+        with self._lock:
+            checkpoints, records = store.recover()
+            if checkpoints is None:
+                self.store = store
+                return None
+            self._configure(aggregation, params or {})
+            layout = checkpoints[max(checkpoints)].get("layout")
+            self.layout = normalize_layout(layout) if layout is not None else None
+            for round_id in sorted(checkpoints):
+                self._publish(round_id, checkpoints[round_id]["weights"])
+            latest = checkpoints[self._published[0]]
+            self.contributors = {int(r): set(ids) for r, ids in latest["contributors"].items()}
+            self.aggregator.restore_state(latest.get("aggregator", {}))
+            closed = False
+            for record in records:
+                fold = self._fold_partial if record.get("partial") else self._fold
+                status, _, summary = fold(
+                    record["client_id"], record["update"], record["weight"], record["metadata"],
+                    record["nbytes"], record["update_round"])
+                closed = closed or summary is not None
+            self.store = store
+            # The process stopped after closing a round but before checkpointing it
+            if closed:
+                self._checkpoint()
+            return len(records)
+
+    def _checkpoint(self):
+        round_id, weights = self._published
+        self.store.keep_checkpoints = max(self.store.keep_checkpoints, self.snapshot_history)
+        self.store.checkpoint(round_id, {
+            "weights": weights,
+            "layout": self.layout,
+            "contributors": {str(r): sorted(ids) for r, ids in self.contributors.items()},
+            "aggregator": self.aggregator.checkpoint_state(),
+        })
+
+    def mirror(self, round_id, weights):
+        """
+        Publish weights aggregated elsewhere, as an edge server does with its
+        root's rounds. Older rounds than the published one are ignored.
+        """
+        with self._lock:
+            if self._published[1] is not None and round_id <= self._published[0]:
+                return False
+            self._publish(round_id, weights)
+            return True
+
+    def _publish(self, round_id, weights):
+        # Aggregates and restored checkpoints are plain arrays; give them the layout of the global weights
+        if isinstance(weights, WeightVector):
+            self.layout = weights.layout
+        elif self.layout is not None and weights is not None:
+            weights = WeightVector(self.layout, weights)
+        self.weight_history[round_id] = weights
+        self.weight_tags[round_id] = weights_tag(weights) if weights is not None else None
+        for old_round in [r for r in self.weight_history if r <= round_id - self.snapshot_history]:
+            del self.weight_history[old_round]
+            del self.weight_tags[old_round]
+        for old_round in [r for r in self.contributors if r <= round_id - self.snapshot_history]:
+            del self.contributors[old_round]
+        self._published = (round_id, weights)
+        self._round_started = time.perf_counter()
+        self._first_update = None
+
+    def submit(self, client_id, update, weight, metadata, nbytes=0, update_round=None):
+        """
+        Fold one client's dense update into the open round.
+        Uploads are idempotent per (client_id, update_round), the round the client
+        trained on (the open round if not given); a repeat returns "duplicate".
+        Returns (status, current_round, summary), where summary describes the round
+        this update closed, or is None if the round is still open.
+        """
+        return self._submit(False, client_id, update, weight, metadata, nbytes, update_round)
+
+    def submit_partial(self, partial_id, weighted_sum, total_weight, clients, nbytes=0, update_round=None):
+        """
+        Fold an edge server's partial aggregate (see hierarchy.py) into the open round:
+        the weighted sum and total weight of the updates of clients, a dict of
+        client_id -> metadata that count towards min_clients. Idempotent per
+        (partial_id, update_round) and returns the same as submit. Only strategies
+        that average (FedAvg, FedAvgM) can combine partials; others raise ValueError.
+        """
+        return self._submit(True, partial_id, weighted_sum, total_weight, clients, nbytes, update_round)
+
+    def _submit(self, partial, client_id, update, weight, metadata, nbytes, update_round):
+        fold = self._fold_partial if partial else self._fold
+        ticket = None
+        with self._lock:
+            status, current_round, summary = fold(client_id, update, weight, metadata, nbytes, update_round)
+            if self.store is not None and status == "received":
+                if summary is not None:
+                    # The checkpoint of the new round covers this update
+                    self._checkpoint()
+                else:
+                    ticket = self.store.append({
+                        "client_id": client_id, "update": np.asarray(update, dtype=np.float64),
+                        "weight": weight, "metadata": metadata, "nbytes": nbytes,
+                        "update_round": current_round if update_round is None else update_round,
+                        "partial": partial,
+                    })
+        # Wait for the fsync outside the lock, so concurrent uploads share one
+        if ticket is not None:
+            self.store.wait_durable(ticket)
+        return status, current_round, summary
+
+    def _fold(self, client_id, update, weight, metadata, nbytes, update_round):
+        """Fold an update into the open round, under the lock; shared by submit and log replay."""
+        round_id, weights = self._published
+        update_round = round_id if update_round is None else update_round
+        if client_id in self.contributors.get(update_round, ()):
+            return "duplicate", round_id, None
+        if not self.asynchronous and client_id in self.client_updates:
+            return "duplicate", round_id, None
+        if weights is not None and len(update) != weights.shape[0]:
+            raise ValueError(f"Update has {len(update)} weights, expected {weights.shape[0]}")
+        if self.asynchronous:
+            self._add_async(update, weight, round_id, update_round)
+        elif isinstance(self.aggregator, FedNova):
+            self.aggregator.add(update, weight, local_steps(metadata))
+        else:
+            self.aggregator.add(update, weight)
+        if self._first_update is None:
+            self._first_update = time.perf_counter()
+        self.client_updates[client_id] = metadata
+        self.contributors.setdefault(update_round, set()).add(client_id)
+        self.updates_received += 1
+        self.traffic["bytes_received"] += nbytes
+        self.traffic["bytes_dense"] += 8 * len(update)
+        if self.asynchronous:
+            if not self.aggregator.ready():
+                return "received", round_id, None
+            return self._close(round_id, weights,
+                               mean_staleness=self.aggregator.total_staleness / self.aggregator.num_updates)
+        if len(self.client_updates) < self.min_clients:
+            return "received", round_id, None
+        return self._close(round_id, weights)
+
+    def _fold_partial(self, partial_id, weighted_sum, total_weight, clients, nbytes, update_round):
+        """Fold a partial aggregate into the open round, under the lock; shared by submit_partial and log replay."""
+        round_id, weights = self._published
+        update_round = round_id if update_round is None else update_round
+        if partial_id in self.contributors.get(update_round, ()):
+            return "duplicate", round_id, None
+        if self.asynchronous or not hasattr(self.aggregator, "add_partial"):
+            raise ValueError(f"{type(self.aggregator).__name__} cannot combine partial aggregates")
+        if weights is not None and len(weighted_sum) != weights.shape[0]:
+            raise ValueError(f"Partial has {len(weighted_sum)} weights, expected {weights.shape[0]}")
+        self.aggregator.add_partial(weighted_sum, total_weight, len(clients))
+        if self._first_update is None:
+            self._first_update = time.perf_counter()
+        self.client_updates.update(clients)
+        self.contributors.setdefault(update_round, set()).add(partial_id)
+        self.updates_received += len(clients)
+        self.traffic["bytes_received"] += nbytes
+        # Each client would otherwise have uploaded its dense weights
+        self.traffic["bytes_dense"] += 8 * len(weighted_sum) * len(clients)
+        if len(self.client_updates) < self.min_clients:
+            return "received", round_id, None
+        return self._close(round_id, weights)
+
+    def _close(self, round_id, weights, **extra):
+        """
+        Publish the aggregate as round_id + 1 and start a new round. The summary
+        includes how long the round was open, how long it waited for the rest of
+        the clients after the first update, how long aggregation took and the
+        metadata of the round's clients.
+        """
+        start = time.perf_counter()
+        new_weights = self.aggregator.aggregate(weights)
+        end = time.perf_counter()
+        summary = dict(self.traffic, round_id=round_id + 1, clients=len(self.client_updates),
+                       round_seconds=start - self._round_started, straggler_seconds=start - self._first_update,
+                       aggregation_seconds=end - start, client_metadata=self.client_updates, **extra)
+        self._publish(round_id + 1, new_weights)
+        self.aggregator.reset()
+        self.client_updates = {}
+        self.traffic = {"bytes_received": 0, "bytes_dense": 0}
+        return "received", round_id + 1, summary
+
+    def _add_async(self, update, weight, round_id, update_round):
+        """Buffer the delta from the version the client trained on, discounted by its staleness."""
+        staleness = round_id - update_round
+        base = self.weight_history.get(update_round)
+        if staleness < 0:
+            raise ValueError(f"Update is for version {update_round}, but the current version is {round_id}")
+        if base is None or staleness > self.max_staleness:
+            raise LookupError(f"Update from version {update_round} is too stale (current version {round_id}); "
+                              "sync and train again")
+        self.aggregator.add(update - base, weight, staleness)
@@ -1,51 +1,210 @@
+import argparse
+import collections
+import hashlib
 import json
 import os
+import struct
+import sys
+import threading
+import time
 import numpy as np
 from datetime import datetime
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.serving import WSGIRequestHandler
+import metrics
+import profiler
+import telemetry
+
+# The wire format, update compression and weight layouts are shared with the client package in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from flclient import wire
+from flclient.compression import decompress_update, xor_delta_encode
+from flclient.weights import init_weights
+from hierarchy import EdgeAggregator
+from persistence import StateStore
+from round_state import RoundState
+
+
+class NumpyJSONProvider(DefaultJSONProvider):
+    """JSON provider that converts NumPy arrays to lists at the JSON edge."""
+    @staticmethod
+    def default(obj):
+        if isinstance(obj, (np.ndarray, np.generic)):
+            return wire.json_default(obj)
+        return DefaultJSONProvider.default(obj)
+
 
 app = Flask(__name__)
+app.json = NumpyJSONProvider(app)
 
 VALID_JOIN_CODES = ["ABC123", "DEF456", "GHI789"]
 global_state = {
-    "round_id": 1,
-    "global_weights": [],
     "model_type": None,
     "model_version": "v1.0",
     "aggregation": "FedAvg"
 }
-client_updates = {}
+# Round id, global weights and the open round's aggregate (for demo, aggregate after 2 clients)
+state = RoundState(min_clients=2, snapshot_history=5)
+
+# Exported at /metrics; request metrics are labelled with the route, e.g. "/upload"
+registry = metrics.Registry()
+request_latency = registry.register(metrics.Histogram(
+    "flaas_request_duration_seconds", "Time to handle a request", labelnames=["route"]))
+requests_total = registry.register(metrics.Counter(
+    "flaas_requests_total", "Requests handled", labelnames=["route", "status"]))
+request_bytes = registry.register(metrics.Histogram(
+    "flaas_request_bytes", "Request body size", metrics.SIZE_BUCKETS, labelnames=["route"]))
+response_bytes = registry.register(metrics.Histogram(
+    "flaas_response_bytes", "Response body size", metrics.SIZE_BUCKETS, labelnames=["route"]))
+round_duration = registry.register(metrics.Histogram(
+    "flaas_round_duration_seconds", "Time from publishing a round to closing it"))
+round_straggler_wait = registry.register(metrics.Histogram(
+    "flaas_round_straggler_wait_seconds", "Time from a round's first update to the update that closed it"))
+round_aggregation = registry.register(metrics.Histogram(
+    "flaas_round_aggregation_seconds", "Time to compute a round's new global weights"))
+round_clients = registry.register(metrics.Histogram(
+    "flaas_round_clients", "Client updates aggregated per round", metrics.CLIENT_BUCKETS))
+client_phase_seconds = registry.register(metrics.Histogram(
+    "flaas_client_phase_seconds", "Client-reported time per phase of a round (load, train, sync, ...)",
+    labelnames=["phase"]))
+registry.register(metrics.Gauge("flaas_round_id", "Current round (or model version)", lambda: state.round_id))
+registry.register(metrics.Gauge(
+    "flaas_round_pending_updates", "Updates folded into the open round", lambda: len(state.client_updates)))
+# Client telemetry summaries of the last closed rounds, served at /rounds
+round_reports = collections.deque(maxlen=20)
+# Only one /debug/profile request samples at a time
+profile_lock = threading.Lock()
+
+# EdgeAggregator when running as an edge of a root server (--root), else None
+edge = None
+
+# Caches are replaced as whole (key, value) tuples so request threads never see a half-updated entry
+# Parsed contract.json as (mtime, contract, digest), reloaded only when the file's mtime changes
+contract_cache = {"entry": (None, None, None)}
+# Pre-encoded /join and /sync bodies as (etag, bodies) for the current round + contract
+response_cache = {"entry": (None, {})}
 
 
 def load_contract():
     contract_file = os.path.join(os.path.dirname(__file__), 'contract.json')
-    with open(contract_file, 'r') as f:
-        contract = json.load(f)
-    # Always include input_size and hidden_size if present in the file
-    if "input_size" not in contract:
-        contract["input_size"] = 10  # Default or set as needed
-    if contract.get("model_type") == "mlp" and "hidden_size" not in contract:
-        contract["hidden_size"] = 32  # Default or set as needed
-    return contract
+    mtime = os.stat(contract_file).st_mtime_ns
+    if contract_cache["entry"][0] != mtime:
+        with open(contract_file, 'r') as f:
+            contract = json.load(f)
+        # Always include input_size and hidden_size if present in the file
+        if "input_size" not in contract:
+            contract["input_size"] = 10  # Default or set as needed
+        if contract.get("model_type") == "mlp" and "hidden_size" not in contract and "hidden_layers" not in contract:
+            contract["hidden_size"] = 32  # Default or set as needed
+        # Weights always come from the server state
+        contract.pop("initial_weights", None)
+        digest = hashlib.sha1(json.dumps(contract, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+        contract_cache["entry"] = (mtime, contract, digest)
+    return dict(contract_cache["entry"][1])
 
 def generate_initial_weights(contract):
-    model_type = contract["model_type"]
-    if model_type == "logistic_regression":
-        input_size = contract["input_size"] if "input_size" in contract else 10
-        weights = np.random.uniform(-0.1, 0.1, input_size + 1)  # +1 for bias
-        return weights.tolist()
-    elif model_type == "mlp":
-        input_size = contract.get("input_size", 10)
-        hidden_size = contract.get("hidden_size", 32)
-        # Flatten all weights and biases into a single list
-        W_ih = np.random.uniform(-0.1, 0.1, (input_size, hidden_size)).flatten()
-        b_h = np.zeros(hidden_size)
-        W_ho = np.random.uniform(-0.1, 0.1, hidden_size).flatten()
-        b_o = np.zeros(1)
-        weights = np.concatenate([W_ih, b_h, W_ho, b_o])
-        return weights.tolist()
+    """Random initial weights in the layout the clients' models use (flclient/weights.py)."""
+    return init_weights(contract)
+
+@app.before_request
+def start_timer():
+    g.start = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    request_latency.observe(time.perf_counter() - g.start, route)
+    requests_total.inc(route, str(response.status_code))
+    request_bytes.observe(request.content_length or 0, route)
+    response_bytes.observe(response.content_length or 0, route)
+    return response
+
+def read_message():
+    """
+    Parse a request body sent either in the binary wire format or as JSON.
+    Returns None unless the body is a well-formed object.
+    """
+    if request.mimetype == wire.CONTENT_TYPE:
+        try:
+            return wire.decode(request.get_data())
+        except (ValueError, KeyError, struct.error) as e:
+            print(f"Malformed wire message: {e}")
+            return None
+    data = request.get_json(silent=True)
+    return data if isinstance(data, dict) else None
+
+def wants_binary():
+    best = request.accept_mimetypes.best_match([wire.JSON_CONTENT_TYPE, wire.CONTENT_TYPE])
+    return best == wire.CONTENT_TYPE
+
+def contract_response(known_round=None, known_tag=None):
+    """
+    Answer /join and /sync with the contract and global weights.
+    Clients that send a matching If-None-Match get 304, clients that report a
+    recent known_round, with the weights_tag of their copy of it, get an xor
+    delta from that snapshot instead of full weights. The ETag and the tag cover
+    the weights themselves, so after a restart without saved state, which
+    publishes new weights under the same round ids, cached clients get full weights.
+    Encoded bodies are cached until the round or the contract changes.
+    """
+    contract = load_contract()
+    digest = contract_cache["entry"][2]
+    round_id, weights = state.current()
+    tag = state.tag(round_id) if weights is not None else None
+    etag = f"{round_id}-{tag}-{digest}" if weights is not None else f"0-{digest}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    binary = wants_binary()
+    base = state.snapshot_matching(known_round, known_tag) if binary and weights is not None else None
+    if known_round == round_id and weights is not None and known_tag == tag:
+        kind = "contract"  # Only the contract changed, the client already has these weights
+    elif base is not None:
+        kind = known_round
     else:
-        raise ValueError(f"Unknown model type: {model_type}")
+        kind = "full"
+    cached_etag, bodies = response_cache["entry"]
+    if cached_etag != etag:
+        bodies = {}
+        response_cache["entry"] = (etag, bodies)
+    key = (kind, binary)
+    body = bodies.get(key)
+    if body is None:
+        contract["round_id"] = round_id
+        if weights is not None:
+            contract["weights_tag"] = tag
+        if kind == "full":
+            contract["initial_weights"] = weights
+        elif kind != "contract":
+            contract["weights_delta"] = xor_delta_encode(weights, base)
+            contract["weights_delta"]["base_round"] = known_round
+        body = wire.encode(contract) if binary else app.json.dumps(contract).encode("utf-8")
+        bodies[key] = body
+    mimetype = wire.CONTENT_TYPE if binary else wire.JSON_CONTENT_TYPE
+    response = Response(body, mimetype=mimetype)
+    response.set_etag(etag)
+    return response
+
+def decode_model_update(data):
+    """
+    Return the dense weights of an upload, decoding compressed deltas against the
+    snapshot of the round the client trained on.
+    """
+    if "compressed_update" not in data:
+        return data.get('model_update')
+    base = state.snapshot(data.get('round_id'))
+    if base is None:
+        raise LookupError(f"No snapshot of round {data.get('round_id')} to apply the compressed update to")
+    # Clients send the tag of the weights they trained on; after a restart without saved state it differs
+    tag = data.get('weights_tag')
+    if tag is not None and tag != state.tag(data.get('round_id')):
+        raise LookupError(f"The compressed update is a delta against other weights than round {data.get('round_id')}'s")
+    delta = decompress_update(data["compressed_update"])
+    if delta.shape != base.shape:
+        raise ValueError(f"Delta has {delta.size} weights, expected {base.size}")
+    return base + delta
 
 def validate_join_code(join_code):
     if join_code not in VALID_JOIN_CODES:
@@ -54,68 +213,224 @@ def validate_join_code(join_code):
 
 @app.route('/join', methods=['POST'])
 def join_round():
-    global global_state
-    data = request.get_json()
+    data = read_message()
+    if data is None:
+        return jsonify({"error": "Unsupported request body"}), 415
     join_code = data.get('join_code')
     error_response = validate_join_code(join_code)
     if error_response:
         return error_response
-    contract = load_contract()
-    # Generate initial weights if not present
-    if not global_state["global_weights"]:
-        contract["initial_weights"] = generate_initial_weights(contract)
-        global_state["global_weights"] = contract["initial_weights"]
+    # Generate initial weights if not present (an edge mirrors its root's instead)
+    if state.global_weights is None and edge is None:
+        contract = load_contract()
         global_state["model_type"] = contract["model_type"]
         global_state["model_version"] = contract.get("model_version", "v1.0")
         global_state["aggregation"] = contract.get("aggregation", "FedAvg")
-    else:
-        contract["initial_weights"] = global_state["global_weights"]
-    contract["round_id"] = global_state["round_id"]
-    return jsonify(contract)
+        state.initialize(generate_initial_weights(contract), global_state["aggregation"],
+                         contract.get("aggregation_params"))
+    return contract_response(data.get('known_round'), data.get('known_tag'))
 
 @app.route('/sync', methods=['POST'])
 def sync_contract():
-    global global_state
-    data = request.get_json()
+    data = read_message()
+    if data is None:
+        return jsonify({"error": "Unsupported request body"}), 415
     join_code = data.get('join_code')
     error_response = validate_join_code(join_code)
     if error_response:
         return error_response
-    contract = load_contract()
-    contract["initial_weights"] = global_state["global_weights"]
-    contract["round_id"] = global_state["round_id"]
-    return jsonify(contract)
+    return contract_response(data.get('known_round'), data.get('known_tag'))
 
 @app.route('/upload', methods=['POST'])
 def upload():
-    global global_state, client_updates
-    data = request.get_json()
+    data = read_message()
+    if data is None:
+        return jsonify({"error": "Unsupported request body"}), 415
     client_id = data.get('client_id')
     user_info = data.get('user', {})  # Extract user info
     round_id = data.get('round_id')
-    model_update = data.get('model_update')
-    training_metadata = data.get('training_metadata', {})
-    # Store client update
-    client_updates[client_id] = {
-        "model_update": model_update,
+    training_metadata = data.get('training_metadata') or {}
+    if not isinstance(training_metadata, dict):
+        return jsonify({"error": "training_metadata must be an object"}), 400
+    # Store client metadata only
+    metadata = {
         "training_metadata": training_metadata,
         "round_id": round_id,
         "user": user_info  # Store user info
     }
-    print(f"Received update from {client_id} ({user_info}) for round {round_id}")
-    # Aggregate if enough clients (for demo, aggregate after 2)
-    if len(client_updates) >= 2:
-        updates = [np.array(update["model_update"]) for update in client_updates.values()]
-        new_weights = np.mean(updates, axis=0)
-        global_state["global_weights"] = new_weights.tolist()
-        global_state["round_id"] += 1
-        client_updates = {}
-        print(f"Aggregated new global weights for round {global_state['round_id']}")
-    return jsonify({"status": "received", "current_round": global_state["round_id"]})
+    # Fold the update into the running weighted sum (weighted by local sample count)
+    num_samples = training_metadata.get("num_samples") or 1
+    try:
+        model_update = decode_model_update(data)
+        if edge is not None:
+            return edge_upload(client_id, model_update, num_samples, metadata, round_id)
+        status, current_round, summary = state.submit(
+            client_id, model_update, num_samples, metadata, nbytes=request.content_length or 0,
+            update_round=round_id)
+    except (TypeError, ValueError, KeyError) as e:
+        return jsonify({"error": f"Invalid model update: {e}"}), 400
+    except LookupError as e:
+        return jsonify({"error": str(e), "current_round": state.round_id}), 409
+    if status == "duplicate":
+        print(f"Ignoring duplicate update from {client_id} for round {current_round}")
+    else:
+        print(f"Received update from {client_id} ({user_info}) for round {round_id}")
+    log_summary(summary)
+    return jsonify({"status": status, "current_round": current_round})
+
+def edge_upload(client_id, model_update, num_samples, metadata, round_id):
+    """Fold an upload into the edge's partial, forwarding the partial to the root once it is full."""
+    status, batch = edge.submit(client_id, model_update, num_samples, metadata, update_round=round_id)
+    print(f"{'Ignoring duplicate' if status == 'duplicate' else 'Received'} update from {client_id} "
+          f"for round {round_id} at edge {edge.edge_id}")
+    if batch is not None:
+        edge.flush(batch)
+    return jsonify({"status": status, "current_round": state.round_id})
+
+def log_summary(summary):
+    if summary:
+        round_duration.observe(summary["round_seconds"])
+        round_straggler_wait.observe(summary["straggler_seconds"])
+        round_aggregation.observe(summary["aggregation_seconds"])
+        round_clients.observe(summary["clients"])
+        for metadata in summary["client_metadata"].values():
+            timings = ((metadata or {}).get("training_metadata") or {}).get("timings") or {}
+            for phase, seconds in timings.items():
+                if seconds is not None:
+                    client_phase_seconds.observe(seconds, phase)
+        saved = summary["bytes_dense"] - summary["bytes_received"]
+        staleness = f", mean staleness {summary['mean_staleness']:.2f}" if "mean_staleness" in summary else ""
+        print(f"Aggregated new global weights for round {summary['round_id']} "
+              f"(received {summary['bytes_received']} bytes, saved {saved} bytes vs dense float64{staleness})")
+        # Telemetry of the clients that trained on the round just closed
+        report = telemetry.round_report(summary["round_id"] - 1, summary["client_metadata"])
+        round_reports.append(report)
+        print(telemetry.format_report(report))
+
+@app.route('/partial', methods=['POST'])
+def receive_partial():
+    """Fold an edge server's pre-aggregated updates (see hierarchy.py) into the open round."""
+    data = read_message()
+    if data is None:
+        return jsonify({"error": "Unsupported request body"}), 415
+    error_response = validate_join_code(data.get('join_code'))
+    if error_response:
+        return error_response
+    if edge is not None:
+        return jsonify({"error": "Partials go to the root server"}), 400
+    try:
+        status, current_round, summary = state.submit_partial(
+            data['partial_id'], data['weighted_sum'], data['total_weight'], data['clients'],
+            nbytes=request.content_length or 0, update_round=data.get('round_id'))
+    except (TypeError, ValueError, KeyError) as e:
+        return jsonify({"error": f"Invalid partial aggregate: {e}"}), 400
+    print(f"{'Ignoring duplicate' if status == 'duplicate' else 'Received'} partial {data['partial_id']} "
+          f"of {len(data['clients'])} updates for round {current_round}")
+    log_summary(summary)
+    return jsonify({"status": status, "current_round": current_round})
 
 @app.route('/codes', methods=['GET'])
 def list_codes():
     return jsonify({"valid_codes": VALID_JOIN_CODES})
 
+@app.route('/rounds', methods=['GET'])
+def list_rounds():
+    """Client telemetry of the last closed rounds, newest first (see telemetry.round_report)."""
+    return jsonify({"rounds": list(reversed(round_reports))})
+
+@app.route('/metrics', methods=['GET'])
+def export_metrics():
+    return Response(registry.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/debug/profile', methods=['GET'])
+def profile():
+    """
+    Sample all threads' stacks for ?seconds= (default 5) every ?interval= seconds
+    (default 0.005) and return the hottest folded stacks (?limit=, default 100).
+    Idle threads are left out unless ?idle=1. Only enabled with --profile.
+    """
+    if not app.config.get("PROFILE"):
+        return jsonify({"error": "Profiling is disabled; start the server with --profile"}), 404
+    try:
+        seconds = min(float(request.args.get("seconds", 5)), 60)
+        interval = max(float(request.args.get("interval", 0.005)), 0.001)
+        limit = int(request.args.get("limit", 100))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid profile parameters: {e}"}), 400
+    if not profile_lock.acquire(blocking=False):
+        return jsonify({"error": "A profile is already being taken"}), 409
+    try:
+        stacks, passes = profiler.sample_stacks(seconds, interval, include_idle=request.args.get("idle") == "1")
+    finally:
+        profile_lock.release()
+    return Response(profiler.format_folded(stacks, passes, interval, limit), mimetype="text/plain")
+
+def resume_from(state_dir, durability):
+    """Persist the round state in state_dir, resuming from a previous run's checkpoints and log."""
+    contract = load_contract()
+    aggregation = contract.get("aggregation", "FedAvg")
+    start = time.perf_counter()
+    replayed = state.attach(StateStore(state_dir, durability=durability), aggregation,
+                            contract.get("aggregation_params"))
+    if replayed is None:
+        print(f"Persisting round state in {state_dir}")
+        return
+    global_state["model_type"] = contract["model_type"]
+    global_state["model_version"] = contract.get("model_version", "v1.0")
+    global_state["aggregation"] = aggregation
+    print(f"Resumed round {state.round_id} from {state_dir}, replayed {replayed} logged updates "
+          f"in {time.perf_counter() - start:.2f}s")
+
+def start_edge(args):
+    """Run as an edge of the root server at args.root, forwarding partials in the background."""
+    global edge
+    edge = EdgeAggregator(args.root, state, VALID_JOIN_CODES[0], edge_id=args.edge_id,
+                          batch_size=args.edge_batch)
+    edge.connect()
+    threading.Thread(target=edge.run, args=(args.flush_interval,), daemon=True).start()
+    print(f"Edge {edge.edge_id} of {args.root} at round {state.round_id}, "
+          f"forwarding every {args.edge_batch} updates or {args.flush_interval}s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Federated Learning Server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3197)
+    parser.add_argument("--threads", type=int, default=8, help="Request threads for the production server")
+    parser.add_argument("--dev", action="store_true", help="Use Flask's development server")
+    parser.add_argument("--min-clients", type=int, default=state.min_clients,
+                        help="Uploads needed to close a round")
+    parser.add_argument("--state-dir", help="Checkpoint the rounds and log updates here, and resume from it")
+    parser.add_argument("--durability", choices=["fsync", "flush"], default="fsync",
+                        help="Acknowledge uploads once logged to disk (fsync) or to the OS (flush)")
+    parser.add_argument("--root", help="Run as an edge server that pre-aggregates for the root server at this URL")
+    parser.add_argument("--edge-id", help="Name of this edge in the root's logs (default: edge-<pid>)")
+    parser.add_argument("--edge-batch", type=int, default=10, help="Updates per partial forwarded to the root")
+    parser.add_argument("--flush-interval", type=float, default=1.0,
+                        help="Seconds between forwarding incomplete partials and syncing with the root")
+    parser.add_argument("--profile", action="store_true",
+                        help="Enable the sampling profiler at /debug/profile")
+    args = parser.parse_args()
+    app.config["PROFILE"] = args.profile
+    state.min_clients = args.min_clients
+    if args.root and args.state_dir:
+        parser.error("--state-dir applies to the root; edges keep no state of their own")
+    if args.root:
+        start_edge(args)
+    if args.state_dir:
+        resume_from(args.state_dir, args.durability)
+    # All round state lives in this process, so scale with threads rather than worker processes
+    if not args.dev:
+        try:
+            from waitress import serve
+        except ImportError:
+            print("waitress not installed, falling back to Flask's threaded development server")
+        else:
+            print(f"Serving on http://{args.host}:{args.port} with {args.threads} threads")
+            serve(app, host=args.host, port=args.port, threads=args.threads)
+            return
+    # HTTP/1.1 keeps client connections alive between requests
+    WSGIRequestHandler.protocol_version = "HTTP/1.1"
+    app.run(host=args.host, port=args.port, threaded=True)
+
 if __name__ == '__main__':
-    app.run(port=3197) 
\ No newline at end of file
+    main() 
\ No newline at end of file
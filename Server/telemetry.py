@@ -0,0 +1,62 @@
+"""
+Per-round summary of the training telemetry clients report in training_metadata
+(phase timings, throughput, peak memory), to find slow clients and slow phases.
+"""
+import numpy as np
+
+
+def _stats(values):
+    values = np.asarray(values, dtype=np.float64)
+    return {
+        "mean": float(values.mean()),
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "max": float(values.max()),
+    }
+
+
+def round_report(round_id, client_metadata, slowest=5):
+    """
+    Summarize the clients of a closed round: per-phase time statistics with the
+    slowest client of each phase, throughput and memory, and the slowest clients
+    by total reported time. client_metadata maps client_id to the metadata the
+    server stored for its upload. Clients without telemetry are skipped.
+    """
+    phases = {}
+    clients = []
+    for client_id, metadata in client_metadata.items():
+        training = (metadata or {}).get("training_metadata") or {}
+        timings = training.get("timings") or {}
+        for phase, seconds in timings.items():
+            if seconds is not None:
+                phases.setdefault(phase, []).append((seconds, client_id))
+        if timings:
+            clients.append({
+                "client_id": client_id,
+                "total_sec": sum(s for s in timings.values() if s is not None),
+                "samples_per_sec": training.get("samples_per_sec"),
+                "peak_rss_bytes": training.get("peak_rss_bytes"),
+            })
+    report = {"round_id": round_id, "clients": len(client_metadata), "reporting": len(clients), "phases": {}}
+    for phase, entries in sorted(phases.items()):
+        stats = _stats([seconds for seconds, _ in entries])
+        stats["slowest_client"] = max(entries)[1]
+        report["phases"][phase] = stats
+    throughput = [c["samples_per_sec"] for c in clients if c["samples_per_sec"]]
+    if throughput:
+        report["samples_per_sec"] = _stats(throughput)
+    memory = [c["peak_rss_bytes"] for c in clients if c["peak_rss_bytes"]]
+    if memory:
+        report["peak_rss_bytes"] = _stats(memory)
+    report["slowest_clients"] = sorted(clients, key=lambda c: c["total_sec"], reverse=True)[:slowest]
+    return report
+
+
+def format_report(report):
+    """One log line: p50/max seconds of each phase and the slowest client."""
+    phases = ", ".join(f"{phase} {s['p50']:.3f}/{s['max']:.3f}s" for phase, s in report["phases"].items())
+    slowest = report["slowest_clients"][0] if report["slowest_clients"] else None
+    line = f"Round {report['round_id']} client phases p50/max: {phases or 'no telemetry'}"
+    if slowest:
+        line += f"; slowest client {slowest['client_id']} ({slowest['total_sec']:.3f}s)"
+    return line
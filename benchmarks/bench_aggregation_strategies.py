@@ -0,0 +1,76 @@
+"""
+Cost of each aggregation strategy (Server/aggregation.py) as the number of
+clients per round grows: time to fold in every update plus time to aggregate,
+and the memory each strategy keeps. The robust strategies are also compared
+with the same statistic computed by np.sort / np.median on a freshly stacked
+matrix.
+
+    python benchmarks/bench_aggregation_strategies.py --params 100000 --clients 10 50 100 500
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "Server"))
+from aggregation import STRATEGIES, CoordinateWiseAggregator, create_strategy  # noqa: E402
+
+
+def sort_baseline(name, updates, trim_ratio):
+    stacked = np.stack(updates)
+    if name == "Median":
+        return np.median(stacked, axis=0)
+    n = stacked.shape[0]
+    k = int(trim_ratio * n)
+    return np.sort(stacked, axis=0)[k:n - k].mean(axis=0)
+
+
+def time_strategy(name, updates, global_weights, params, repeats):
+    strategy = create_strategy(name, params, expected_clients=len(updates))
+    best_add = best_aggregate = float("inf")
+    for _ in range(repeats):
+        strategy.reset()
+        start = time.perf_counter()
+        for update in updates:
+            strategy.add(update, 100)
+        added = time.perf_counter()
+        strategy.aggregate(global_weights)
+        best_add = min(best_add, added - start)
+        best_aggregate = min(best_aggregate, time.perf_counter() - added)
+    if isinstance(strategy, CoordinateWiseAggregator):
+        memory = strategy.updates.nbytes
+    else:
+        memory = strategy.weighted_sum.nbytes
+    return best_add, best_aggregate, memory
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregation strategy cost benchmark")
+    parser.add_argument("--params", type=int, default=100_000)
+    parser.add_argument("--clients", type=int, nargs="+", default=[10, 50, 100, 500])
+    parser.add_argument("--trim-ratio", type=float, default=0.1)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    global_weights = rng.standard_normal(args.params)
+    params = {"trim_ratio": args.trim_ratio, "momentum": 0.9}
+    print(f"{args.params:,} params per update, best of {args.repeats}")
+    print(f"{'clients':>7} {'strategy':<12} {'add ms':>9} {'aggregate ms':>13} {'memory MB':>10} {'np.sort ms':>11}")
+    for clients in args.clients:
+        updates = [global_weights + 0.01 * rng.standard_normal(args.params) for _ in range(clients)]
+        for name in STRATEGIES:
+            add, aggregate, memory = time_strategy(name, updates, global_weights, params, args.repeats)
+            baseline = ""
+            if name in ("Median", "TrimmedMean"):
+                start = time.perf_counter()
+                sort_baseline(name, updates, args.trim_ratio)
+                baseline = f"{(time.perf_counter() - start) * 1000:11.1f}"
+            print(f"{clients:>7} {name:<12} {add * 1000:9.1f} {aggregate * 1000:13.1f} "
+                  f"{memory / 2 ** 20:10.1f} {baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Compare synchronous FedAvg rounds with buffered asynchronous aggregation (FedBuff)
+when some clients are stragglers.
+
+Client threads repeatedly take the current global weights, "train" for their own
+compute time (sleep) by moving towards a client-specific optimum, and submit the
+result to the server's RoundState. FedAvg closes a version once every client has
+reported, so its pace is set by the slowest client; FedBuff publishes a version
+every --buffer-size updates. Reports updates applied per second, versions per
+second and the distance of the global weights to the mean of the client optima.
+
+    python benchmarks/bench_async_aggregation.py --clients 20 --stragglers 0.2 --seconds 5
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "Server")]
+from round_state import RoundState  # noqa: E402
+
+
+def run(aggregation, args, targets, compute_times):
+    state = RoundState(min_clients=args.clients)
+    params = {"buffer_size": args.buffer_size, "staleness_exponent": 0.5, "max_staleness": args.max_staleness}
+    state.initialize(np.zeros(args.params), aggregation, params)
+    stop = threading.Event()
+    rejected = [0]
+
+    def client(i):
+        while not stop.is_set():
+            round_id, weights = state.current()
+            time.sleep(compute_times[i])
+            local = weights + args.local_lr * (targets[i] - weights)
+            try:
+                state.submit(f"client_{i}", local, 1, {}, update_round=round_id)
+            except LookupError:
+                rejected[0] += 1
+            # Train once per version, as a client would after re-syncing
+            while state.round_id == round_id and not stop.is_set():
+                time.sleep(0.001)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(args.clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    round_id, weights = state.current()
+    error = np.linalg.norm(weights - targets.mean(axis=0)) / np.linalg.norm(targets.mean(axis=0))
+    print(f"{aggregation:<8} {state.updates_received / elapsed:10.1f} {(round_id - 1) / elapsed:10.1f} "
+          f"{error:12.4f} {rejected[0]:9d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synchronous vs buffered asynchronous aggregation")
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--params", type=int, default=10_000)
+    parser.add_argument("--stragglers", type=float, default=0.2, help="Fraction of slow clients")
+    parser.add_argument("--fast", type=float, default=0.02, help="Compute seconds of a fast client")
+    parser.add_argument("--slow", type=float, default=0.5, help="Compute seconds of a straggler")
+    parser.add_argument("--buffer-size", type=int, default=5)
+    parser.add_argument("--local-lr", type=float, default=0.5)
+    parser.add_argument("--max-staleness", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    targets = 1.0 + 0.5 * rng.standard_normal((args.clients, args.params))
+    n_slow = int(round(args.stragglers * args.clients))
+    compute_times = [args.slow if i < n_slow else args.fast for i in range(args.clients)]
+    print(f"{args.clients} clients ({n_slow} stragglers at {args.slow}s, others {args.fast}s), "
+          f"{args.params} params, FedBuff buffer {args.buffer_size}, {args.seconds}s per mode")
+    print(f"{'mode':<8} {'updates/s':>10} {'versions/s':>10} {'rel. error':>12} {'too stale':>9}")
+    for aggregation in ("FedAvg", "FedBuff"):
+        run(aggregation, args, targets, compute_times)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Cost of persisting the round state (Server/persistence.py): upload latency and
+throughput of RoundState.submit from concurrent threads with the state in
+memory only, logged with "flush" durability, logged with group-committed
+fsyncs, and with one fsync per upload. Then times a restart that replays the
+logged open round.
+
+    python benchmarks/bench_durability.py --uploads 2000 --threads 32 --params 10000
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "Server")]
+from persistence import StateStore  # noqa: E402
+from round_state import RoundState  # noqa: E402
+
+
+class FsyncEachStore(StateStore):
+    """Baseline without group commit: fsync every record as it is appended."""
+    def append(self, record):
+        ticket = super().append(record)
+        os.fsync(self._wal.fileno())
+        return ticket
+
+    def wait_durable(self, ticket):
+        pass
+
+
+def run(label, store, args, update):
+    state = RoundState(min_clients=args.uploads + 1)
+    if store is not None:
+        state.attach(store)
+    state.initialize(np.zeros(args.params))
+    latencies = []
+    per_thread = args.uploads // args.threads
+
+    def worker(t):
+        for i in range(per_thread):
+            start = time.perf_counter()
+            state.submit(f"client_{t}_{i}", update, 1, {"num_samples": 1}, nbytes=update.nbytes)
+            latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=worker, args=(t,)) for t in range(args.threads)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    fsyncs = getattr(store, "fsyncs", 0) if not isinstance(store, FsyncEachStore) else len(latencies)
+    lat = np.array(latencies) * 1000
+    print(f"{label:<16} {len(latencies) / elapsed:10.0f} {np.percentile(lat, 50):9.2f} "
+          f"{np.percentile(lat, 99):9.2f} {fsyncs:8d}")
+    return state
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Durability cost benchmark")
+    parser.add_argument("--uploads", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--params", type=int, default=10_000)
+    parser.add_argument("--dir", help="Directory for the state (default: a temporary directory)")
+    args = parser.parse_args()
+
+    update = np.random.default_rng(0).standard_normal(args.params)
+    base = args.dir or tempfile.mkdtemp(prefix="flaas-state-")
+    print(f"{args.uploads} uploads of {args.params} params from {args.threads} threads, state in {base}")
+    print(f"{'mode':<16} {'uploads/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'fsyncs':>8}")
+    try:
+        run("memory", None, args, update)
+        run("flush", StateStore(os.path.join(base, "flush"), durability="flush"), args, update)
+        run("fsync each", FsyncEachStore(os.path.join(base, "each")), args, update)
+        state = run("group commit", StateStore(os.path.join(base, "group")), args, update)
+        logged = state.updates_received
+        state.store.close()
+
+        start = time.perf_counter()
+        resumed = RoundState(min_clients=args.uploads + 1)
+        replayed = resumed.attach(StateStore(os.path.join(base, "group")))
+        elapsed = time.perf_counter() - start
+        ok = np.allclose(resumed.aggregator.weighted_sum, state.aggregator.weighted_sum)
+        print(f"Restart: replayed {replayed}/{logged} logged updates in {elapsed:.2f}s, "
+              f"open round matches: {ok}")
+    finally:
+        if not args.dir:
+            shutil.rmtree(base, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark MLPModel.train throughput (samples/sec) against the previous
+implementation, which copied the shuffled dataset every epoch and allocated
+fresh arrays for every mini-batch.
+
+    python benchmarks/bench_mlp_train.py --rows 1000000 --epochs 1
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from flclient.models.mlp import MLPModel  # noqa: E402
+
+
+def reference_train(model, X, y):
+    """The training loop before preallocated workspaces, kept for comparison."""
+    sigmoid = lambda x: 1 / (1 + np.exp(-x))  # noqa: E731
+    n_samples = X.shape[0]
+    for epoch in range(model.epochs):
+        perm = np.random.permutation(n_samples)
+        X_shuffled = X[perm]
+        y_shuffled = y[perm].reshape(-1, 1)
+        total_loss = 0
+        for i in range(0, n_samples, model.batch_size):
+            X_batch = X_shuffled[i:i+model.batch_size]
+            y_batch = y_shuffled[i:i+model.batch_size]
+            H = sigmoid(np.dot(X_batch, model.W_ih) + model.b_h)
+            O = sigmoid(np.dot(H, model.W_ho) + model.b_o)
+            error = O - y_batch
+            loss = -np.mean(y_batch * np.log(O + 1e-15) + (1 - y_batch) * np.log(1 - O + 1e-15))
+            total_loss += loss
+            dO = error * O * (1 - O)
+            dW_ho = np.dot(H.T, dO)
+            db_o = np.sum(dO, axis=0, keepdims=True)
+            dH = np.dot(dO, model.W_ho.T) * H * (1 - H)
+            dW_ih = np.dot(X_batch.T, dH)
+            db_h = np.sum(dH, axis=0, keepdims=True)
+            model.W_ih -= model.learning_rate * dW_ih
+            model.b_h -= model.learning_rate * db_h
+            model.W_ho -= model.learning_rate * dW_ho
+            model.b_o -= model.learning_rate * db_o
+
+
+def make_data(rows, features, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.standard_normal((rows, features))
+    y = (X @ rng.standard_normal(features) > 0).astype(int)
+    return X, y
+
+
+def run(label, train, config, X, y):
+    with contextlib.redirect_stdout(io.StringIO()):
+        model = MLPModel(config)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        train(model, X, y)
+    elapsed = time.perf_counter() - start
+    rate = X.shape[0] * config["epochs"] / elapsed
+    print(f"{label:<22} {elapsed:8.2f}s {rate:12,.0f} samples/sec")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MLP training throughput benchmark")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--features", type=int, default=10)
+    parser.add_argument("--hidden-size", type=int, default=32)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--epochs", type=int, default=1)
+    args = parser.parse_args()
+
+    X, y = make_data(args.rows, args.features)
+    config = {
+        "input_size": args.features,
+        "hidden_size": args.hidden_size,
+        "learning_rate": 0.01,
+        "epochs": args.epochs,
+        "batch_size": args.batch_size,
+    }
+    print(f"{args.rows:,} rows x {args.features} features, hidden={args.hidden_size}, "
+          f"batch={args.batch_size}, epochs={args.epochs}")
+    before = run("before (float64)", reference_train, config, X, y)
+    after = run("after (float64)", MLPModel.train, config, X, y)
+    config32 = dict(config, training_params={"dtype": "float32"})
+    after32 = run("after (float32)", MLPModel.train, config32, X, y)
+    print(f"speedup: {after / before:.2f}x (float64), {after32 / before:.2f}x (float32)")
+
+
+if __name__ == "__main__":
+    main()
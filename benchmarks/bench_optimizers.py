@@ -0,0 +1,119 @@
+"""
+Federated rounds needed to reach a target test accuracy with each local
+optimizer and learning-rate schedule (flclient/models/optimizers.py).
+
+Every round, each client trains the global model on its shard of a synthetic
+dataset for --epochs local epochs and the server averages the results weighted
+by shard size (FedAvg). A run stops at the first round whose global model
+reaches --target accuracy on a held-out set, or after --max-rounds.
+
+Optimizers prefer different step sizes, so each configuration is run with its
+base learning rate times each of --lr-scales and reported at its best one
+(fewest median rounds, then highest accuracy).
+
+    python benchmarks/bench_optimizers.py --clients 10 --rows 20000 --target 0.91
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from flclient.training import create_model  # noqa: E402
+from flclient.weights import init_weights  # noqa: E402
+
+# name -> (base learning_rate, training_params)
+CONFIGS = {
+    "sgd": (0.02, {}),
+    "sgd+cosine": (0.04, {"lr_schedule": "cosine"}),
+    "momentum": (0.004, {"optimizer": "momentum", "momentum": 0.9}),
+    "nesterov": (0.004, {"optimizer": "nesterov", "momentum": 0.9}),
+    "nesterov+step": (0.004, {"optimizer": "nesterov", "lr_schedule": "step", "decay_epochs": 1, "decay_rate": 0.5}),
+    "adam": (0.006, {"optimizer": "adam"}),
+    "adam+warmup+cosine": (0.01, {"optimizer": "adam", "warmup_steps": 20, "lr_schedule": "cosine"}),
+}
+
+
+def make_data(rows, features, seed=0):
+    """Labels from a random one-hidden-layer tanh teacher, with 5% label noise."""
+    rng = np.random.default_rng(seed)
+    X = rng.standard_normal((rows, features))
+    hidden = np.tanh(X @ rng.standard_normal((features, 8)))
+    y = (hidden @ rng.standard_normal(8) > 0).astype(int)
+    flip = rng.random(rows) < 0.05
+    y[flip] = 1 - y[flip]
+    return X, y
+
+
+def run(name, learning_rate, args, shards, X_test, y_test, seed):
+    training_params = CONFIGS[name][1]
+    config = {
+        "model_type": args.model, "input_size": args.features, "hidden_size": args.hidden,
+        "learning_rate": learning_rate, "epochs": args.epochs, "batch_size": args.batch_size,
+        "training_params": training_params,
+    }
+    np.random.seed(seed)
+    weights = init_weights(config)
+    sizes = np.array([X.shape[0] for X, _ in shards], dtype=np.float64)
+    start = time.perf_counter()
+    accuracy = 0.0
+    for round_id in range(1, args.max_rounds + 1):
+        updates = []
+        for X, y in shards:
+            with contextlib.redirect_stdout(io.StringIO()):
+                model = create_model(dict(config, initial_weights=weights))
+            model.verbose = False
+            model.train(X, y)
+            updates.append(model.get_flat_weights())
+        weights = weights.like(np.average(updates, axis=0, weights=sizes))
+        model.set_weights_from_flat(weights)
+        accuracy = float(np.mean(model.predict(X_test) == y_test))
+        if accuracy >= args.target:
+            return round_id, accuracy, time.perf_counter() - start
+    return None, accuracy, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rounds to target accuracy per local optimizer")
+    parser.add_argument("--model", choices=["mlp", "logistic_regression"], default="mlp")
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--rows", type=int, default=20_000, help="Training rows over all clients")
+    parser.add_argument("--features", type=int, default=20)
+    parser.add_argument("--hidden", type=int, default=32)
+    parser.add_argument("--epochs", type=int, default=2, help="Local epochs per round")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--target", type=float, default=0.91)
+    parser.add_argument("--max-rounds", type=int, default=30)
+    parser.add_argument("--seeds", type=int, default=3)
+    parser.add_argument("--lr-scales", type=float, nargs="+", default=[0.5, 1, 2, 4, 8])
+    parser.add_argument("--only", nargs="+", choices=sorted(CONFIGS))
+    args = parser.parse_args()
+
+    X, y = make_data(args.rows + args.rows // 4, args.features)
+    X_test, y_test = X[args.rows:], y[args.rows:]
+    shards = list(zip(np.array_split(X[:args.rows], args.clients), np.array_split(y[:args.rows], args.clients)))
+    print(f"{args.model}, {args.clients} clients x {args.rows // args.clients} rows, {args.epochs} local epoch(s), "
+          f"target accuracy {args.target}, median of {args.seeds} seeds")
+    print(f"{'optimizer':<20} {'best lr':>8} {'rounds':>7} {'accuracy':>9} {'seconds':>8}")
+    for name in args.only or CONFIGS:
+        best = None
+        for scale in args.lr_scales:
+            learning_rate = CONFIGS[name][0] * scale
+            results = [run(name, learning_rate, args, shards, X_test, y_test, seed) for seed in range(args.seeds)]
+            # Runs that never reach the target count as max_rounds + 1
+            rounds = float(np.median([r if r is not None else args.max_rounds + 1 for r, _, _ in results]))
+            accuracy = float(np.median([a for _, a, _ in results]))
+            seconds = float(np.median([s for _, _, s in results]))
+            if best is None or (rounds, -accuracy) < (best[1], -best[2]):
+                best = (learning_rate, rounds, accuracy, seconds)
+        learning_rate, rounds, accuracy, seconds = best
+        label = f"{rounds:7.1f}" if rounds <= args.max_rounds else f"{'>' + str(args.max_rounds):>7}"
+        print(f"{name:<20} {learning_rate:8.3g} {label} {accuracy:9.3f} {seconds:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
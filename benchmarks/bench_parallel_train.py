@@ -0,0 +1,78 @@
+"""
+Benchmark multi-process local training (flclient/parallel.py) with 1, 2, 4 and 8
+worker processes. Reports wall time, throughput, speedup over one process and
+the test accuracy of the averaged model.
+
+    python benchmarks/bench_parallel_train.py --rows 1000000 --epochs 2
+
+Speedup is bounded by the number of CPU cores available; the core count is
+printed with the results.
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from flclient.models.mlp import MLPModel  # noqa: E402
+from flclient.parallel import ParallelTrainer  # noqa: E402
+
+
+def make_data(rows, features, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.standard_normal((rows, features))
+    y = (X @ rng.standard_normal(features) > 0).astype(int)
+    return X, y
+
+
+def run(workers, config, X, y, X_test, y_test, sync_every):
+    np.random.seed(0)
+    with contextlib.redirect_stdout(io.StringIO()):
+        model = MLPModel(config)
+        start = time.perf_counter()
+        if workers == 1:
+            model.train(X, y)
+        else:
+            ParallelTrainer(config, workers, sync_every).train(model, X, y)
+        elapsed = time.perf_counter() - start
+    accuracy = float(np.mean(model.predict(X_test) == y_test))
+    return elapsed, accuracy
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel local training scaling benchmark")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--features", type=int, default=10)
+    parser.add_argument("--hidden-size", type=int, default=32)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--epochs", type=int, default=2)
+    parser.add_argument("--sync-every", type=int, default=1)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    X, y = make_data(args.rows, args.features)
+    X_test, y_test = make_data(args.rows // 10, args.features, seed=1)
+    config = {
+        "input_size": args.features,
+        "hidden_size": args.hidden_size,
+        "learning_rate": 0.01,
+        "epochs": args.epochs,
+        "batch_size": args.batch_size,
+    }
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    print(f"{args.rows:,} rows x {args.features} features, hidden={args.hidden_size}, "
+          f"batch={args.batch_size}, epochs={args.epochs}, sync_every={args.sync_every}, {cores} CPU core(s)")
+    print(f"{'workers':>7} {'time':>9} {'samples/sec':>13} {'speedup':>8} {'accuracy':>9}")
+    baseline = None
+    for workers in args.workers:
+        elapsed, accuracy = run(workers, config, X, y, X_test, y_test, args.sync_every)
+        baseline = baseline or elapsed
+        rate = args.rows * args.epochs / elapsed
+        print(f"{workers:>7} {elapsed:8.2f}s {rate:13,.0f} {baseline / elapsed:7.2f}x {accuracy:9.4f}")
+
+
+if __name__ == "__main__":
+    main()
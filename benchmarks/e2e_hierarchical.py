@@ -0,0 +1,118 @@
+"""
+End-to-end check of hierarchical aggregation (Server/hierarchy.py) against flat FedAvg.
+
+Starts, as local processes, a root server with --edges edge servers in front of
+it and a separate flat server. Each round, every client syncs from its edge and
+uploads the same update, with its sample count, to its edge and to the flat
+server. Edges forward one partial per --clients / --edges updates. After each
+round the root's global weights are compared with the flat server's and with
+the weighted mean computed here.
+
+    python benchmarks/e2e_hierarchical.py --edges 3 --clients 12 --rounds 3
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from flclient.api import ServerAPI  # noqa: E402
+
+SERVER_DIR = os.path.join(ROOT, "Server")
+JOIN_CODE = "ABC123"
+
+
+def start_server(port, *args):
+    process = subprocess.Popen([sys.executable, "server.py", "--port", str(port), *args],
+                               cwd=SERVER_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server on port {port} exited with code {process.returncode}")
+        try:
+            requests.get(f"{url}/codes", timeout=1)
+            return process, url
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"Server on port {port} did not start")
+
+
+def wait_for_round(api, round_id, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        data = api.sync_contract(JOIN_CODE)
+        if data["round_id"] >= round_id:
+            return data
+        time.sleep(0.05)
+    raise RuntimeError(f"Round {round_id} did not close")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hierarchical vs flat FedAvg end-to-end check")
+    parser.add_argument("--edges", type=int, default=3)
+    parser.add_argument("--clients", type=int, default=12)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--port", type=int, default=3500)
+    args = parser.parse_args()
+
+    processes = []
+    try:
+        root, root_url = start_server(args.port, "--min-clients", str(args.clients))
+        flat, flat_url = start_server(args.port + 1, "--min-clients", str(args.clients))
+        processes += [root, flat]
+        edge_urls = []
+        batch = -(-args.clients // args.edges)
+        for e in range(args.edges):
+            process, url = start_server(args.port + 2 + e, "--root", root_url, "--edge-id", f"edge-{e}",
+                                        "--edge-batch", str(batch), "--flush-interval", "0.5")
+            processes.append(process)
+            edge_urls.append(url)
+
+        root_api, flat_api = ServerAPI(root_url), ServerAPI(flat_url)
+        edge_apis = [ServerAPI(url) for url in edge_urls]
+        flat_api.join_round(JOIN_CODE)
+        rng = np.random.default_rng(0)
+        samples = rng.integers(10, 1000, args.clients)
+        print(f"{args.clients} clients over {args.edges} edges, {batch} updates per partial")
+        print(f"{'round':>5} {'root vs flat':>13} {'root vs mean':>13} {'edge s':>8} {'flat s':>8}")
+        ok = True
+        for round_id in range(1, args.rounds + 1):
+            weights = np.asarray(wait_for_round(edge_apis[0], round_id)["initial_weights"])
+            updates = [weights + 0.1 * rng.standard_normal(weights.shape[0]) for _ in range(args.clients)]
+
+            def upload(api, i):
+                return api.upload_model({
+                    "client_id": f"client-{i}", "round_id": round_id, "model_update": updates[i],
+                    "training_metadata": {"num_samples": int(samples[i])}})
+
+            timings = []
+            for apis in ([edge_apis[i % args.edges] for i in range(args.clients)], [flat_api] * args.clients):
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=args.clients) as pool:
+                    list(pool.map(upload, apis, range(args.clients)))
+                wait_for_round(apis[0] if apis[0] is flat_api else root_api, round_id + 1)
+                timings.append(time.perf_counter() - start)
+            root_weights = np.asarray(root_api.sync_contract(JOIN_CODE)["initial_weights"])
+            flat_weights = np.asarray(flat_api.sync_contract(JOIN_CODE)["initial_weights"])
+            expected = np.average(np.stack(updates), axis=0, weights=samples)
+            vs_flat = np.abs(root_weights - flat_weights).max()
+            vs_mean = np.abs(root_weights - expected).max()
+            ok = ok and vs_flat < 1e-12 and vs_mean < 1e-12
+            print(f"{round_id:>5} {vs_flat:13.2e} {vs_mean:13.2e} {timings[0]:8.2f} {timings[1]:8.2f}")
+        print("Hierarchical aggregation matches flat FedAvg" if ok else "MISMATCH")
+        sys.exit(0 if ok else 1)
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Load test: many clients upload to a threaded server at the same moment.
+
+Starts the real Flask app on a local port, releases all client threads from a
+barrier at once and checks that every upload was folded into the aggregate
+exactly once.
+
+    python benchmarks/load_test_uploads.py --clients 1000
+"""
+import argparse
+import contextlib
+import io
+import logging
+import os
+import sys
+import threading
+import time
+import numpy as np
+import requests
+from werkzeug.serving import make_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "Server"))
+import server  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent upload load test")
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--port", type=int, default=3297)
+    args = parser.parse_args()
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    httpd = make_server("127.0.0.1", args.port, server.app, threaded=True)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{args.port}"
+
+    contract = requests.post(f"{url}/join", json={"join_code": "ABC123"}).json()
+    size = len(contract["initial_weights"])
+    # Close the round only once every client has reported, so the result checks all of them
+    server.state.min_clients = args.clients
+
+    barrier = threading.Barrier(args.clients)
+    statuses = [None] * args.clients
+
+    def client(i):
+        payload = {
+            "client_id": f"client_{i}",
+            "round_id": contract["round_id"],
+            "model_update": [float(i)] * size,
+            "training_metadata": {"num_samples": 1},
+        }
+        barrier.wait()
+        for _ in range(5):
+            try:
+                statuses[i] = requests.post(f"{url}/upload", json=payload, timeout=60).status_code
+                return
+            except requests.ConnectionError:
+                time.sleep(0.1)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(args.clients)]
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    elapsed = time.perf_counter() - start
+    httpd.shutdown()
+
+    expected = (args.clients - 1) / 2.0
+    ok = statuses.count(200)
+    round_id, weights = server.state.current()
+    print(f"{args.clients} concurrent uploads in {elapsed:.2f}s ({args.clients / elapsed:.0f} uploads/s)")
+    print(f"HTTP 200: {ok}, updates folded: {server.state.updates_received}, round now {round_id}")
+    lost = args.clients - server.state.updates_received
+    correct = round_id == contract["round_id"] + 1 and np.allclose(weights, expected)
+    print(f"Lost uploads: {lost}, aggregate matches the exact mean: {correct}")
+    sys.exit(0 if lost == 0 and ok == args.clients and correct else 1)
+
+
+if __name__ == "__main__":
+    main()
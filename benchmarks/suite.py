@@ -0,0 +1,328 @@
+"""
+Benchmark suite for the client models, data loading, weight serialization and
+server-side aggregation, on synthetic data at several scales.
+
+    python benchmarks/suite.py --scale small --out baseline.json
+    python benchmarks/suite.py --scale small --compare baseline.json --threshold 0.25
+
+Each case is set up outside the timed region, then called in a loop long enough
+to time reliably (at least --min-time seconds), --repeats times. The fastest
+repeat is reported, as it is the least disturbed by other load on the machine.
+With --compare, a case whose time grew by more than --threshold (0.25 = 25%)
+over the baseline fails the run with exit code 1.
+"""
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "Server")]
+from flclient import wire  # noqa: E402
+from flclient.data_loader import DataLoader  # noqa: E402
+from flclient.inference import BatchPredictor  # noqa: E402
+from flclient.models.logistic_regression import LogisticRegressionModel  # noqa: E402
+from flclient.models.mlp import MLPModel  # noqa: E402
+
+SCALES = {
+    "small": {"rows": [1_000, 10_000], "features": [10], "hidden": [32], "clients": [10, 50]},
+    "medium": {"rows": [10_000, 100_000], "features": [10, 100], "hidden": [32, 128], "clients": [10, 100]},
+    "large": {"rows": [100_000, 1_000_000], "features": [10, 100], "hidden": [32, 256], "clients": [100, 1000]},
+}
+
+# name -> (function, parameter names); the function sets up a case and returns
+# (run, items): run() is timed and items is the number of rows, clients, etc. it processes
+BENCHMARKS = {}
+
+
+def benchmark(*params):
+    def register(fn):
+        BENCHMARKS[fn.__name__] = (fn, params)
+        return fn
+    return register
+
+
+def quiet():
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+# Synthetic data
+
+def make_classification(rows, features, seed=0):
+    """Binary labels from a random linear teacher with 10% label noise."""
+    rng = np.random.default_rng(seed)
+    X = rng.standard_normal((rows, features))
+    y = (X @ rng.standard_normal(features) > 0).astype(int)
+    flip = rng.random(rows) < 0.1
+    y[flip] = 1 - y[flip]
+    return X, y
+
+
+def make_config(features, hidden=32, model_type="mlp", **training_params):
+    return {
+        "model_type": model_type,
+        "input_size": features,
+        "hidden_size": hidden,
+        "feature_columns": [f"feature_{i + 1}" for i in range(features)],
+        "target_column": "target",
+        "epochs": 1,
+        "batch_size": 32,
+        "learning_rate": 0.01,
+        "training_params": dict({"data_cache": False}, **training_params),
+    }
+
+
+def write_csv(directory, rows, features):
+    """Write a synthetic dataset once per shape and return its path."""
+    path = os.path.join(directory, f"data_{rows}x{features}.csv")
+    if not os.path.exists(path):
+        X, y = make_classification(rows, features)
+        header = ",".join([f"feature_{i + 1}" for i in range(features)] + ["target"])
+        np.savetxt(path, np.column_stack([X, y]), delimiter=",", header=header, comments="", fmt="%.6g")
+    return path
+
+
+def mlp_size(features, hidden):
+    return features * hidden + hidden + hidden + 1
+
+
+# Cases
+
+@benchmark("rows", "features", "hidden")
+def mlp_train(rows, features, hidden, workdir):
+    X, y = make_classification(rows, features)
+    with quiet():
+        model = MLPModel(make_config(features, hidden))
+    model.verbose = False
+    return lambda: model.train(X, y), rows
+
+
+@benchmark("rows", "features", "hidden")
+def mlp_deep_train(rows, features, hidden, workdir):
+    # Three ReLU hidden layers of the given width (the contract's "hidden_layers")
+    X, y = make_classification(rows, features)
+    with quiet():
+        model = MLPModel(dict(make_config(features, hidden), hidden_layers=[hidden] * 3, activation="relu"))
+    model.verbose = False
+    return lambda: model.train(X, y), rows
+
+
+@benchmark("rows", "features")
+def logreg_train(rows, features, workdir):
+    X, y = make_classification(rows, features)
+    with quiet():
+        model = LogisticRegressionModel(make_config(features, model_type="logistic_regression"))
+    model.verbose = False
+    return lambda: model.train(X, y), rows
+
+
+@benchmark("rows", "features", "hidden")
+def predict(rows, features, hidden, workdir):
+    X, _ = make_classification(rows, features)
+    with quiet():
+        model = MLPModel(make_config(features, hidden))
+    predictor = BatchPredictor.from_model(model)
+    out = np.empty(rows, dtype=predictor.dtype)
+    return lambda: predictor.predict_proba(X, out=out), rows
+
+
+@benchmark("rows", "features")
+def load_csv(rows, features, workdir):
+    path = write_csv(workdir, rows, features)
+    loader = DataLoader(make_config(features))
+
+    def run():
+        with quiet():
+            loader.load_data(path)
+    return run, rows
+
+
+@benchmark("rows", "features")
+def load_cached(rows, features, workdir):
+    path = write_csv(workdir, rows, features)
+    loader = DataLoader(make_config(features, data_cache=True, cache_dir=os.path.join(workdir, "cache")))
+    with quiet():
+        loader.cached_arrays(path)
+
+    def run():
+        # Touch every value, since the cache is memory-mapped lazily
+        X, y = loader.cached_arrays(path)
+        X.sum()
+        y.sum()
+    return run, rows
+
+
+@benchmark("features", "hidden")
+def weights_roundtrip(features, hidden, workdir):
+    with quiet():
+        model = MLPModel(make_config(features, hidden))
+
+    def run():
+        model.set_weights_from_flat(model.get_flat_weights())
+    return run, mlp_size(features, hidden)
+
+
+@benchmark("features", "hidden")
+def wire_roundtrip(features, hidden, workdir):
+    message = {"client_id": "client_1", "round_id": 1, "training_metadata": {"num_samples": 100},
+               "model_update": np.random.default_rng(0).standard_normal(mlp_size(features, hidden))}
+    return lambda: wire.decode(wire.encode(message)), mlp_size(features, hidden)
+
+
+@benchmark("clients", "hidden")
+def aggregate(clients, hidden, workdir):
+    from round_state import RoundState
+    size = mlp_size(10, hidden)
+    updates = np.random.default_rng(0).standard_normal((clients, size))
+
+    def run():
+        state = RoundState(min_clients=clients)
+        state.initialize(np.zeros(size))
+        for i in range(clients):
+            state.submit(f"client_{i}", updates[i], 100, {}, update_round=1)
+    return run, clients
+
+
+@benchmark("clients", "hidden")
+def server_upload(clients, hidden, workdir):
+    """Binary uploads through the Flask app's /upload handler (no sockets), closing one round."""
+    with quiet():
+        import server
+    from round_state import RoundState
+    size = mlp_size(10, hidden)
+    rng = np.random.default_rng(0)
+    bodies = [wire.encode({"client_id": f"client_{i}", "round_id": 1, "model_update": rng.standard_normal(size),
+                           "training_metadata": {"num_samples": 100}}) for i in range(clients)]
+    client = server.app.test_client()
+
+    def run():
+        server.state = RoundState(min_clients=clients)
+        server.state.initialize(np.zeros(size))
+        with quiet():
+            for body in bodies:
+                response = client.post("/upload", data=body, content_type=wire.CONTENT_TYPE)
+                if response.status_code != 200:
+                    raise RuntimeError(f"Upload failed: {response.get_json()}")
+    return run, clients
+
+
+# Runner
+
+def time_case(run, repeats, min_time):
+    """Seconds per call of run(): the best of repeats timings of a calibrated loop."""
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            run()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        loops *= 2
+    timings = [elapsed / loops]
+    for _ in range(repeats - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            run()
+        timings.append((time.perf_counter() - start) / loops)
+    return min(timings), float(np.median(timings)), loops
+
+
+def case_name(name, params):
+    return f"{name}[{','.join(f'{k}={v}' for k, v in params.items())}]"
+
+
+def run_suite(scale, names, repeats, min_time):
+    grid = SCALES[scale]
+    results = {}
+    workdir = tempfile.mkdtemp(prefix="flaas-bench-")
+    try:
+        for name in names:
+            fn, param_names = BENCHMARKS[name]
+            for values in itertools.product(*(grid[p] for p in param_names)):
+                params = dict(zip(param_names, values))
+                run, items = fn(**params, workdir=workdir)
+                best, median, loops = time_case(run, repeats, min_time)
+                key = case_name(name, params)
+                results[key] = {"benchmark": name, "params": params, "seconds": best, "median": median,
+                                "per_second": items / best, "loops": loops, "repeats": repeats}
+                print(f"{key:<55} {best * 1000:11.3f} ms {items / best:14,.0f} /s")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def environment(scale):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "scale": scale,
+        "commit": commit,
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Print each case's change against the baseline and return the regressed case names."""
+    print(f"\n{'case':<55} {'baseline ms':>12} {'current ms':>11} {'change':>8}")
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            print(f"{key:<55} {'-':>12} {result['seconds'] * 1000:11.3f} {'new':>8}")
+            continue
+        change = result["seconds"] / base["seconds"] - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(key)
+            flag = "  REGRESSION"
+        print(f"{key:<55} {base['seconds'] * 1000:12.3f} {result['seconds'] * 1000:11.3f} {change:+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FLaaS benchmark suite")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="Run only these benchmarks")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds per timed loop")
+    parser.add_argument("--out", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON file from an earlier --out")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Fail when a case is slower than the baseline by more than this fraction")
+    args = parser.parse_args()
+
+    print(f"Scale {args.scale}, best of {args.repeats}")
+    results = run_suite(args.scale, args.only or list(BENCHMARKS), args.repeats, args.min_time)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"environment": environment(args.scale), "results": results}, f, indent=2)
+        print(f"Saved {len(results)} results to {args.out}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline["results"], args.threshold)
+        if regressions:
+            print(f"{len(regressions)} case(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,9 @@ Command-line interface for federated learning client.
 
 import sys
 import argparse
+import json
 from .client import FederatedClient
+from .simulation import simulate, print_report
 
 
 def main():
@@ -16,7 +18,29 @@ def main():
     sync_parser = subparsers.add_parser("sync", help="Pull latest FL contract from server")
     train_parser = subparsers.add_parser("train", help="Train locally using contract.json and user data")
     train_parser.add_argument("--data", required=True)
+    train_parser.add_argument("--time-budget", type=float, help="Stop local training after about this many seconds")
+    train_parser.add_argument("--sample-budget", type=int, help="Train on at most this many samples over all epochs")
     upload_parser = subparsers.add_parser("upload", help="Upload model update and training metadata to server")
+    predict_parser = subparsers.add_parser("predict", help="Score a large CSV or .npy file with the global model")
+    predict_parser.add_argument("--data", required=True, help="CSV with the contract's feature columns, or .npy matrix")
+    predict_parser.add_argument("--out", required=True, help="Output file: .npy probabilities, otherwise CSV")
+    predict_parser.add_argument("--model", choices=["global", "local"], default="global",
+                                help="Global weights from the contract, or the locally trained result.json")
+    predict_parser.add_argument("--sync", action="store_true", help="Sync the latest global weights first")
+    predict_parser.add_argument("--batch-size", type=int, default=65536, help="Rows per float32 batch")
+    predict_parser.add_argument("--workers", type=int, default=1, help="Processes scoring chunks in parallel")
+    sim_parser = subparsers.add_parser("simulate", help="Run many simulated clients against a local server")
+    sim_parser.add_argument("--data-dir", required=True, help="CSV file, or directory of CSV files, to partition")
+    sim_parser.add_argument("--clients", type=int, default=100)
+    sim_parser.add_argument("--rounds", type=int, default=1)
+    sim_parser.add_argument("--partition", choices=["iid", "dirichlet"], default="iid")
+    sim_parser.add_argument("--alpha", type=float, default=0.5, help="Dirichlet concentration for non-IID splits")
+    sim_parser.add_argument("--concurrency", type=int, default=32, help="Clients running at the same time")
+    sim_parser.add_argument("--code", default="ABC123", help="Join code")
+    sim_parser.add_argument("--port", type=int, default=3397, help="Port for the local server")
+    sim_parser.add_argument("--server-url", help="Use a running server instead of starting one")
+    sim_parser.add_argument("--out", help="Write the report as JSON")
+    sim_parser.add_argument("--verbose", action="store_true", help="Show the clients' output")
 
     args = parser.parse_args()
 
@@ -24,6 +48,21 @@ def main():
         parser.print_help()
         return
 
+    if args.command == "simulate":
+        try:
+            report = simulate(args.data_dir, clients=args.clients, rounds=args.rounds,
+                              partition=args.partition, alpha=args.alpha, concurrency=args.concurrency,
+                              join_code=args.code, port=args.port, server_url=args.server_url,
+                              verbose=args.verbose)
+        except Exception as e:
+            print(f"Simulation failed: {e}")
+            sys.exit(1)
+        print_report(report)
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump(report, f, indent=2)
+        return
+
     client = FederatedClient()
 
     try:
@@ -45,7 +84,7 @@ def main():
             try:
                 client.load_contract()
                 client.setup()
-                metadata = client.train(args.data)
+                metadata = client.train(args.data, time_budget=args.time_budget, sample_budget=args.sample_budget)
                 if metadata is not None:
                     print("Training completed")
                 else:
@@ -56,6 +95,15 @@ def main():
             except Exception as e:
                 print(f"Training failed: {e}")
                 sys.exit(1)
+        elif args.command == "predict":
+            try:
+                if args.sync:
+                    client.sync_contract()
+                client.predict(args.data, args.out, model=args.model, batch_size=args.batch_size,
+                               workers=args.workers)
+            except Exception as e:
+                print(f"Prediction failed: {e}")
+                sys.exit(1)
         elif args.command == "upload":
             try:
                 client.load_contract()
@@ -63,7 +111,7 @@ def main():
                 if result is not None:
                     print("Upload completed")
                 else:
-                    print("Upload failed. Run training first.")
+                    print("Upload failed. Run training first, or run upload again to retry.")
             except Exception as e:
                 print(f"Upload failed: {e}")
                 sys.exit(1)
@@ -1,31 +1,195 @@
+import asyncio
+import json
+import random
+import time
+import numpy as np
 import requests
-from .config import SERVER_URL
+from requests.adapters import HTTPAdapter
+from . import wire
+from .config import SERVER_URL, WIRE_FORMAT, REQUEST_TIMEOUT, MAX_RETRIES, RETRY_BACKOFF, RETRY_BACKOFF_MAX
+
+# Responses worth retrying: rate limiting and temporary server or proxy failures
+RETRY_STATUS = (429, 502, 503, 504)
+
+
+def backoff_delay(attempt, backoff=RETRY_BACKOFF, max_backoff=RETRY_BACKOFF_MAX):
+    """
+    Exponential backoff with full jitter: a uniform delay in [0, backoff * 2**attempt],
+    capped at max_backoff, so clients retrying together spread out.
+    Reference: Brooker, M. (2015). "Exponential Backoff And Jitter." AWS Architecture Blog.
+    """
+    return random.uniform(0, min(max_backoff, backoff * 2 ** attempt))
 
 
 class ServerAPI:
-    def __init__(self, server_url=SERVER_URL):
+    """
+    Client side of the server's HTTP API over one pooled keep-alive session.
+    Every request has a timeout and is retried on connection errors, timeouts and
+    RETRY_STATUS responses. Retrying is safe: /join and /sync only read, and the
+    server ignores a repeated upload for the same client_id and round_id.
+    """
+    def __init__(self, server_url=SERVER_URL, wire_format=WIRE_FORMAT, timeout=REQUEST_TIMEOUT,
+                 retries=MAX_RETRIES, backoff=RETRY_BACKOFF):
         self.server_url = server_url
-    
+        self.binary = wire_format == "binary"
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_maxsize=4))
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=4))
+
+    def close(self):
+        self.session.close()
+
+    def _headers(self):
+        """Ask for binary weights when enabled; the server falls back to JSON otherwise."""
+        if self.binary:
+            return {"Accept": f"{wire.CONTENT_TYPE}, {wire.JSON_CONTENT_TYPE};q=0.9"}
+        return {"Accept": wire.JSON_CONTENT_TYPE}
+
+    def _post(self, path, **kwargs):
+        """POST with the session, retrying transient failures with backoff and jitter."""
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.session.post(f"{self.server_url}{path}", timeout=self.timeout, **kwargs)
+                if response.status_code not in RETRY_STATUS or attempt == self.retries:
+                    return response
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.retries:
+                    raise
+            time.sleep(backoff_delay(attempt, self.backoff))
+
     def _handle_response(self, response, operation):
         """Handle API response and raise exceptions on error."""
         if response.status_code != 200:
-            raise Exception(f"Failed to {operation}: {response.json().get('error', 'Unknown error')}")
+            try:
+                error = response.json().get('error', 'Unknown error')
+            except ValueError:
+                error = f"HTTP {response.status_code}"
+            raise Exception(f"Failed to {operation}: {error}")
+        if response.headers.get("Content-Type", "").startswith(wire.CONTENT_TYPE):
+            return wire.decode(response.content)
         return response.json()
-    
-    def join_round(self, join_code, user_info=None):
-        """Join a federated learning round."""
+
+    def _join_request(self, join_code, user_info=None):
         payload = {"join_code": join_code}
         if user_info:
             payload.update(user_info)
-        response = requests.post(f"{self.server_url}/join", json=payload)
+        return dict(json=payload, headers=self._headers())
+
+    def _sync_request(self, join_code, etag=None, known_round=None, known_tag=None):
+        payload = {"join_code": join_code}
+        if known_round is not None:
+            payload["known_round"] = known_round
+            payload["known_tag"] = known_tag
+        headers = self._headers()
+        if etag:
+            headers["If-None-Match"] = f'"{etag}"'
+        return dict(json=payload, headers=headers)
+
+    def _sync_result(self, response):
+        if response.status_code == 304:
+            return None
+        data = self._handle_response(response, "sync")
+        data["etag"] = response.headers.get("ETag", "").strip('"') or None
+        return data
+
+    def _upload_requests(self, upload_data):
+        """Request bodies to try in order: binary (if enabled), then JSON."""
+        if self.binary:
+            payload = dict(upload_data)
+            if "model_update" in payload:
+                payload["model_update"] = np.asarray(payload["model_update"], dtype=np.float64)
+            headers = dict(self._headers(), **{"Content-Type": wire.CONTENT_TYPE})
+            yield dict(data=wire.encode(payload), headers=headers)
+        headers = dict(self._headers(), **{"Content-Type": wire.JSON_CONTENT_TYPE})
+        yield dict(data=json.dumps(upload_data, default=wire.json_default), headers=headers)
+
+    def join_round(self, join_code, user_info=None):
+        """Join a federated learning round."""
+        response = self._post("/join", **self._join_request(join_code, user_info))
         return self._handle_response(response, "join round")
-    
-    def sync_contract(self, join_code):
-        """Sync contract from server."""
-        response = requests.post(f"{self.server_url}/sync", json={"join_code": join_code})
-        return self._handle_response(response, "sync")
-    
+
+    def sync_contract(self, join_code, etag=None, known_round=None, known_tag=None):
+        """
+        Sync contract from server. Returns None if the cached contract matching
+        etag is still current; the returned contract carries the new "etag".
+        known_round and known_tag (the "weights_tag" the cached weights came with)
+        let the server answer with only the contract or a weight delta.
+        """
+        return self._sync_result(self._post("/sync", **self._sync_request(join_code, etag, known_round, known_tag)))
+
     def upload_model(self, upload_data):
         """Upload model weights and metadata."""
-        response = requests.post(f"{self.server_url}/upload", json=upload_data)
-        return self._handle_response(response, "upload") 
\ No newline at end of file
+        for kwargs in self._upload_requests(upload_data):
+            response = self._post("/upload", **kwargs)
+            # Servers without binary support reject the body; retry as JSON
+            if response.status_code != 415:
+                break
+        return self._handle_response(response, "upload")
+
+
+class AsyncServerAPI(ServerAPI):
+    """
+    asyncio version of ServerAPI with the same requests, timeouts and retries.
+    Uses an httpx.AsyncClient connection pool when httpx is installed and
+    otherwise runs the blocking ServerAPI calls in the default thread pool.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        try:
+            import httpx
+        except ImportError:
+            self.client = None
+        else:
+            self._httpx = httpx
+            self.client = httpx.AsyncClient(base_url=self.server_url, timeout=self._httpx_timeout(httpx))
+
+    def _httpx_timeout(self, httpx):
+        if isinstance(self.timeout, tuple):
+            connect, read = self.timeout
+            return httpx.Timeout(read, connect=connect)
+        return httpx.Timeout(self.timeout)
+
+    async def aclose(self):
+        if self.client is not None:
+            await self.client.aclose()
+        self.close()
+
+    async def _apost(self, path, **kwargs):
+        # httpx takes raw request bodies as content=
+        if "data" in kwargs:
+            kwargs["content"] = kwargs.pop("data")
+        for attempt in range(self.retries + 1):
+            try:
+                response = await self.client.post(path, **kwargs)
+                if response.status_code not in RETRY_STATUS or attempt == self.retries:
+                    return response
+            except self._httpx.TransportError:
+                if attempt == self.retries:
+                    raise
+            await asyncio.sleep(backoff_delay(attempt, self.backoff))
+
+    async def _in_thread(self, method, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, method, *args)
+
+    async def join_round(self, join_code, user_info=None):
+        if self.client is None:
+            return await self._in_thread(super().join_round, join_code, user_info)
+        response = await self._apost("/join", **self._join_request(join_code, user_info))
+        return self._handle_response(response, "join round")
+
+    async def sync_contract(self, join_code, etag=None, known_round=None, known_tag=None):
+        if self.client is None:
+            return await self._in_thread(super().sync_contract, join_code, etag, known_round, known_tag)
+        return self._sync_result(await self._apost("/sync", **self._sync_request(join_code, etag, known_round, known_tag)))
+
+    async def upload_model(self, upload_data):
+        if self.client is None:
+            return await self._in_thread(super().upload_model, upload_data)
+        for kwargs in self._upload_requests(upload_data):
+            response = await self._apost("/upload", **kwargs)
+            if response.status_code != 415:
+                break
+        return self._handle_response(response, "upload")
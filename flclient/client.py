@@ -2,20 +2,32 @@
 Main federated learning client class.
 """
 
-import json
-import os
+import time
+import numpy as np
 from .api import ServerAPI
-from .training import TrainingManager
+from .compression import compress_update, payload_nbytes, xor_delta_decode
+from .inference import predict_file
+from .training import TrainingManager, create_model
 from .config import SERVER_URL, USERNAME, EMAIL, CLIENT_ID
+from .storage import FileStorage
+from .telemetry import PhaseTimer
+from .weights import WeightVector, layout_for
 
 
 class FederatedClient:
-    def __init__(self, server_url=SERVER_URL):
+    def __init__(self, server_url=SERVER_URL, client_id=CLIENT_ID, user=None, storage=None):
         self.api = ServerAPI(server_url)
         self.training_manager = None
         self.config = None
         self.join_code = None
-        self.user = {"username": USERNAME, "email": EMAIL}
+        self.client_id = client_id
+        self.user = user or {"username": USERNAME, "email": EMAIL}
+        # Contract, training result and residual; files in flclient/ unless given (see storage.py)
+        self.storage = storage or FileStorage()
+        # Client-side phase timings of the current round, reported with the upload
+        self.timer = PhaseTimer()
+        # Seconds the last upload took; an upload cannot report its own duration
+        self.last_upload_time = None
 
     def join_round(self, join_code):
         """Join a federated learning round."""
@@ -34,37 +46,37 @@ class FederatedClient:
         for k in ["learning_rate", "epochs", "batch_size"]:
             if k in tp:
                 self.config[k] = tp[k]
-        # Save contract to file
-        contract_path = os.path.join(os.path.dirname(__file__), "contract.json")
-        with open(contract_path, "w") as f:
-            json.dump(self.config, f, indent=2)
+        self._attach_layout(self.config)
+        # Save contract to storage
+        self._save_contract()
         print("Joined round successfully")
         return self.config
     
     def load_contract(self):
         """Load contract from file if it exists."""
-        try:
-            contract_path = os.path.join(os.path.dirname(__file__), "contract.json")
-            with open(contract_path, "r") as f:
-                self.config = json.load(f)
-                self.join_code = self.config.get("join_code")
-                return self.config
-        except FileNotFoundError:
+        config = self.storage.load_json("contract.json")
+        if config is None:
             return None
+        weights = self.storage.load_weights("contract")
+        if weights is not None:
+            config["initial_weights"] = weights
+        # A contract.json written before the weights were stored separately holds them as a list
+        self._attach_layout(config)
+        self.config = config
+        self.join_code = self.config.get("join_code")
+        return self.config
     
     def setup(self):
         """Setup training components."""
-        # Always sync contract from server before setup
+        # Always check the contract with the server before setup
         if not self.config or not self.join_code:
             self.load_contract()
         if not self.join_code:
             raise ValueError("Must join round first or have join_code in contract.json")
-        # Sync contract from server
-        data = self.api.sync_contract(self.join_code)
-        if "contract" in data:
-            self.config = data["contract"]
-        else:
-            self.config = data
+        # Sync contract from server (a no-op round trip when nothing changed)
+        self.timer = PhaseTimer()
+        with self.timer.phase("sync"):
+            self._sync_from_server()
         # Always persist join_code
         self.config["join_code"] = self.join_code
         # Copy training params to top level if present
@@ -72,25 +84,93 @@ class FederatedClient:
         for k in ["learning_rate", "epochs", "batch_size"]:
             if k in tp:
                 self.config[k] = tp[k]
-        # Save latest contract to file (as cache)
-        contract_path = os.path.join(os.path.dirname(__file__), "contract.json")
-        with open(contract_path, "w") as f:
-            json.dump(self.config, f, indent=2)
+        # Save latest contract to storage (as cache)
+        self._save_contract()
         self.training_manager = TrainingManager(self.config)
         self.training_manager.setup()
     
-    def train(self, data_path):
-        """Train the model."""
+    def _sync_from_server(self):
+        """
+        Sync the contract, sending the cached ETag and round so the server can
+        answer 304 or send only a weight delta from the cached round.
+        """
+        cached = self.config or {}
+        has_weights = cached.get("initial_weights") is not None and len(cached["initial_weights"]) > 0
+        known_round = cached.get("round_id") if has_weights else None
+        data = self.api.sync_contract(self.join_code, etag=cached.get("etag") if has_weights else None,
+                                      known_round=known_round, known_tag=cached.get("weights_tag"))
+        if data is None:
+            print(f"Contract is up to date (round {known_round})")
+            return
+        if "contract" in data:
+            data = data["contract"]
+        if "weights_delta" in data:
+            data["initial_weights"] = xor_delta_decode(data.pop("weights_delta"), cached["initial_weights"])
+        elif "initial_weights" not in data:
+            # Only the contract changed; the cached weights are still current
+            data["initial_weights"] = cached.get("initial_weights")
+        self._attach_layout(data)
+        self.config = data
+
+    @staticmethod
+    def _attach_layout(config):
+        """Wrap the contract's global weights in a WeightVector with the contract's layer layout."""
+        weights = config.get("initial_weights")
+        if weights is not None and len(weights) > 0 and not isinstance(weights, WeightVector):
+            config["initial_weights"] = WeightVector(layout_for(config), weights)
+
+    def _save_contract(self):
+        """Save the contract as contract.json, with the global weights kept apart in contract.flw."""
+        weights = self.config.get("initial_weights")
+        self.storage.save_json("contract.json", {k: v for k, v in self.config.items() if k != "initial_weights"})
+        if weights is not None and len(weights) > 0:
+            self.storage.save_weights("contract", weights)
+        else:
+            self.storage.remove_weights("contract")
+
+    def _load_result(self):
+        """The saved training result with its model_update, or None if there is none."""
+        result = self.storage.load_json("result.json")
+        if result is None:
+            return None
+        weights = self.storage.load_weights("result")
+        if weights is not None:
+            result["model_update"] = weights
+        return result
+
+    def train(self, data_path, time_budget=None, sample_budget=None):
+        """
+        Train the model. time_budget (seconds) and sample_budget (training samples
+        over all epochs) limit the local epochs, overriding the contract's budgets.
+        """
+        if not self._ready_to_train(time_budget, sample_budget):
+            return None
+        return self._save_result(self.training_manager.train(data_path))
+
+    def train_arrays(self, X, y, time_budget=None, sample_budget=None):
+        """Train the model on in-memory arrays instead of a CSV file."""
+        if not self._ready_to_train(time_budget, sample_budget):
+            return None
+        return self._save_result(self.training_manager.train_arrays(X, y))
+
+    def _ready_to_train(self, time_budget=None, sample_budget=None):
         # Always ensure config is up to date before training
         if not self.training_manager:
             self.setup()
         if not self.config:
             print("Error: Config not loaded. Please sync first.")
-            return None
+            return False
         if not self.training_manager:
             print("Error: Training manager not initialized.")
-            return None
-        metadata = self.training_manager.train(data_path)
+            return False
+        if time_budget is not None:
+            self.training_manager.time_budget = time_budget
+        if sample_budget is not None:
+            self.training_manager.sample_budget = sample_budget
+        return True
+
+    def _save_result(self, metadata):
+        """Save the training metadata as result.json and the trained weights as result.flw, for upload."""
         if metadata is None:
             return None
         model = self.training_manager.model
@@ -101,40 +181,89 @@ class FederatedClient:
         training_metadata = {
             "training_time_sec": metadata.get("training_time"),
             "epochs_completed": metadata.get("epochs"),
+            "epochs_planned": metadata.get("epochs_planned"),
+            "local_steps": metadata.get("local_steps"),
+            "stop_reason": metadata.get("stop_reason"),
+            "val_losses": metadata.get("val_losses"),
             "local_accuracy": metadata.get("accuracy"),
-            "local_loss": metadata.get("loss", None)
+            "local_loss": metadata.get("loss", None),
+            "num_samples": metadata.get("num_samples"),
+            "timings": dict(self.timer.timings, **metadata.get("timings", {})),
+            "epoch_times": metadata.get("epoch_times"),
+            "samples_per_sec": metadata.get("samples_per_sec"),
+            "peak_rss_bytes": metadata.get("peak_rss_bytes")
         }
         result = {
-            "client_id": self.config.get("client_id", "client_1"),
+            "client_id": self.client_id,
             "round_id": self.config.get("round_id", 1),
-            "model_update": model_update,
+            # The global weights the model started from, which compressed uploads are a delta against
+            "weights_tag": self.config.get("weights_tag"),
             "training_metadata": training_metadata
         }
-        result_path = os.path.join(os.path.dirname(__file__), "result.json")
-        with open(result_path, "w") as f:
-            json.dump(result, f, indent=2)
+        self.storage.save_weights("result", model_update)
+        self.storage.save_json("result.json", result)
         print("Saved training result to result.json")
         return metadata
 
     def upload(self, metadata=None):
         """Upload model results to server in the new format."""
-        # Read from result.json
-        try:
-            result_path = os.path.join(os.path.dirname(__file__), "result.json")
-            with open(result_path, "r") as f:
-                upload_data = json.load(f)
-        except FileNotFoundError:
+        # Read from result.json and result.flw
+        start = time.perf_counter()
+        upload_data = self._load_result()
+        if upload_data is None:
             print("Error: result.json not found. Please run train first.")
             return None
         print("Uploading model update...")
         try:
             upload_data["user"] = self.user  # Add user info to upload
-            upload_data["client_id"] = CLIENT_ID  # Ensure correct client_id
-            response = self.api.upload_model(upload_data)
+            upload_data["client_id"] = self.client_id  # Ensure correct client_id
+            payload, residual = self._compress_update(upload_data)
+            timings = payload.setdefault("training_metadata", {}).setdefault("timings", {})
+            timings["serialize"] = time.perf_counter() - start
+            if self.last_upload_time is not None:
+                timings["upload_previous"] = self.last_upload_time
+            start = time.perf_counter()
+            response = self.api.upload_model(payload)
+            self.last_upload_time = time.perf_counter() - start
             print(f"Server response: {response}")
+            # Keep the error left over by lossy compression for the next round
+            if residual is not None:
+                self.storage.save_array("residual", residual)
         except Exception as e:
+            # Transient failures were already retried; keep result.json so the upload can be repeated
             print(f"Failed to upload to server: {e}")
+            return None
         return upload_data
+
+    def _compress_update(self, upload_data):
+        """Replace the dense model update with a compressed delta if the contract asks for one."""
+        compression = (self.config or {}).get("compression") or {}
+        scheme = compression.get("scheme", "none")
+        if scheme == "none":
+            return upload_data, None
+        # The server applies the delta to the round the model was trained on; a sync since
+        # training replaced the cached global weights with a later round's
+        if (self.config.get("round_id") != upload_data.get("round_id")
+                or self.config.get("weights_tag") != upload_data.get("weights_tag")):
+            print(f"Warning: the cached global weights are not those of round {upload_data.get('round_id')}, "
+                  "uploading dense weights")
+            return upload_data, None
+        base = np.asarray(self.config.get("initial_weights"), dtype=np.float64)
+        update = np.asarray(upload_data["model_update"], dtype=np.float64)
+        if base.shape != update.shape:
+            print("Warning: no global weights for this round, uploading dense weights")
+            return upload_data, None
+        residual = self.storage.load_array("residual")
+        compressed, residual = compress_update(
+            update - base, scheme,
+            block_size=compression.get("block_size", 256),
+            topk_ratio=compression.get("topk_ratio", 0.01),
+            residual=residual
+        )
+        print(f"Compressed update with {scheme}: {update.nbytes} -> {payload_nbytes(compressed)} bytes")
+        payload = {k: v for k, v in upload_data.items() if k != "model_update"}
+        payload["compressed_update"] = compressed
+        return payload, residual
     
     def run_full_cycle(self, join_code, data_path):
         """Run complete federated learning cycle."""
@@ -142,41 +271,36 @@ class FederatedClient:
         
         self.join_round(join_code)
         self.setup()
-        if not self.training_manager:
-            print("Error: Training manager not initialized.")
-            return None
-        metadata = self.training_manager.train(data_path)
+        metadata = self.train(data_path)
         if metadata is None:
             return None
-        model = self.training_manager.model
-        if not model or not hasattr(model, 'get_flat_weights'):
-            print("Error: Model not initialized or does not implement get_flat_weights.")
-            return None
-        model_update = model.get_flat_weights()
-        training_metadata = {
-            "training_time_sec": metadata.get("training_time"),
-            "epochs_completed": metadata.get("epochs"),
-            "local_accuracy": metadata.get("accuracy"),
-            "local_loss": metadata.get("loss", None)
-        }
-        if not self.config:
-            print("Error: Config not loaded.")
-            return None
-        result = {
-            "client_id": self.config.get("client_id", "client_1"),
-            "round_id": self.config.get("round_id", 1),
-            "model_update": model_update,
-            "training_metadata": training_metadata
-        }
-        result_path = os.path.join(os.path.dirname(__file__), "result.json")
-        with open(result_path, "w") as f:
-            json.dump(result, f, indent=2)
-        print("Saved training result to result.json")
         upload_data = self.upload(metadata)
         
         print("Full cycle completed!")
         return {"metadata": metadata, "upload": upload_data} 
 
+    def predict(self, data_path, out_path, model="global", batch_size=65536, workers=1):
+        """
+        Score data_path with the global weights from the synced contract, or with the
+        locally trained weights in result.json (model="local"), and write the
+        probabilities to out_path (see inference.predict_file).
+        """
+        if not self.config:
+            self.load_contract()
+        if not self.config:
+            raise ValueError("No contract; join a round or sync first")
+        config = dict(self.config)
+        if model == "local":
+            result = self._load_result()
+            if result is None:
+                raise ValueError("result.json not found; run train first")
+            config["initial_weights"] = result["model_update"]
+        elif config.get("initial_weights") is None or len(config["initial_weights"]) == 0:
+            raise ValueError("The contract has no global weights; sync first")
+        trained = create_model(config)
+        trained.is_trained = True
+        return predict_file(trained, config, data_path, out_path, batch_size=batch_size, workers=workers)
+
     def sync_contract(self):
         """Pull the latest contract from the server and save it as contract.json."""
         if not self.join_code:
@@ -184,11 +308,7 @@ class FederatedClient:
         if not self.join_code:
             raise ValueError("Must join round first or have join_code in contract.json")
         print("Syncing contract from server...")
-        data = self.api.sync_contract(self.join_code)
-        if "contract" in data:
-            self.config = data["contract"]
-        else:
-            self.config = data
+        self._sync_from_server()
         # Always persist join_code
         self.config["join_code"] = self.join_code
         # Copy training params to top level if present
@@ -196,7 +316,5 @@ class FederatedClient:
         for k in ["learning_rate", "epochs", "batch_size"]:
             if k in tp:
                 self.config[k] = tp[k]
-        contract_path = os.path.join(os.path.dirname(__file__), "contract.json")
-        with open(contract_path, "w") as f:
-            json.dump(self.config, f, indent=2)
-        print("Contract synced and saved to flclient/contract.json") 
\ No newline at end of file
+        self._save_contract()
+        print("Contract synced and saved to contract.json") 
\ No newline at end of file
@@ -0,0 +1,121 @@
+"""
+Compression of model updates sent from clients to the server.
+
+Compressed updates are deltas against the round's global weights:
+  - "delta":   float64 delta, lossless
+  - "float16": delta cast to float16
+  - "int8":    delta quantized to int8 with one float32 scale per block
+  - "topk":    only the k largest-magnitude delta entries (indices + float32 values)
+
+Lossy schemes use error feedback: the part of the delta that was not sent is kept
+by the client as a residual and added to the next round's delta.
+Reference: Seide, F., et al. (2014). "1-bit stochastic gradient descent and its application
+to data-parallel distributed training of speech DNNs." Interspeech.
+
+Global weights sent by the server use a lossless "xor" delta between two rounds:
+the XOR of the float64 bit patterns, byte-shuffled and zlib-compressed, so the
+client reconstructs the new round bit for bit.
+"""
+import zlib
+import numpy as np
+
+SCHEMES = ("none", "delta", "float16", "int8", "topk")
+LOSSY_SCHEMES = ("float16", "int8", "topk")
+
+
+def compress_update(delta, scheme, block_size=256, topk_ratio=0.01, residual=None):
+    """
+    Compress a float64 delta. Returns (payload, residual) where residual is the
+    error left over for the next round (None for lossless schemes).
+    """
+    if scheme not in SCHEMES or scheme == "none":
+        raise ValueError(f"Unknown compression scheme: {scheme}")
+    delta = np.asarray(delta, dtype=np.float64)
+    if residual is not None and scheme in LOSSY_SCHEMES and residual.shape == delta.shape:
+        delta = delta + residual
+    size = delta.shape[0]
+    payload = {"scheme": scheme, "size": size}
+    if scheme == "delta":
+        payload["values"] = delta
+        return payload, None
+    if scheme == "float16":
+        payload["values"] = delta.astype(np.float16)
+    elif scheme == "int8":
+        n_blocks = -(-size // block_size)
+        padded = np.zeros(n_blocks * block_size, dtype=np.float64)
+        padded[:size] = delta
+        blocks = padded.reshape(n_blocks, block_size)
+        scales = np.abs(blocks).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        quantized = np.rint(blocks / scales[:, None]).astype(np.int8)
+        payload["block_size"] = block_size
+        payload["values"] = quantized.reshape(-1)[:size]
+        payload["scales"] = scales.astype(np.float32)
+    elif scheme == "topk":
+        k = min(size, max(1, int(np.ceil(topk_ratio * size))))
+        indices = np.argpartition(np.abs(delta), size - k)[size - k:]
+        indices.sort()
+        payload["indices"] = indices.astype(np.int32)
+        payload["values"] = delta[indices].astype(np.float32)
+    residual = delta - decompress_update(payload)
+    return payload, residual
+
+
+def decompress_update(payload):
+    """Decode a compressed payload back into a dense float64 delta; raises ValueError if it is malformed."""
+    if not isinstance(payload, dict):
+        raise ValueError("Compressed update must be an object")
+    scheme = payload.get("scheme")
+    size = int(payload["size"])
+    if scheme in ("delta", "float16"):
+        values = np.asarray(payload["values"], dtype=np.float64)
+        if values.shape != (size,):
+            raise ValueError(f"Expected {size} values, got {values.size}")
+        return values
+    if scheme == "int8":
+        block_size = int(payload["block_size"])
+        if block_size <= 0:
+            raise ValueError(f"Block size must be positive, got {block_size}")
+        values = np.asarray(payload["values"], dtype=np.int8)
+        scales = np.asarray(payload["scales"], dtype=np.float64)
+        if values.shape != (size,) or scales.shape != (-(-size // block_size),):
+            raise ValueError("Malformed int8 payload")
+        return values * np.repeat(scales, block_size)[:size]
+    if scheme == "topk":
+        indices = np.asarray(payload["indices"], dtype=np.int64)
+        values = np.asarray(payload["values"], dtype=np.float64)
+        if indices.shape != values.shape or (indices.size and (indices.min() < 0 or indices.max() >= size)):
+            raise ValueError("Malformed top-k payload")
+        delta = np.zeros(size, dtype=np.float64)
+        delta[indices] = values
+        return delta
+    raise ValueError(f"Unknown compression scheme: {scheme}")
+
+
+def payload_nbytes(payload):
+    """Bytes taken by the arrays of a compressed payload."""
+    return sum(np.asarray(v).nbytes for k, v in payload.items() if k in ("values", "scales", "indices"))
+
+
+def xor_delta_encode(new, old):
+    """Lossless delta from old to new float64 weights."""
+    new = np.ascontiguousarray(new, dtype=np.float64)
+    old = np.ascontiguousarray(old, dtype=np.float64)
+    bits = np.bitwise_xor(new.view(np.uint64), old.view(np.uint64))
+    # Group byte planes so the mostly-zero sign/exponent bytes compress into long runs
+    shuffled = bits.view(np.uint8).reshape(-1, 8).T.tobytes()
+    compressed = zlib.compress(shuffled, 1)
+    return {"scheme": "xor", "size": new.shape[0], "values": np.frombuffer(compressed, dtype=np.uint8)}
+
+
+def xor_delta_decode(payload, old):
+    """Rebuild the new float64 weights from an xor delta and the old weights."""
+    if payload.get("scheme") != "xor":
+        raise ValueError(f"Expected an xor delta, got {payload.get('scheme')}")
+    old = np.ascontiguousarray(old, dtype=np.float64)
+    size = int(payload["size"])
+    if old.shape != (size,):
+        raise ValueError(f"Base has {old.size} weights, delta expects {size}")
+    shuffled = zlib.decompress(np.asarray(payload["values"], dtype=np.uint8).tobytes())
+    bits = np.frombuffer(shuffled, dtype=np.uint8).reshape(8, size).T.copy().view(np.uint64).reshape(-1)
+    return np.bitwise_xor(bits, old.view(np.uint64)).view(np.float64)
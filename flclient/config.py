@@ -6,4 +6,16 @@ SERVER_URL = "http://localhost:3197"
 # User configuration
 USERNAME = "santosh"
 EMAIL = "santosh@example.com"
-CLIENT_ID = "client_1"
\ No newline at end of file
+CLIENT_ID = "client_1"
+
+# Transport configuration: "binary" sends weights as raw float buffers, "json" as float lists
+WIRE_FORMAT = "binary"
+
+# Request timeouts in seconds (connect, read) and retries of failed requests
+REQUEST_TIMEOUT = (5, 60)
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.5  # Base delay, doubled on every retry
+RETRY_BACKOFF_MAX = 10
+
+# Binary copies of training CSVs, memory-mapped on later runs
+DATA_CACHE_DIR = os.environ.get("FLCLIENT_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "flclient"))
\ No newline at end of file
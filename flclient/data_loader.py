@@ -2,9 +2,30 @@
 Data loader for federated learning client.
 Reference: Kohavi, R. (1995). "A study of cross-validation and bootstrap for accuracy estimation and model selection." IJCAI.
 """
+import hashlib
+import json
+import os
+import shutil
 import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split
+from .config import DATA_CACHE_DIR
+
+_HASH_BUCKETS = 1 << 20
+
+
+def _row_hash(row_ids, seed):
+    """SplitMix64 hash of row indices, so the split of a row never depends on chunking."""
+    with np.errstate(over="ignore"):
+        z = row_ids.astype(np.uint64) + np.uint64(seed) * np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+
+def _digest(key):
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:20]
+
 
 class DataLoader:
     """
@@ -14,10 +35,25 @@ class DataLoader:
     def __init__(self, config):
         self.feature_columns = config["feature_columns"]
         self.target_column = config["target_column"]
+        tp = config.get("training_params", {})
+        # Streaming mode reads the CSV in chunks instead of loading it whole
+        self.streaming = tp.get("streaming", False)
+        self.chunk_size = tp.get("chunk_size", 100_000)
+        self.dtype = np.dtype(tp.get("dtype", "float64"))
+        # Binary .npy copy of each CSV, memory-mapped on later runs
+        self.use_cache = tp.get("data_cache", True)
+        self.cache_dir = tp.get("cache_dir", DATA_CACHE_DIR)
+        # Positive label of each CSV streamed without the cache, by path, mtime and size
+        self._positive_labels = {}
     def load_data(self, csv_path):
         """
         Load data from CSV and extract features/target.
+        With the data cache enabled, later runs memory-map the converted arrays instead of parsing.
         """
+        if self.use_cache:
+            X, y = self.cached_arrays(csv_path)
+            print(f"Loaded {X.shape[0]} samples from {csv_path} (memory-mapped cache)")
+            return X, y
         data = pd.read_csv(csv_path)
         print(f"Loaded {data.shape[0]} samples from {csv_path}")
         X = np.asarray(data[self.feature_columns].values)
@@ -30,4 +66,142 @@ class DataLoader:
         """
         Standard train/test split (Kohavi, 1995).
         """
-        return train_test_split(X, y, test_size=test_size, random_state=42) 
\ No newline at end of file
+        return train_test_split(X, y, test_size=test_size, random_state=42)
+    def cached_arrays(self, csv_path):
+        """
+        Return (X, y) memory-mapped from the binary cache, converting the CSV on first use.
+        The cache is keyed by the file's path, mtime and size and the contract's columns;
+        building it removes the entries of older versions of the same file.
+        """
+        path = self._cache_path(csv_path)
+        if not os.path.exists(path):
+            self._build_cache(csv_path, path)
+        X = np.load(os.path.join(path, "X.npy"), mmap_mode="r")
+        y = np.load(os.path.join(path, "y.npy"), mmap_mode="r")
+        return X, y
+    def _cache_path(self, csv_path):
+        """Cache entry named <source>-<version>: the path and columns, then the file's mtime and size."""
+        stat = os.stat(csv_path)
+        source = json.dumps([os.path.abspath(csv_path), self.feature_columns, self.target_column])
+        version = json.dumps([stat.st_mtime_ns, stat.st_size])
+        return os.path.join(self.cache_dir, f"{_digest(source)}-{_digest(version)}")
+    def _remove_stale_caches(self, path):
+        """Delete cache entries of other versions of the file cached at path."""
+        name = os.path.basename(path)
+        prefix = name.split("-")[0] + "-"
+        for entry in os.listdir(self.cache_dir):
+            # Skip in-progress builds, which another process is still writing
+            if entry.startswith(prefix) and entry != name and ".tmp-" not in entry:
+                shutil.rmtree(os.path.join(self.cache_dir, entry), ignore_errors=True)
+    def _build_cache(self, csv_path, path):
+        """Convert the CSV chunk by chunk into .npy files, then publish them with an atomic rename."""
+        labels, n_rows = self._scan_target(csv_path)
+        positive_label = labels[-1] if len(labels) == 2 else None
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        os.makedirs(tmp_path, exist_ok=True)
+        try:
+            X = np.lib.format.open_memmap(os.path.join(tmp_path, "X.npy"), mode="w+", dtype=np.float64,
+                                          shape=(n_rows, len(self.feature_columns)))
+            y = np.lib.format.open_memmap(os.path.join(tmp_path, "y.npy"), mode="w+",
+                                          dtype=np.int64 if positive_label is not None else np.float64,
+                                          shape=(n_rows,))
+            start = 0
+            for X_chunk, y_chunk in self._read_csv_chunks(csv_path, np.float64, positive_label):
+                X[start:start + X_chunk.shape[0]] = X_chunk
+                y[start:start + X_chunk.shape[0]] = y_chunk
+                start += X_chunk.shape[0]
+            X.flush()
+            y.flush()
+            del X, y
+            try:
+                os.replace(tmp_path, path)
+            except OSError:
+                # Another process published the same cache first
+                shutil.rmtree(tmp_path, ignore_errors=True)
+            else:
+                self._remove_stale_caches(path)
+        except BaseException:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+        print(f"Cached {n_rows} samples from {csv_path} in {path}")
+    def _scan_target(self, csv_path):
+        """
+        Distinct target values and the row count, from a pass over the target column only.
+        """
+        labels = set()
+        n_rows = 0
+        for chunk in pd.read_csv(csv_path, usecols=[self.target_column], chunksize=self.chunk_size):
+            labels.update(pd.unique(chunk[self.target_column]))
+            n_rows += len(chunk)
+        return sorted(labels), n_rows
+    def _positive_label(self, csv_path):
+        """Label mapped to 1 for a binary target, or None; scanned once per file version."""
+        stat = os.stat(csv_path)
+        key = (os.path.abspath(csv_path), stat.st_mtime_ns, stat.st_size)
+        if key not in self._positive_labels:
+            labels, _ = self._scan_target(csv_path)
+            self._positive_labels[key] = labels[-1] if len(labels) == 2 else None
+        return self._positive_labels[key]
+    def _read_csv_chunks(self, csv_path, dtype, positive_label):
+        """Read only the contract's columns, chunk by chunk, with binary targets mapped to 0/1."""
+        dtypes = {column: dtype for column in self.feature_columns}
+        reader = pd.read_csv(csv_path, usecols=self.feature_columns + [self.target_column],
+                             dtype=dtypes, chunksize=self.chunk_size)
+        for chunk in reader:
+            X = chunk[self.feature_columns].to_numpy(dtype=dtype)
+            y = chunk[self.target_column].to_numpy()
+            if positive_label is not None:
+                y = (y == positive_label).astype(int)
+            yield X, y
+    def iter_chunks(self, csv_path, split=None, test_size=0.2, seed=42):
+        """
+        Stream (X, y) chunks of at most chunk_size rows, from the memory-mapped cache
+        or, without it, reading only the contract's columns from the CSV.
+        Binary targets are mapped to 0/1 as in load_data. With split="train"/"test",
+        each row is assigned by hashing its row index, which reproduces the same
+        random partition (Kohavi, 1995) on every pass.
+        """
+        if self.use_cache:
+            X_all, y_all = self.cached_arrays(csv_path)
+            chunks = ((X_all[i:i + self.chunk_size], y_all[i:i + self.chunk_size])
+                      for i in range(0, X_all.shape[0], self.chunk_size))
+        else:
+            chunks = self._read_csv_chunks(csv_path, self.dtype, self._positive_label(csv_path))
+        threshold = np.uint64(int(test_size * _HASH_BUCKETS))
+        start = 0
+        for X, y in chunks:
+            n = X.shape[0]
+            X = np.asarray(X, dtype=self.dtype)
+            if split is not None:
+                row_ids = np.arange(start, start + n)
+                in_test = (_row_hash(row_ids, seed) % np.uint64(_HASH_BUCKETS)) < threshold
+                keep = in_test if split == "test" else ~in_test
+                X, y = X[keep], y[keep]
+            start += n
+            yield X, y
+    def iter_features(self, path, dtype=None):
+        """
+        Stream feature chunks of at most chunk_size rows for prediction: slices of a
+        memory-mapped .npy feature matrix, in the file's dtype, or the contract's
+        feature columns of a CSV parsed as dtype (no target column is needed).
+        """
+        dtype = np.dtype(dtype or self.dtype)
+        if path.endswith(".npy"):
+            X_all = np.load(path, mmap_mode="r")
+            for i in range(0, X_all.shape[0], self.chunk_size):
+                yield X_all[i:i + self.chunk_size]
+            return
+        dtypes = {column: dtype for column in self.feature_columns}
+        for chunk in pd.read_csv(path, usecols=self.feature_columns, dtype=dtypes, chunksize=self.chunk_size):
+            yield chunk[self.feature_columns].to_numpy(dtype=dtype)
+    def iter_batches(self, csv_path, batch_size, split="train", shuffle=True):
+        """
+        Generate mini-batches from a streamed split. Rows are shuffled within each
+        chunk, so peak memory is bounded by the chunk size.
+        """
+        for X, y in self.iter_chunks(csv_path, split=split):
+            if shuffle:
+                perm = np.random.permutation(X.shape[0])
+                X, y = X[perm], y[perm]
+            for i in range(0, X.shape[0], batch_size):
+                yield X[i:i+batch_size], y[i:i+batch_size]
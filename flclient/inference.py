@@ -0,0 +1,155 @@
+"""
+Batched inference with the global (or locally trained) model over files too
+large to load at once.
+
+Features are streamed in chunks (DataLoader.iter_features) and scored by a
+BatchPredictor: the model's dense layers cast once to float32, with the input
+and activation buffers allocated once and reused for every batch, so scoring
+allocates nothing per batch. Chunks can be spread over a process pool; results
+are written in input order as a .npy array of probabilities or as CSV.
+"""
+import collections
+import os
+import struct
+import time
+import numpy as np
+from multiprocessing import get_context
+from .data_loader import DataLoader
+from .models.kernels import ACTIVATIONS
+
+# Placeholder shape for the .npy header until the number of rows is known
+_NPY_MAX_ROWS = 10 ** 15
+
+# Per-process predictor of pool workers, set by _init_worker
+_worker = {}
+
+
+class BatchPredictor:
+    """
+    Scores rows with a model's layers (BaseModel.layers) in batches of batch_size
+    rows, in dtype (float32 by default), reusing preallocated buffers.
+    """
+    def __init__(self, layers, batch_size=65536, dtype="float32"):
+        self.dtype = np.dtype(dtype)
+        self.batch_size = batch_size
+        self.layers = [(np.ascontiguousarray(W, dtype=self.dtype), np.asarray(b, dtype=self.dtype).reshape(1, -1),
+                        ACTIVATIONS[activation]) for W, b, activation in layers]
+        self.input = np.empty((batch_size, self.layers[0][0].shape[0]), dtype=self.dtype)
+        self.activations = [np.empty((batch_size, W.shape[1]), dtype=self.dtype) for W, _, _ in self.layers]
+
+    @classmethod
+    def from_model(cls, model, batch_size=65536, dtype="float32"):
+        return cls(model.layers(), batch_size, dtype)
+
+    def predict_proba(self, X, out=None):
+        """Probabilities of the positive class for the rows of X, written to out if given."""
+        n = X.shape[0]
+        if out is None:
+            out = np.empty(n, dtype=self.dtype)
+        for start in range(0, n, self.batch_size):
+            m = min(self.batch_size, n - start)
+            h = self.input[:m]
+            np.copyto(h, X[start:start + m], casting="unsafe")
+            for (W, b, activation), buffer in zip(self.layers, self.activations):
+                z = buffer[:m]
+                np.dot(h, W, out=z)
+                z += b
+                h = activation(z, out=z)
+            out[start:start + m] = h[:, 0]
+        return out
+
+
+class NpyWriter:
+    """
+    Appends 1-D float32 results to a .npy file without knowing the final length:
+    the header is written with a placeholder shape and rewritten, at the same
+    size, on close.
+    """
+    def __init__(self, path, dtype="float32"):
+        self.dtype = np.dtype(dtype)
+        self.rows = 0
+        self.file = open(path, "wb")
+        self.header_size = len(self._header(_NPY_MAX_ROWS))
+        self.file.write(self._header(_NPY_MAX_ROWS))
+
+    def _header(self, rows, size=None):
+        fields = f"{{'descr': '{self.dtype.str}', 'fortran_order': False, 'shape': ({rows},), }}"
+        size = size or (len(fields) + 11 + 63) // 64 * 64
+        fields = fields.ljust(size - 11) + "\n"
+        return b"\x93NUMPY\x01\x00" + struct.pack("<H", len(fields)) + fields.encode("latin1")
+
+    def write(self, probabilities):
+        self.file.write(np.ascontiguousarray(probabilities, dtype=self.dtype).tobytes())
+        self.rows += probabilities.shape[0]
+
+    def close(self):
+        self.file.seek(0)
+        self.file.write(self._header(self.rows, self.header_size))
+        self.file.close()
+
+
+class CsvWriter:
+    """Writes "probability,prediction" rows, prediction being the 0.5-threshold class."""
+    def __init__(self, path):
+        self.rows = 0
+        self.file = open(path, "w")
+        self.file.write("probability,prediction\n")
+
+    def write(self, probabilities):
+        labels = (probabilities > 0.5).astype(np.int8)
+        self.file.write("".join(f"{p:.6f},{c}\n" for p, c in zip(probabilities.tolist(), labels.tolist())))
+        self.rows += probabilities.shape[0]
+
+    def close(self):
+        self.file.close()
+
+
+def open_writer(path):
+    """Choose the output format from the file extension: .npy, otherwise CSV."""
+    return NpyWriter(path) if path.endswith(".npy") else CsvWriter(path)
+
+
+def _init_worker(layers, batch_size, dtype):
+    _worker["predictor"] = BatchPredictor(layers, batch_size, dtype)
+
+
+def _predict_chunk(X):
+    return _worker["predictor"].predict_proba(X)
+
+
+def predict_file(model, config, data_path, out_path, batch_size=65536, workers=1, dtype="float32"):
+    """
+    Score every row of data_path (CSV with the contract's feature columns, or a
+    .npy feature matrix) with model and write the probabilities to out_path.
+    With workers > 1, chunks are scored by a process pool, in input order.
+    Returns a dict with the row count, seconds and rows per second.
+    """
+    loader = DataLoader(config)
+    chunks = loader.iter_features(data_path, dtype=dtype)
+    writer = open_writer(out_path)
+    start = time.perf_counter()
+    try:
+        if workers > 1:
+            initargs = (model.layers(), batch_size, dtype)
+            with get_context().Pool(workers, initializer=_init_worker, initargs=initargs) as pool:
+                # At most two chunks per worker in flight, so memory stays bounded when parsing outpaces scoring
+                pending = collections.deque()
+                for X in chunks:
+                    pending.append(pool.apply_async(_predict_chunk, (X,)))
+                    if len(pending) >= 2 * workers:
+                        writer.write(pending.popleft().get())
+                while pending:
+                    writer.write(pending.popleft().get())
+        else:
+            predictor = BatchPredictor.from_model(model, batch_size, dtype)
+            out = np.empty(loader.chunk_size, dtype=predictor.dtype)
+            for X in chunks:
+                writer.write(predictor.predict_proba(X, out=out[:X.shape[0]]))
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - start
+    rows = writer.rows
+    print(f"Predicted {rows} rows in {elapsed:.2f}s ({rows / elapsed if elapsed else 0:,.0f} rows/s) "
+          f"to {out_path}")
+    return {"rows": rows, "seconds": elapsed, "rows_per_sec": rows / elapsed if elapsed else None,
+            "output": os.path.abspath(out_path)}
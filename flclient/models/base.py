@@ -1,4 +1,6 @@
 from abc import ABC, abstractmethod
+import numpy as np
+from . import kernels
 
 
 class BaseModel(ABC):
@@ -7,12 +9,31 @@ class BaseModel(ABC):
     def __init__(self, config):
         self.config = config
         self.is_trained = False
+        # Per-epoch loss logging; the loss is not computed at all when off
+        self.verbose = True
+        # Wall-clock seconds of each epoch of the last training run
+        self.epoch_times = []
+        # Epochs the last training run completed, fewer than epochs if it was stopped
+        self.epochs_run = 0
+        # Mini-batch steps the last training run took
+        self.steps_run = 0
+        # Called with the epoch index after each epoch; returning True stops training
+        # (see training.EarlyStopping)
+        self.epoch_callback = None
+        # When one run is split over several train() calls (parallel.ParallelTrainer): the
+        # epochs the learning-rate schedule spans and the epochs run before this call
+        self.schedule_epochs = None
+        self.epoch_offset = 0
     
     @abstractmethod
     def train(self, X, y):
         """Train the model."""
         pass
     
+    def train_stream(self, make_batches):
+        """Train on mini-batches from make_batches(), called once per epoch."""
+        raise NotImplementedError(f"{type(self).__name__} does not support streaming training")
+    
     @abstractmethod
     def predict(self, X):
         """Make predictions."""
@@ -23,12 +44,44 @@ class BaseModel(ABC):
         """Predict probabilities."""
         pass
     
+    def _begin_optimizer(self, steps_per_epoch=None):
+        """Start the optimizer for a train() call, at its place in the run's schedule."""
+        start_step = self.epoch_offset * steps_per_epoch if steps_per_epoch else 0
+        self.optimizer.begin(self.weights, self.schedule_epochs or self.epochs, steps_per_epoch, start_step)
+    
+    def _end_epoch(self, epoch):
+        """Record a finished epoch and return True if training should stop."""
+        self.epochs_run = epoch + 1
+        self.steps_run = self.optimizer.t
+        return self.epoch_callback is not None and bool(self.epoch_callback(epoch))
+    
+    def logits(self, X):
+        """Pre-sigmoid outputs of the model for the rows of X, shape (n, 1)."""
+        raise NotImplementedError(f"{type(self).__name__} does not compute logits")
+    
+    def loss(self, X, y, batch_size=65536):
+        """Mean binary cross-entropy on (X, y), in batches so memory stays bounded."""
+        total = 0.0
+        for start in range(0, X.shape[0], batch_size):
+            z = self.logits(X[start:start + batch_size])
+            yb = np.asarray(y[start:start + batch_size], dtype=z.dtype).reshape(-1, 1)
+            batch_loss, _ = kernels.bce_with_logits(z, yb, grad_out=z)
+            total += batch_loss * z.shape[0]
+        return total / X.shape[0] if X.shape[0] else 0.0
+    
+    def layers(self):
+        """
+        The model as a list of (W, b, activation) dense layers, input to output,
+        used by inference.BatchPredictor. The last layer's activation is the sigmoid.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support batched inference")
+    
     @abstractmethod
     def set_weights_from_flat(self, flat_weights):
-        """Set model weights from a flat list."""
+        """Set model weights from a flat list, array, WeightVector or raw float64 buffer."""
         pass
     
     @abstractmethod
     def get_flat_weights(self):
-        """Get model weights as a flat list."""
+        """Get a float64 copy of the model weights as a WeightVector (see weights.py)."""
         pass 
\ No newline at end of file
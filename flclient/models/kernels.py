@@ -0,0 +1,72 @@
+"""
+Numerical kernels shared by the models.
+Reference: Goodfellow, I., Bengio, Y., & Courville, A. (2016). "Deep Learning." MIT Press, Section 6.2.2.3.
+"""
+import numpy as np
+
+
+def sigmoid(x, out=None):
+    """
+    Numerically stable sigmoid, 1 / (1 + exp(-x)) = (1 + tanh(x / 2)) / 2.
+    The tanh form never overflows, and with out=x it runs in place without temporaries.
+    """
+    out = np.multiply(x, 0.5, out=out)
+    np.tanh(out, out=out)
+    out += 1
+    out *= 0.5
+    return out
+
+
+def bce_with_logits(z, y, grad_out=None, compute_loss=True):
+    """
+    Fused binary cross-entropy on logits z (Goodfellow et al. 2016, Eq. 6.22).
+
+    Returns (loss, grad) where loss is the mean of softplus(z) - y * z, written in the
+    log-sum-exp form max(z, 0) - y * z + log(1 + exp(-|z|)) so it never overflows,
+    and grad = sigmoid(z) - y is the per-sample derivative of the loss w.r.t. z.
+    The loss is skipped (None) when compute_loss is False.
+    """
+    loss = None
+    if compute_loss:
+        softplus = np.abs(z)
+        np.negative(softplus, out=softplus)
+        np.exp(softplus, out=softplus)
+        np.log1p(softplus, out=softplus)
+        softplus += np.maximum(z, 0)
+        softplus -= y * z
+        loss = float(np.mean(softplus))
+    grad = sigmoid(z, out=grad_out)
+    grad -= y
+    return loss, grad
+
+
+def tanh(x, out=None):
+    return np.tanh(x, out=out)
+
+
+def relu(x, out=None):
+    return np.maximum(x, 0, out=out)
+
+
+def sigmoid_grad(a, out):
+    """Derivative of the sigmoid from its output a: a (1 - a)."""
+    np.subtract(1, a, out=out)
+    out *= a
+    return out
+
+
+def tanh_grad(a, out):
+    """Derivative of tanh from its output a: 1 - a^2."""
+    np.multiply(a, a, out=out)
+    np.subtract(1, out, out=out)
+    return out
+
+
+def relu_grad(a, out):
+    """Derivative of ReLU from its output a: 1 where a > 0. Outputs are >= 0, so this is their sign."""
+    return np.sign(a, out=out)
+
+
+# Hidden-layer activations and their derivatives by contract name (weights.ACTIVATIONS)
+ACTIVATIONS = {"sigmoid": sigmoid, "tanh": tanh, "relu": relu}
+ACTIVATION_GRADS = {"sigmoid": sigmoid_grad, "tanh": tanh_grad, "relu": relu_grad}
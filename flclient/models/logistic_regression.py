@@ -2,8 +2,13 @@
 Logistic Regression implementation based on:
 Cox, D. R. (1958). "The regression analysis of binary sequences." Journal of the Royal Statistical Society: Series B (Methodological), 20(2), 215-242.
 """
+import time
 import numpy as np
+from . import kernels
 from .base import BaseModel
+from .optimizers import create_optimizer
+from ..weights import WeightVector, init_weights, layout_for
+from ..wire import as_weight_array
 
 class LogisticRegressionModel(BaseModel):
     """
@@ -16,50 +21,94 @@ class LogisticRegressionModel(BaseModel):
         self.learning_rate = config["learning_rate"]
         self.epochs = config["epochs"]
         self.batch_size = config["batch_size"]
-        # Flat weights: [beta..., beta_0]
-        if "initial_weights" in config and config["initial_weights"]:
-            self.set_weights_from_flat(config["initial_weights"])
+        # Update rule and learning-rate schedule from training_params (see optimizers.py)
+        self.optimizer = create_optimizer(config)
+        # Flat weights: [beta..., beta_0]; beta and beta_0 (shape (1,)) are views into one WeightVector
+        self.layout = layout_for(config)
+        initial_weights = config.get("initial_weights")
+        if initial_weights is not None and len(initial_weights) > 0:
+            self.set_weights_from_flat(initial_weights)
             print("Loaded initial weights from server (flat)")
         else:
-            self.beta = np.random.uniform(-0.1, 0.1, (self.input_size, 1))
-            self.beta_0 = 0.0
+            self._bind(init_weights(config))
             print("Using random weight initialization")
 
     def sigmoid(self, x):
-        """Sigmoid function as in Cox (1958)."""
-        return 1 / (1 + np.exp(-x))
+        """Sigmoid function as in Cox (1958), numerically stable."""
+        return kernels.sigmoid(x)
 
     def train(self, X, y):
         """
-        Train using mini-batch SGD and the log-likelihood gradient (Cox, 1958).
+        Train using mini-batch gradient descent on the log-likelihood (Cox, 1958),
+        with the configured optimizer.
         """
         n_samples = X.shape[0]
+        self._prepare_training((n_samples + self.batch_size - 1) // self.batch_size)
+        self.epoch_times = []
+        self.epochs_run = 0
         for epoch in range(self.epochs):
+            epoch_start = time.perf_counter()
             perm = np.random.permutation(n_samples)
             X_shuffled = X[perm]
             y_shuffled = y[perm].reshape(-1, 1)
             total_loss = 0
+            # Loss is only needed for the epochs that are logged
+            log_epoch = self.verbose and epoch % 2 == 0
             for i in range(0, n_samples, self.batch_size):
                 X_batch = X_shuffled[i:i+self.batch_size]
                 y_batch = y_shuffled[i:i+self.batch_size]
-                # Linear predictor
-                z = np.dot(X_batch, self.beta) + self.beta_0
-                # Sigmoid output
-                p = self.sigmoid(z)
-                # Log-likelihood loss
-                loss = -np.mean(y_batch * np.log(p + 1e-15) + (1 - y_batch) * np.log(1 - p + 1e-15))
-                total_loss += loss
-                # Gradient (Cox, Eq. 2)
-                error = p - y_batch
-                grad_beta = np.dot(X_batch.T, error) / X_batch.shape[0]
-                grad_beta_0 = np.mean(error)
-                # Update coefficients
-                self.beta -= self.learning_rate * grad_beta
-                self.beta_0 -= self.learning_rate * grad_beta_0
-            if epoch % 2 == 0:
+                total_loss += self._sgd_step(X_batch, y_batch, log_epoch)
+            self.epoch_times.append(time.perf_counter() - epoch_start)
+            if log_epoch:
                 print(f"Epoch {epoch+1}/{self.epochs}, Loss: {total_loss:.4f}")
+            if self._end_epoch(epoch):
+                break
         self.is_trained = True
 
+    def train_stream(self, make_batches):
+        """
+        Train on mini-batches from a generator, e.g. DataLoader.iter_batches.
+        make_batches() is called once per epoch and yields (X_batch, y_batch).
+        """
+        # The number of batches per epoch, which schedules need, is known after the first epoch
+        self._prepare_training(None)
+        self.epoch_times = []
+        self.epochs_run = 0
+        for epoch in range(self.epochs):
+            epoch_start = time.perf_counter()
+            total_loss = 0
+            log_epoch = self.verbose and epoch % 2 == 0
+            for X_batch, y_batch in make_batches():
+                total_loss += self._sgd_step(X_batch, np.asarray(y_batch).reshape(-1, 1), log_epoch)
+            if epoch == 0:
+                self.optimizer.schedule.steps_per_epoch = self.optimizer.t
+            self.epoch_times.append(time.perf_counter() - epoch_start)
+            if log_epoch:
+                print(f"Epoch {epoch+1}/{self.epochs}, Loss: {total_loss:.4f}")
+            if self._end_epoch(epoch):
+                break
+        self.is_trained = True
+
+    def _prepare_training(self, steps_per_epoch):
+        """Allocate the gradient buffer, in the weights' layout, and start the optimizer."""
+        grads = WeightVector(self.layout)
+        self._grad_beta, self._grad_beta_0 = grads.unpack()
+        self._grads = grads.view(np.ndarray)
+        self._begin_optimizer(steps_per_epoch)
+
+    def _sgd_step(self, X_batch, y_batch, compute_loss):
+        """One optimizer step on a mini-batch. Returns the batch loss or 0."""
+        # Linear predictor
+        z = np.dot(X_batch, self.beta) + self.beta_0
+        # Log-likelihood loss and its gradient error = p - y (Cox, Eq. 2), fused on the logits
+        loss, error = kernels.bce_with_logits(z, y_batch, grad_out=z, compute_loss=compute_loss)
+        self._grad_beta[...] = np.dot(X_batch.T, error)
+        self._grad_beta /= X_batch.shape[0]
+        self._grad_beta_0[0] = np.mean(error)
+        # Update coefficients
+        self.optimizer.step(self.weights.view(np.ndarray), self._grads)
+        return loss or 0
+
     def predict(self, X):
         """Predict class labels (threshold 0.5)."""
         if not self.is_trained:
@@ -76,10 +125,19 @@ class LogisticRegressionModel(BaseModel):
         p = self.sigmoid(z)
         return p.flatten()
 
+    def logits(self, X):
+        return np.dot(X, self.beta) + self.beta_0
+
+    def layers(self):
+        return [(self.beta, self.beta_0, "sigmoid")]
+
+    def _bind(self, weights):
+        """Make weights the model's WeightVector, with beta and beta_0 as views into it."""
+        self.weights = weights
+        self.beta, self.beta_0 = weights.unpack()
+
     def set_weights_from_flat(self, flat_weights):
-        flat = np.array(flat_weights)
-        self.beta = flat[:-1].reshape(-1, 1)
-        self.beta_0 = float(flat[-1])
+        self._bind(WeightVector(self.layout, as_weight_array(flat_weights)))
 
     def get_flat_weights(self):
-        return np.concatenate([self.beta.flatten(), [self.beta_0]]).tolist() 
\ No newline at end of file
+        return self.weights.copy()
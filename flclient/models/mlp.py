@@ -2,78 +2,171 @@
 Multi-Layer Perceptron (MLP) implementation based on:
 Rumelhart, D. E., Hinton, G. E., & Williams, R. J. (1986). "Learning representations by back-propagating errors." Nature, 323(6088), 533-536.
 """
+import time
 import numpy as np
+from . import kernels
 from .base import BaseModel
+from .optimizers import create_optimizer
+from ..weights import WeightVector, mlp_init_limits, mlp_layout, mlp_stack, random_weights
+from ..wire import as_weight_array
 
 class MLPModel(BaseModel):
     """
-    Multi-Layer Perceptron with one hidden layer, using sigmoid activation and backpropagation.
-    Closely follows Rumelhart et al. (1986).
+    Multi-Layer Perceptron with a stack of dense hidden layers and a sigmoid
+    output unit, trained by backpropagation. Closely follows Rumelhart et al. (1986).
+    The contract's "hidden_layers" and "activation" declare the stack
+    (weights.mlp_stack); by default it is one sigmoid layer of hidden_size units.
     """
     def __init__(self, config):
         super().__init__(config)
         self.input_size = config["input_size"]  # Number of input units
-        self.hidden_size = config["hidden_size"]  # Number of hidden units
+        # Hidden layers as (units, activation), input to output
+        self.stack = mlp_stack(config)
+        self.hidden_sizes = [units for units, _ in self.stack]
+        self.activations = [activation for _, activation in self.stack] + ["sigmoid"]
         self.learning_rate = config["learning_rate"]
         self.epochs = config["epochs"]
         self.batch_size = config["batch_size"]
-        # Flat weights: [W_ih.flatten(), b_h, W_ho, b_o]
-        if "initial_weights" in config and config["initial_weights"]:
-            self.set_weights_from_flat(config["initial_weights"])
+        # Training precision: "float64" (default) or "float32"
+        self.dtype = np.dtype(config.get("training_params", {}).get("dtype", "float64"))
+        # Update rule and learning-rate schedule from training_params (see optimizers.py)
+        self.optimizer = create_optimizer(config)
+        # Flat weights, e.g. [W_ih.flatten(), b_h, W_ho, b_o]; the parameters are views into one WeightVector
+        self.layout = mlp_layout(self.input_size, self.hidden_sizes)
+        initial_weights = config.get("initial_weights")
+        if initial_weights is not None and len(initial_weights) > 0:
+            self.set_weights_from_flat(initial_weights)
             print("Loaded initial weights from server (flat)")
         else:
-            self.W_ih = np.random.uniform(-0.1, 0.1, (self.input_size, self.hidden_size))
-            self.b_h = np.zeros((1, self.hidden_size))
-            self.W_ho = np.random.uniform(-0.1, 0.1, (self.hidden_size, 1))
-            self.b_o = np.zeros((1, 1))
+            # The same initialization as the server's (weights.init_weights)
+            self._bind(random_weights(self.layout, mlp_init_limits(self.layout, self.activations)))
             print("Using random weight initialization")
 
     def sigmoid(self, x):
-        """Sigmoid activation function (Rumelhart et al., Eq. 1)."""
-        return 1 / (1 + np.exp(-x))
+        """Sigmoid activation function (Rumelhart et al., Eq. 1), numerically stable."""
+        return kernels.sigmoid(x)
 
     def forward(self, X):
-        """Forward pass: computes hidden and output activations."""
-        H = self.sigmoid(np.dot(X, self.W_ih) + self.b_h)  # Hidden activations
-        O = self.sigmoid(np.dot(H, self.W_ho) + self.b_o)  # Output activations
-        return O, H
+        """Forward pass: returns the output activations and the list of hidden activations."""
+        hidden = []
+        A = X
+        for (W, b), activation in zip(self.Ws[:-1], self.activations):
+            A = kernels.ACTIVATIONS[activation](np.dot(A, W) + b)
+            hidden.append(A)
+        W, b = self.Ws[-1]
+        O = self.sigmoid(np.dot(A, W) + b)  # Output activations
+        return O, hidden
 
     def train(self, X, y):
         """
-        Train using mini-batch SGD and backpropagation (Rumelhart et al. 1986, Algorithm 1).
+        Train using mini-batch gradient descent and backpropagation (Rumelhart et al. 1986,
+        Algorithm 1), with the configured optimizer. Mini-batches are gathered into
+        preallocated workspaces and all intermediate results are written in place,
+        so an epoch allocates no per-batch arrays.
         """
+        X = np.asarray(X, dtype=self.dtype)
+        y = np.asarray(y, dtype=self.dtype).reshape(-1, 1)
         n_samples = X.shape[0]
+        # An empty split runs its epochs without any batches, as it did before the workspaces
+        ws = self._prepare_training(max(1, min(self.batch_size, n_samples)))
+        self._begin_optimizer((n_samples + ws.size - 1) // ws.size)
+        self.epoch_times = []
+        self.epochs_run = 0
         for epoch in range(self.epochs):
+            epoch_start = time.perf_counter()
+            # Loss is only needed for the epochs that are logged
+            log_epoch = self.verbose and epoch % 2 == 0
+            total_loss = 0
             perm = np.random.permutation(n_samples)
-            X_shuffled = X[perm]
-            y_shuffled = y[perm].reshape(-1, 1)
+            for i in range(0, n_samples, ws.size):
+                idx = perm[i:i+ws.size]
+                m = idx.shape[0]
+                Xb, yb = ws.X[:m], ws.y[:m]
+                # mode="clip" skips the bounds-check buffering of mode="raise"; perm indices are valid
+                np.take(X, idx, axis=0, out=Xb, mode="clip")
+                np.take(y, idx, axis=0, out=yb, mode="clip")
+                total_loss += self._sgd_step(Xb, yb, ws, log_epoch)
+            self.epoch_times.append(time.perf_counter() - epoch_start)
+            if log_epoch:
+                print(f"Epoch {epoch+1}/{self.epochs}, Loss: {total_loss:.4f}")
+            if self._end_epoch(epoch):
+                break
+        self.is_trained = True
+
+    def train_stream(self, make_batches):
+        """
+        Train on mini-batches from a generator, e.g. DataLoader.iter_batches.
+        make_batches() is called once per epoch and yields (X_batch, y_batch).
+        """
+        ws = self._prepare_training(self.batch_size)
+        # The number of batches per epoch, which schedules need, is known after the first epoch
+        self._begin_optimizer()
+        self.epoch_times = []
+        self.epochs_run = 0
+        for epoch in range(self.epochs):
+            epoch_start = time.perf_counter()
+            log_epoch = self.verbose and epoch % 2 == 0
             total_loss = 0
-            for i in range(0, n_samples, self.batch_size):
-                X_batch = X_shuffled[i:i+self.batch_size]
-                y_batch = y_shuffled[i:i+self.batch_size]
-                # Forward pass
-                O, H = self.forward(X_batch)
-                # Compute error (Eq. 7)
-                error = O - y_batch
-                # Compute loss (cross-entropy)
-                loss = -np.mean(y_batch * np.log(O + 1e-15) + (1 - y_batch) * np.log(1 - O + 1e-15))
-                total_loss += loss
-                # Backpropagation (Eq. 8-13)
-                dO = error * O * (1 - O)  # Output delta
-                dW_ho = np.dot(H.T, dO)
-                db_o = np.sum(dO, axis=0, keepdims=True)
-                dH = np.dot(dO, self.W_ho.T) * H * (1 - H)  # Hidden delta
-                dW_ih = np.dot(X_batch.T, dH)
-                db_h = np.sum(dH, axis=0, keepdims=True)
-                # Update weights (Eq. 14)
-                self.W_ih -= self.learning_rate * dW_ih
-                self.b_h -= self.learning_rate * db_h
-                self.W_ho -= self.learning_rate * dW_ho
-                self.b_o -= self.learning_rate * db_o
-            if epoch % 2 == 0:
+            for X_batch, y_batch in make_batches():
+                X_batch = np.asarray(X_batch, dtype=self.dtype)
+                y_batch = np.asarray(y_batch, dtype=self.dtype).reshape(-1, 1)
+                if X_batch.shape[0] > ws.size:
+                    ws = self._prepare_training(X_batch.shape[0])
+                total_loss += self._sgd_step(X_batch, y_batch, ws, log_epoch)
+            if epoch == 0:
+                self.optimizer.schedule.steps_per_epoch = self.optimizer.t
+            self.epoch_times.append(time.perf_counter() - epoch_start)
+            if log_epoch:
                 print(f"Epoch {epoch+1}/{self.epochs}, Loss: {total_loss:.4f}")
+            if self._end_epoch(epoch):
+                break
         self.is_trained = True
 
+    def _prepare_training(self, batch_size):
+        """Cast parameters to the training dtype and allocate per-batch workspaces."""
+        if self.weights.dtype != self.dtype:
+            self._bind(self.weights.astype(self.dtype))
+        return _Workspace(self, batch_size)
+
+    def _sgd_step(self, Xb, yb, ws, compute_loss):
+        """One optimizer step on a mini-batch, computed in the workspace. Returns the batch loss or 0."""
+        m = Xb.shape[0]
+        ones = ws.ones[:, :m]
+        # Forward pass: each hidden layer computes activation(A . W + b) in place in its buffer
+        A = Xb
+        inputs = [A]
+        for W, b, activate, buffer in ws.hidden:
+            Ab = buffer[:m]
+            np.dot(A, W, out=Ab)
+            Ab += b
+            activate(Ab, out=Ab)
+            inputs.append(Ab)
+            A = Ab
+        Zb = ws.Z[:m]
+        np.dot(A, self.W_ho, out=Zb)
+        Zb += self.b_o
+        # Output layer: fused sigmoid + cross-entropy on the logits, dO = sigmoid(Z) - y
+        delta = ws.dO[:m]
+        loss, _ = kernels.bce_with_logits(Zb, yb, grad_out=delta, compute_loss=compute_loss)
+        # Backpropagation (Eq. 8-13), from the output layer down, into the views of the flat gradient buffer
+        A = inputs.pop()
+        for WT, dW, db, derivative, dA, A_grad in ws.backward:
+            np.dot(A.T, delta, out=dW)
+            np.dot(ones, delta, out=db)
+            # Delta of the layer below: (delta . W^T) * activation'(A)
+            below, grad = dA[:m], A_grad[:m]
+            np.dot(delta, WT, out=below)
+            derivative(A, out=grad)
+            below *= grad
+            delta = below
+            A = inputs.pop()
+        dW, db = ws.dWs[0]
+        np.dot(A.T, delta, out=dW)
+        np.dot(ones, delta, out=db)
+        # Update all weights in place in one call (Eq. 14 for plain SGD)
+        self.optimizer.step(ws.weights, ws.grads)
+        return loss or 0
+
     def predict(self, X):
         """Predict class labels (threshold 0.5)."""
         if not self.is_trained:
@@ -88,24 +181,64 @@ class MLPModel(BaseModel):
         O, _ = self.forward(X)
         return O.flatten()
 
+    def logits(self, X):
+        A = X
+        for (W, b), activation in zip(self.Ws[:-1], self.activations):
+            A = kernels.ACTIVATIONS[activation](np.dot(A, W) + b)
+        W, b = self.Ws[-1]
+        return np.dot(A, W) + b
+
+    def layers(self):
+        return [(W, b, activation) for (W, b), activation in zip(self.Ws, self.activations)]
+
+    def _bind(self, weights):
+        """
+        Make weights the model's WeightVector, with the parameters as views into it:
+        self.Ws lists the (W, b) pairs, input to output, and each layer is also an
+        attribute by its layout name (W_ih, b_h, ... or W_h1, b_h1, ...).
+        """
+        self.weights = weights
+        views = weights.unpack()
+        for (name, _), view in zip(weights.layout, views):
+            setattr(self, name, view)
+        self.Ws = list(zip(views[0::2], views[1::2]))
+
     def set_weights_from_flat(self, flat_weights):
-        flat = np.array(flat_weights)
-        idx = 0
-        W_ih_size = self.input_size * self.hidden_size
-        self.W_ih = flat[idx:idx+W_ih_size].reshape(self.input_size, self.hidden_size)
-        idx += W_ih_size
-        b_h_size = self.hidden_size
-        self.b_h = flat[idx:idx+b_h_size].reshape(1, self.hidden_size)
-        idx += b_h_size
-        W_ho_size = self.hidden_size
-        self.W_ho = flat[idx:idx+W_ho_size].reshape(self.hidden_size, 1)
-        idx += W_ho_size
-        self.b_o = flat[idx:idx+1].reshape(1, 1)
+        self._bind(WeightVector(self.layout, as_weight_array(flat_weights)))
 
     def get_flat_weights(self):
-        return np.concatenate([
-            self.W_ih.flatten(),
-            self.b_h.flatten(),
-            self.W_ho.flatten(),
-            self.b_o.flatten()
-        ]).tolist() 
\ No newline at end of file
+        return self.weights.astype(np.float64)
+
+
+class _Workspace:
+    """Per-batch buffers for MLPModel training, reused for every mini-batch."""
+    def __init__(self, model, size):
+        dtype = model.dtype
+        self.size = size
+        self.X = np.empty((size, model.input_size), dtype=dtype)
+        self.y = np.empty((size, 1), dtype=dtype)
+        # Per hidden layer: activations, activation derivatives and deltas
+        self.A = [np.empty((size, units), dtype=dtype) for units in model.hidden_sizes]
+        self.A_grad = [np.empty((size, units), dtype=dtype) for units in model.hidden_sizes]
+        self.dA = [np.empty((size, units), dtype=dtype) for units in model.hidden_sizes]
+        self.Z = np.empty((size, 1), dtype=dtype)
+        self.dO = np.empty((size, 1), dtype=dtype)
+        # Gradients in the weights' layout, so the optimizer updates every layer at once;
+        # both as plain arrays, which skip the WeightVector subclass dispatch on every operation
+        grads = WeightVector(model.layout, dtype=dtype)
+        views = grads.unpack()
+        self.dWs = list(zip(views[0::2], views[1::2]))
+        # Per-step plans, so a step only loops over prepared tuples:
+        # forward (W, b, activation, buffer) for each hidden layer, and backward
+        # (W^T, dW, db, activation derivative below, delta below, derivative buffer)
+        # for each layer from the output down to the second
+        activations = model.activations[:-1]
+        self.hidden = [(W, b, kernels.ACTIVATIONS[activation], buffer)
+                       for (W, b), activation, buffer in zip(model.Ws, activations, self.A)]
+        self.backward = [(model.Ws[k][0].T, *self.dWs[k], kernels.ACTIVATION_GRADS[activations[k - 1]],
+                          self.dA[k - 1], self.A_grad[k - 1])
+                         for k in range(len(model.Ws) - 1, 0, -1)]
+        self.weights = model.weights.view(np.ndarray)
+        self.grads = grads.view(np.ndarray)
+        # Row of ones: bias gradients as a matrix product, cheaper than a keepdims sum for small batches
+        self.ones = np.ones((1, size), dtype=dtype)
@@ -0,0 +1,166 @@
+"""
+Optimizers and learning-rate schedules shared by the models.
+References:
+Polyak, B. T. (1964). "Some methods of speeding up the convergence of iteration methods." USSR Computational Mathematics and Mathematical Physics, 4(5), 1-17.
+Sutskever, I., Martens, J., Dahl, G., & Hinton, G. (2013). "On the importance of initialization and momentum in deep learning." ICML.
+Kingma, D. P., & Ba, J. (2015). "Adam: A Method for Stochastic Optimization." ICLR.
+Loshchilov, I., & Hutter, F. (2017). "SGDR: Stochastic Gradient Descent with Warm Restarts." ICLR.
+Goyal, P., et al. (2017). "Accurate, Large Minibatch SGD: Training ImageNet in 1 Hour." arXiv:1706.02677.
+
+An optimizer updates a model's flat WeightVector in place from a gradient
+buffer of the same layout, so one call covers every layer. Its state (velocity,
+Adam moments, a scratch buffer) is allocated once per training run in begin();
+step() allocates nothing. step() may overwrite the gradient buffer.
+
+Configured with the contract's learning_rate and these training_params:
+    "optimizer": "sgd" (default), "momentum", "nesterov" or "adam"
+    "momentum": 0.9              momentum and nesterov
+    "beta1", "beta2", "epsilon"  adam (0.9, 0.999, 1e-8)
+    "lr_schedule": "constant" (default), "cosine" or "step"
+    "warmup_steps": 0            linear warmup over the first mini-batches
+    "decay_epochs", "decay_rate" step: multiply by decay_rate every decay_epochs (1, 0.5)
+    "min_lr": 0.0                cosine: final learning rate
+Local training restarts every round from the global weights, so the optimizer
+state and the schedule also restart with each train() call. When one run is
+split over several train() calls (multi-process training's averaging periods),
+begin() takes the run's total epochs and the step the call starts at, so the
+schedule spans the whole run.
+"""
+import math
+import numpy as np
+
+SCHEDULES = ("constant", "cosine", "step")
+
+
+class Schedule:
+    """Learning rate at each step (mini-batch) of a training run, with optional linear warmup."""
+    def __init__(self, learning_rate, kind="constant", warmup_steps=0, decay_epochs=1, decay_rate=0.5, min_lr=0.0):
+        if kind not in SCHEDULES:
+            raise ValueError(f"Unknown lr_schedule: {kind}")
+        self.learning_rate = learning_rate
+        self.kind = kind
+        self.warmup_steps = warmup_steps
+        self.decay_epochs = decay_epochs
+        self.decay_rate = decay_rate
+        self.min_lr = min_lr
+        self.steps_per_epoch = None
+        self.epochs = 1
+
+    def begin(self, epochs, steps_per_epoch=None):
+        """Start a run; steps_per_epoch may be None until the first epoch of a stream has been counted."""
+        self.epochs = max(1, epochs)
+        self.steps_per_epoch = steps_per_epoch
+
+    def rate(self, step):
+        lr = self.learning_rate
+        if step < self.warmup_steps:
+            return lr * (step + 1) / self.warmup_steps
+        if self.kind == "constant" or not self.steps_per_epoch:
+            return lr
+        if self.kind == "step":
+            return lr * self.decay_rate ** (step // (self.decay_epochs * self.steps_per_epoch))
+        # Cosine annealing (Loshchilov & Hutter 2017) from the end of warmup to the end of the run
+        total = self.epochs * self.steps_per_epoch - self.warmup_steps
+        progress = min(1.0, (step - self.warmup_steps) / total) if total > 0 else 1.0
+        return self.min_lr + 0.5 * (lr - self.min_lr) * (1 + math.cos(math.pi * progress))
+
+
+class SGD:
+    """
+    Mini-batch SGD, optionally with heavy-ball momentum (Polyak 1964) or Nesterov
+    momentum in the form of Sutskever et al. (2013): v = mu v + g, and the step
+    is lr * v, or lr * (g + mu v) with Nesterov.
+    """
+    def __init__(self, schedule, momentum=0.0, nesterov=False):
+        self.schedule = schedule
+        self.momentum = momentum
+        self.nesterov = nesterov
+        self.t = 0
+
+    def begin(self, weights, epochs, steps_per_epoch=None, start_step=0):
+        self.t = 0
+        self.start_step = start_step
+        self.schedule.begin(epochs, steps_per_epoch)
+        if self.momentum:
+            self.velocity = np.zeros(weights.shape, dtype=weights.dtype)
+            self.scratch = np.empty(weights.shape, dtype=weights.dtype)
+
+    def step(self, weights, grads):
+        lr = self.schedule.rate(self.start_step + self.t)
+        self.t += 1
+        if not self.momentum:
+            grads *= lr
+            weights -= grads
+            return
+        v = self.velocity
+        v *= self.momentum
+        v += grads
+        if self.nesterov:
+            np.multiply(v, self.momentum, out=self.scratch)
+            grads += self.scratch
+            grads *= lr
+            weights -= grads
+        else:
+            np.multiply(v, lr, out=grads)
+            weights -= grads
+
+
+class Adam:
+    """Adam (Kingma & Ba 2015, Algorithm 1) with bias-corrected moment estimates."""
+    def __init__(self, schedule, beta1=0.9, beta2=0.999, epsilon=1e-8):
+        self.schedule = schedule
+        self.beta1 = beta1
+        self.beta2 = beta2
+        self.epsilon = epsilon
+        self.t = 0
+
+    def begin(self, weights, epochs, steps_per_epoch=None, start_step=0):
+        # The moments restart at zero, so the bias correction counts from this call's first step
+        self.t = 0
+        self.start_step = start_step
+        self.schedule.begin(epochs, steps_per_epoch)
+        self.m = np.zeros(weights.shape, dtype=weights.dtype)
+        self.v = np.zeros(weights.shape, dtype=weights.dtype)
+        self.scratch = np.empty(weights.shape, dtype=weights.dtype)
+
+    def step(self, weights, grads):
+        lr = self.schedule.rate(self.start_step + self.t)
+        self.t += 1
+        m, v, s = self.m, self.v, self.scratch
+        # m = beta1 m + (1 - beta1) g
+        m *= self.beta1
+        np.multiply(grads, 1 - self.beta1, out=s)
+        m += s
+        # v = beta2 v + (1 - beta2) g^2
+        v *= self.beta2
+        np.multiply(grads, grads, out=s)
+        s *= 1 - self.beta2
+        v += s
+        # w -= lr m_hat / (sqrt(v_hat) + eps), with m_hat = m / (1 - beta1^t) and v_hat = v / (1 - beta2^t)
+        np.sqrt(v, out=s)
+        s *= 1 / math.sqrt(1 - self.beta2 ** self.t)
+        s += self.epsilon
+        np.divide(m, s, out=s)
+        s *= lr / (1 - self.beta1 ** self.t)
+        weights -= s
+
+
+def create_optimizer(config):
+    """The optimizer and schedule selected by the contract (see the module docstring)."""
+    params = config.get("training_params", {})
+    schedule = Schedule(
+        config["learning_rate"],
+        kind=params.get("lr_schedule", "constant"),
+        warmup_steps=params.get("warmup_steps", 0),
+        decay_epochs=params.get("decay_epochs", 1),
+        decay_rate=params.get("decay_rate", 0.5),
+        min_lr=params.get("min_lr", 0.0),
+    )
+    name = params.get("optimizer", "sgd")
+    if name == "sgd":
+        return SGD(schedule)
+    if name in ("momentum", "nesterov"):
+        return SGD(schedule, momentum=params.get("momentum", 0.9), nesterov=name == "nesterov")
+    if name == "adam":
+        return Adam(schedule, params.get("beta1", 0.9), params.get("beta2", 0.999), params.get("epsilon", 1e-8))
+    raise ValueError(f"Unknown optimizer: {name}")
@@ -0,0 +1,131 @@
+"""
+Multi-process local training for a single client.
+Reference: Zinkevich, M., Weimer, M., Li, L., & Smola, A. (2010). "Parallelized Stochastic Gradient Descent." NeurIPS.
+
+The training set is sharded across a process pool. Each worker runs SGD on its
+shard for sync_every epochs, then the workers' weights are averaged (weighted
+by shard size) and every worker continues from the average. The learning-rate
+schedule spans all epochs of the run. Optimizer state (momentum, Adam moments)
+restarts at every averaging step, as the workers continue from new weights and
+a pool task may run on any worker process. Data and weights live in
+multiprocessing.shared_memory blocks, so nothing large is pickled.
+"""
+import contextlib
+import io
+import os
+import time
+import numpy as np
+from multiprocessing import get_context, shared_memory
+
+# Per-process state of pool workers, set by _init_worker
+_worker = {}
+
+
+def _attach(name, shape, dtype):
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _init_worker(model_class, config, data_spec, weights_spec, seed):
+    # Keep the workers' initialization messages out of the client's output
+    with contextlib.redirect_stdout(io.StringIO()):
+        model = model_class(config)
+    model.verbose = False
+    blocks = {}
+    for key, (name, shape, dtype) in dict(data_spec, weights=weights_spec).items():
+        blocks[key] = _attach(name, shape, dtype)
+    _worker.update(model=model, blocks=blocks)
+    np.random.seed((seed + os.getpid()) % (2 ** 32))
+
+
+def _run_period(rank, start, stop, epochs, epoch_offset, total_epochs):
+    """
+    Train on rows [start, stop) for a number of epochs, starting from the averaged
+    weights in row 0, at epoch epoch_offset of a schedule over total_epochs.
+    Returns the mini-batch steps taken.
+    """
+    model = _worker["model"]
+    X = _worker["blocks"]["X"][1]
+    y = _worker["blocks"]["y"][1]
+    weights = _worker["blocks"]["weights"][1]
+    model.set_weights_from_flat(weights[0])
+    model.epochs = epochs
+    model.epoch_offset = epoch_offset
+    model.schedule_epochs = total_epochs
+    model.train(X[start:stop], y[start:stop])
+    weights[rank + 1] = model.get_flat_weights()
+    return model.steps_run
+
+
+class ParallelTrainer:
+    """
+    Local SGD across worker processes with periodic model averaging (Zinkevich et al. 2010).
+    """
+    def __init__(self, config, workers, sync_every=1):
+        self.config = config
+        self.workers = workers
+        self.sync_every = max(1, int(sync_every))
+
+    def train(self, model, X, y):
+        """Train model on (X, y) with the worker pool; model ends with the averaged weights."""
+        n_samples = X.shape[0]
+        workers = max(1, min(self.workers, n_samples))
+        bounds = np.linspace(0, n_samples, workers + 1).astype(int)
+        shard_sizes = np.diff(bounds).astype(np.float64)
+        initial = model.get_flat_weights()
+        blocks = []
+        try:
+            # Row 0 holds the averaged weights, row r + 1 the weights of worker r
+            weights_shm, weights = self._share(blocks, np.zeros((workers + 1, initial.size)))
+            weights[0] = initial
+            data_spec = {}
+            for key, arr in (("X", X), ("y", np.asarray(y))):
+                shm, shared = self._share(blocks, arr)
+                data_spec[key] = (shm.name, shared.shape, shared.dtype.str)
+            weights_spec = (weights_shm.name, weights.shape, weights.dtype.str)
+            # Workers start from row 0, so the server weights need not be pickled to them
+            worker_config = dict(self.config, initial_weights=None)
+            initargs = (type(model), worker_config, data_spec, weights_spec, np.random.randint(2 ** 31))
+            with get_context().Pool(workers, initializer=_init_worker, initargs=initargs) as pool:
+                remaining = model.epochs
+                epoch_times = []
+                steps_run = 0
+                while remaining > 0:
+                    epochs = min(self.sync_every, remaining)
+                    start = time.perf_counter()
+                    offset = len(epoch_times)
+                    steps = pool.starmap(_run_period, [(r, bounds[r], bounds[r + 1], epochs, offset, model.epochs)
+                                                       for r in range(workers)])
+                    # Each worker steps through its own shard; the largest shard sets the count
+                    steps_run += max(steps)
+                    weights[0] = np.average(weights[1:], axis=0, weights=shard_sizes)
+                    # Epochs between averaging steps run together, so each gets an equal share
+                    epoch_times += [(time.perf_counter() - start) / epochs] * epochs
+                    remaining -= epochs
+                    if model.epoch_callback is not None:
+                        # Early stopping sees the averaged weights, once per averaging period
+                        model.set_weights_from_flat(weights[0])
+                        if model.epoch_callback(len(epoch_times) - 1):
+                            break
+            model.set_weights_from_flat(weights[0].copy())
+            model.is_trained = True
+            model.epoch_times = epoch_times
+            model.epochs_run = len(epoch_times)
+            model.steps_run = steps_run
+            print(f"Trained on {n_samples} samples with {workers} worker processes "
+                  f"(averaging every {self.sync_every} epoch(s))")
+        finally:
+            for shm in blocks:
+                shm.close()
+                shm.unlink()
+        return model
+
+    @staticmethod
+    def _share(blocks, arr):
+        """Copy arr into a new shared memory block and return (shm, shared array)."""
+        arr = np.ascontiguousarray(arr)
+        shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        blocks.append(shm)
+        shared = np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)
+        shared[...] = arr
+        return shm, shared
@@ -0,0 +1,217 @@
+"""
+Simulate many federated clients in one process against a real server.
+Reference: Hsu, T. H., Qi, H., & Brown, M. (2019). "Measuring the Effects of Non-Identical
+Data Distribution for Federated Visual Classification." arXiv:1909.06335.
+
+Each simulated client is a FederatedClient with its own client id and in-memory
+storage, trained on its partition of a dataset. The dataset is partitioned IID
+(equal random shards) or non-IID, with each class spread over clients by
+Dirichlet(alpha) proportions (Hsu et al. 2019); smaller alpha is more skewed.
+"""
+import contextlib
+import glob
+import io
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import requests
+from .api import ServerAPI
+from .client import FederatedClient
+from .data_loader import DataLoader
+from .storage import MemoryStorage
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Server", "server.py")
+
+
+def partition_iid(n_samples, n_clients, rng):
+    """Split row indices into n_clients random shards of (almost) equal size."""
+    return np.array_split(rng.permutation(n_samples), n_clients)
+
+
+def partition_dirichlet(y, n_clients, alpha, rng, min_samples=10, max_tries=100):
+    """
+    Label-skewed split (Hsu et al. 2019): the rows of each class are divided among
+    clients in proportions drawn from Dirichlet(alpha). Draws are repeated until
+    every client has at least min_samples rows.
+    """
+    y = np.asarray(y)
+    classes = np.unique(y)
+    for _ in range(max_tries):
+        shards = [[] for _ in range(n_clients)]
+        for c in classes:
+            rows = rng.permutation(np.flatnonzero(y == c))
+            proportions = rng.dirichlet(np.full(n_clients, alpha))
+            cuts = (np.cumsum(proportions)[:-1] * rows.shape[0]).astype(int)
+            for shard, part in zip(shards, np.split(rows, cuts)):
+                shard.append(part)
+        shards = [np.concatenate(parts) for parts in shards]
+        if min(s.shape[0] for s in shards) >= min_samples:
+            return shards
+    raise ValueError(f"Could not give each of {n_clients} clients {min_samples} samples with alpha={alpha}; "
+                     "use fewer clients or a larger alpha")
+
+
+def load_dataset(config, data_path):
+    """Load one CSV, or every CSV in a directory, with the contract's columns."""
+    paths = sorted(glob.glob(os.path.join(data_path, "*.csv"))) if os.path.isdir(data_path) else [data_path]
+    if not paths:
+        raise FileNotFoundError(f"No CSV files in {data_path}")
+    loader = DataLoader(config)
+    arrays = [loader.load_data(path) for path in paths]
+    X = np.concatenate([np.asarray(X) for X, _ in arrays])
+    y = np.concatenate([np.asarray(y) for _, y in arrays])
+    return X, y
+
+
+class ServerProcess:
+    """
+    Runs Server/server.py as a child process on a local port and samples its
+    memory from /proc (Linux); memory is reported as None elsewhere.
+    """
+    def __init__(self, port, min_clients, threads):
+        self.url = f"http://127.0.0.1:{port}"
+        cmd = [sys.executable, SERVER_SCRIPT, "--port", str(port),
+               "--min-clients", str(min_clients), "--threads", str(threads)]
+        self.process = subprocess.Popen(cmd, cwd=os.path.dirname(SERVER_SCRIPT),
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self._wait_ready()
+
+    def _wait_ready(self, timeout=30):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Server exited with code {self.process.returncode}")
+            try:
+                if requests.get(f"{self.url}/codes", timeout=1).status_code == 200:
+                    return
+            except requests.ConnectionError:
+                pass
+            time.sleep(0.1)
+        self.stop()
+        raise RuntimeError(f"Server did not start on {self.url}")
+
+    def memory(self):
+        """Current and peak resident memory of the server in bytes, or (None, None)."""
+        try:
+            with open(f"/proc/{self.process.pid}/status") as f:
+                fields = dict(line.split(":", 1) for line in f if ":" in line)
+            return int(fields["VmRSS"].split()[0]) * 1024, int(fields["VmHWM"].split()[0]) * 1024
+        except (OSError, KeyError, ValueError):
+            return None, None
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait(timeout=10)
+
+
+class SimulatedClient:
+    """A FederatedClient with in-memory state and its own data partition."""
+    def __init__(self, index, server_url, X, y):
+        self.client = FederatedClient(
+            server_url, client_id=f"sim-{index:05d}",
+            user={"username": f"sim-{index:05d}", "email": f"sim-{index:05d}@example.com"},
+            storage=MemoryStorage()
+        )
+        self.X = X
+        self.y = y
+
+    def run_round(self, join_code, first):
+        """Join (first round only), sync, train and upload. Returns per-phase seconds."""
+        timings = {}
+        start = time.perf_counter()
+        if first:
+            self.client.join_round(join_code)
+            timings["join"] = time.perf_counter() - start
+            start = time.perf_counter()
+        self.client.setup()
+        timings["sync"] = time.perf_counter() - start
+        start = time.perf_counter()
+        self.client.train_arrays(self.X, self.y)
+        timings["train"] = time.perf_counter() - start
+        start = time.perf_counter()
+        self.client.upload()
+        timings["upload"] = time.perf_counter() - start
+        return timings
+
+
+def percentiles(values):
+    values = np.asarray(values)
+    return {f"p{q}": float(np.percentile(values, q)) for q in (50, 95, 99)}
+
+
+def simulate(data_path, clients=100, rounds=1, partition="iid", alpha=0.5, concurrency=32,
+             join_code="ABC123", port=3397, server_url=None, seed=0, verbose=False):
+    """
+    Run rounds of clients concurrently against a server and return a report with
+    per-round latency, throughput, per-phase latency percentiles and server memory.
+    A server is started on the given local port unless server_url is given.
+    """
+    server = None if server_url else ServerProcess(port, min_clients=clients, threads=concurrency)
+    url = server_url or server.url
+    quiet = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    try:
+        with quiet:
+            config = ServerAPI(url).join_round(join_code)
+            X, y = load_dataset(config, data_path)
+        rng = np.random.default_rng(seed)
+        if partition == "iid":
+            shards = partition_iid(X.shape[0], clients, rng)
+        else:
+            shards = partition_dirichlet(y, clients, alpha, rng)
+        sims = [SimulatedClient(i, url, X[rows], y[rows]) for i, rows in enumerate(shards)]
+        report = {
+            "clients": clients, "partition": partition, "samples": int(X.shape[0]),
+            "concurrency": concurrency, "rounds": [],
+            "server_memory_idle": server.memory()[0] if server else None,
+        }
+        peak_rss = [0]
+        stop_sampling = threading.Event()
+
+        def sample_memory():
+            while not stop_sampling.wait(0.05):
+                rss = server.memory()[0]
+                peak_rss[0] = max(peak_rss[0], rss or 0)
+
+        if server:
+            threading.Thread(target=sample_memory, daemon=True).start()
+        for r in range(rounds):
+            start = time.perf_counter()
+            with quiet, ThreadPoolExecutor(concurrency) as pool:
+                timings = list(pool.map(lambda sim: sim.run_round(join_code, r == 0), sims))
+            elapsed = time.perf_counter() - start
+            with quiet:
+                round_id = ServerAPI(url).sync_contract(join_code)["round_id"]
+            phases = {phase: percentiles([t[phase] for t in timings]) for phase in timings[0]}
+            report["rounds"].append({
+                "round_id": round_id, "latency_sec": elapsed,
+                "uploads_per_sec": clients / elapsed,
+                "samples_per_sec": float(sum(sim.X.shape[0] for sim in sims)) / elapsed,
+                "phases": phases,
+                "server_rss": server.memory()[0] if server else None,
+            })
+        stop_sampling.set()
+        if server:
+            report["server_memory_peak"] = max(peak_rss[0], server.memory()[1] or 0)
+        return report
+    finally:
+        if server:
+            server.stop()
+
+
+def print_report(report):
+    mb = lambda n: f"{n / 2 ** 20:.1f} MB" if n else "n/a"  # noqa: E731
+    print(f"{report['clients']} clients, {report['samples']} samples ({report['partition']}), "
+          f"concurrency {report['concurrency']}")
+    for i, r in enumerate(report["rounds"], 1):
+        print(f"Round {i}: {r['latency_sec']:.2f}s, {r['uploads_per_sec']:.1f} uploads/s, "
+              f"{r['samples_per_sec']:,.0f} samples/s, server now at round {r['round_id']}, "
+              f"server RSS {mb(r['server_rss'])}")
+        for phase, p in r["phases"].items():
+            print(f"  {phase:<7} p50 {p['p50'] * 1000:8.1f} ms  p95 {p['p95'] * 1000:8.1f} ms  "
+                  f"p99 {p['p99'] * 1000:8.1f} ms")
+    print(f"Server memory: idle {mb(report['server_memory_idle'])}, "
+          f"peak {mb(report.get('server_memory_peak'))}")
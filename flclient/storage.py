@@ -0,0 +1,97 @@
+"""
+Client state storage: the synced contract, the last training result and the
+compression residual. Model weights are kept as WeightVectors next to the JSON
+documents, so they are never written as float lists.
+"""
+import json
+import os
+import numpy as np
+from . import wire
+from .weights import WeightVector
+
+
+class FileStorage:
+    """
+    Keeps client state as files in a directory (the package directory by default,
+    where the CLI has always written contract.json and result.json).
+    """
+    def __init__(self, directory=None):
+        self.directory = directory or os.path.dirname(__file__)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def load_json(self, name):
+        """Load a JSON document, or None if it does not exist."""
+        try:
+            with open(self.path(name), "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save_json(self, name, data):
+        with open(self.path(name), "w") as f:
+            json.dump(data, f, indent=2, default=wire.json_default)
+
+    def load_array(self, name):
+        """Load an array saved with save_array, or None if it does not exist."""
+        path = self.path(name) + ".npy"
+        if not os.path.exists(path):
+            return None
+        return np.load(path)
+
+    def save_array(self, name, arr):
+        np.save(self.path(name) + ".npy", arr)
+
+    def load_weights(self, name):
+        """Load a WeightVector saved with save_weights, or None if it does not exist."""
+        try:
+            with open(self.path(name) + ".flw", "rb") as f:
+                message = wire.decode(f.read())
+        except FileNotFoundError:
+            return None
+        return WeightVector(message["layout"], message["weights"])
+
+    def save_weights(self, name, weights):
+        """Save a WeightVector and its layout as a binary wire message, name.flw."""
+        with open(self.path(name) + ".flw", "wb") as f:
+            f.write(wire.encode({"layout": weights.layout, "weights": weights}))
+
+    def remove_weights(self, name):
+        try:
+            os.remove(self.path(name) + ".flw")
+        except FileNotFoundError:
+            pass
+
+
+class MemoryStorage:
+    """
+    Keeps client state in memory, so many clients can run in one process.
+    Documents are stored as given, without a JSON round trip.
+    """
+    def __init__(self):
+        self.documents = {}
+        self.arrays = {}
+        self.weights = {}
+
+    def load_json(self, name):
+        data = self.documents.get(name)
+        return dict(data) if data is not None else None
+
+    def save_json(self, name, data):
+        self.documents[name] = dict(data)
+
+    def load_array(self, name):
+        return self.arrays.get(name)
+
+    def save_array(self, name, arr):
+        self.arrays[name] = arr
+
+    def load_weights(self, name):
+        return self.weights.get(name)
+
+    def save_weights(self, name, weights):
+        self.weights[name] = weights
+
+    def remove_weights(self, name):
+        self.weights.pop(name, None)
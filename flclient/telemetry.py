@@ -0,0 +1,35 @@
+"""
+Client-side training telemetry: wall-clock time per phase of a round, training
+throughput and peak memory, reported to the server in training_metadata.
+"""
+import contextlib
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class PhaseTimer:
+    """Accumulates wall-clock seconds per named phase."""
+    def __init__(self):
+        self.timings = {}
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+
+def peak_rss_bytes():
+    """Peak resident memory of this process in bytes, or None where it is not available."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
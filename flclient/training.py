@@ -1,11 +1,16 @@
 """
 Reference: Bottou, L. (2010). "Large-Scale Machine Learning with Stochastic Gradient Descent." Proceedings of COMPSTAT'2010, 177-186.
+Early stopping: Prechelt, L. (1998). "Early Stopping - But When?" In Neural Networks: Tricks of the Trade, Springer, 55-69.
 """
+import math
+import os
 import time
 import numpy as np
 from .models.mlp import MLPModel
 from .models.logistic_regression import LogisticRegressionModel
 from .data_loader import DataLoader
+from .parallel import ParallelTrainer
+from .telemetry import PhaseTimer, peak_rss_bytes
 
 
 def create_model(config):
@@ -22,6 +27,70 @@ def create_model(config):
         raise ValueError(f"Unknown model type: {model_type}")
 
 
+class EarlyStopping:
+    """
+    Epoch callback (BaseModel.epoch_callback) that ends local training early:
+    when the loss on the validation rows has not improved by more than min_delta
+    for patience epochs (Prechelt 1998), when it is not finite (training
+    diverged), or when one more epoch would overrun the time budget (at the
+    average epoch time so far) or the sample budget.
+    finish() puts back the weights of the epoch with the lowest validation loss.
+    """
+    def __init__(self, model, X_val=None, y_val=None, patience=2, min_delta=0.0,
+                 time_budget=None, sample_budget=None, samples_per_epoch=None):
+        self.model = model
+        self.X_val = X_val
+        self.y_val = y_val
+        self.patience = patience
+        self.min_delta = min_delta
+        self.time_budget = time_budget
+        self.sample_budget = sample_budget
+        # Known up front for in-memory data; set after the first epoch when streaming
+        self.samples_per_epoch = samples_per_epoch
+        self.val_losses = []
+        self.best_loss = math.inf
+        self.best_epoch = None
+        self.best_weights = None
+        # None, "plateau", "diverged", "time_budget" or "sample_budget"
+        self.stop_reason = None
+        self.start = time.perf_counter()
+
+    def __call__(self, epoch):
+        if self.X_val is not None and len(self.X_val):
+            loss = float(self.model.loss(self.X_val, self.y_val))
+            # JSON has no NaN or infinity, so a diverged loss is reported as null
+            self.val_losses.append(loss if math.isfinite(loss) else None)
+            if not math.isfinite(loss):
+                self.stop_reason = "diverged"
+                return True
+            if loss < self.best_loss - self.min_delta:
+                self.best_loss = loss
+                self.best_epoch = epoch
+                self.best_weights = self.model.get_flat_weights()
+            elif self.best_epoch is not None and epoch - self.best_epoch >= self.patience:
+                self.stop_reason = "plateau"
+                return True
+        done = epoch + 1
+        if self.time_budget is not None:
+            elapsed = time.perf_counter() - self.start
+            if elapsed + elapsed / done > self.time_budget:
+                self.stop_reason = "time_budget"
+                return True
+        if self.sample_budget is not None and self.samples_per_epoch:
+            if (done + 1) * self.samples_per_epoch > self.sample_budget:
+                self.stop_reason = "sample_budget"
+                return True
+        return False
+
+    def finish(self):
+        """Restore the best epoch's weights if training went on past it."""
+        self.model.epoch_callback = None
+        if self.best_weights is not None and self.best_epoch < self.model.epochs_run - 1:
+            self.model.set_weights_from_flat(self.best_weights)
+            print(f"Restored the weights of epoch {self.best_epoch + 1} "
+                  f"(validation loss {self.best_loss:.4f})")
+
+
 class TrainingManager:
     """
     Manages model training and evaluation.
@@ -31,6 +100,16 @@ class TrainingManager:
         self.config = config
         self.model = None
         self.data_loader = None
+        tp = config.get("training_params", {})
+        # Stop when the loss on the held-out split plateaus (see EarlyStopping)
+        self.early_stopping = tp.get("early_stopping", False)
+        self.patience = tp.get("patience", 2)
+        self.min_delta = tp.get("min_delta", 0.0)
+        # Local work budgets: wall-clock seconds of training and training samples processed
+        # (epochs x rows). The contract sets them; a client can override them, e.g. train --time-budget
+        self.time_budget = tp.get("time_budget_sec")
+        self.sample_budget = tp.get("sample_budget")
+        self.stopper = None
     
     def setup(self):
         """
@@ -48,30 +127,138 @@ class TrainingManager:
             raise ValueError("Must setup first")
         
         print(f"Training on {data_path}")
+        timer = PhaseTimer()
+        if self.data_loader.streaming:
+            start_time = time.time()
+            accuracy, num_samples = self._train_streaming(data_path, timer)
+            return self._metadata(time.time() - start_time, accuracy, num_samples, timer)
         start_time = time.time()
+        with timer.phase("load"):
+            X, y = self.data_loader.load_data(data_path)
+        return self.train_arrays(X, y, timer, start_time)
+    
+    def train_arrays(self, X, y, timer=None, start_time=None):
+        """
+        Train and evaluate on in-memory arrays, split as in DataLoader.split_data.
+        Phase timings are added to timer (a telemetry.PhaseTimer) if given.
+        """
+        if not self.model or not self.data_loader:
+            raise ValueError("Must setup first")
         
-        X, y = self.data_loader.load_data(data_path)
-        X_train, X_test, y_train, y_test = self.data_loader.split_data(X, y)
+        timer = timer or PhaseTimer()
+        start_time = start_time or time.time()
+        with timer.phase("split"):
+            X_train, X_test, y_train, y_test = self.data_loader.split_data(X, y)
         
-        # Model training using SGD (Bottou, 2010)
-        self.model.train(X_train, y_train)
+        # Model training using SGD (Bottou, 2010), on several processes if configured
+        n_train = int(X_train.shape[0])
+        self._start_epochs(X_test, y_test, n_train)
+        workers = self._workers()
+        with timer.phase("train"):
+            if workers > 1:
+                sync_every = self.config.get("training_params", {}).get("sync_every", 1)
+                ParallelTrainer(self.config, workers, sync_every).train(self.model, X_train, y_train)
+            else:
+                self.model.train(X_train, y_train)
+            self.stopper.finish()
         
         # Model evaluation
-        predictions = self.model.predict(X_test)
-        accuracy = np.mean(predictions == y_test)
-        
-        training_time = time.time() - start_time
-        
+        with timer.phase("eval"):
+            predictions = self.model.predict(X_test)
+            accuracy = np.mean(predictions == y_test)
+        return self._metadata(time.time() - start_time, accuracy, int(X_train.shape[0]), timer)
+    
+    def _start_epochs(self, X_val, y_val, n_train=None):
+        """
+        Pick the number of local epochs and install the EarlyStopping callback.
+        With the training size known, a sample budget caps the epochs up front, so
+        learning-rate schedules plan for the epochs that will actually run.
+        """
+        epochs = self.config["epochs"]
+        stopper = EarlyStopping(
+            self.model, X_val if self.early_stopping else None, y_val, self.patience, self.min_delta,
+            self.time_budget, self.sample_budget, n_train)
+        if self.sample_budget is not None and n_train:
+            affordable = max(1, int(self.sample_budget // n_train))
+            if affordable < epochs:
+                epochs = affordable
+                stopper.stop_reason = "sample_budget"
+        self.model.epochs = epochs
+        self.model.epoch_callback = stopper
+        self.stopper = stopper
+
+    def _metadata(self, training_time, accuracy, num_samples, timer):
+        train_time = timer.timings.get("train", 0.0)
+        epochs_run = self.model.epochs_run
         metadata = {
             "model_type": self.config["model_type"],
             "training_time": training_time,
             "accuracy": accuracy,
-            "epochs": self.config["epochs"]
+            # Epochs actually run; early stopping and budgets can end training before epochs_planned
+            "epochs": epochs_run,
+            "epochs_planned": self.config["epochs"],
+            # Mini-batch steps, which the server's FedNova aggregation normalizes updates by
+            "local_steps": self.model.steps_run,
+            "stop_reason": self.stopper.stop_reason if self.stopper else None,
+            "val_losses": list(self.stopper.val_losses) if self.stopper else [],
+            "num_samples": num_samples,
+            "timings": dict(timer.timings),
+            "epoch_times": list(self.model.epoch_times),
+            # Training samples processed per second of SGD, over all epochs
+            "samples_per_sec": num_samples * epochs_run / train_time if train_time > 0 else None,
+            "peak_rss_bytes": peak_rss_bytes(),
         }
         
-        print(f"Training completed in {training_time:.2f}s, Accuracy: {accuracy:.4f}")
+        stopped = f" (stopped after {epochs_run}/{self.config['epochs']} epochs: {metadata['stop_reason']})" \
+            if metadata["stop_reason"] else ""
+        print(f"Training completed in {training_time:.2f}s, Accuracy: {accuracy:.4f}{stopped}")
         return metadata
     
+    def _workers(self):
+        """
+        Number of training processes from training_params.workers; 0 means one per CPU core.
+        """
+        workers = self.config.get("training_params", {}).get("workers", 1)
+        if workers == 0:
+            workers = os.cpu_count() or 1
+        return max(1, int(workers))
+    
+    def _train_streaming(self, data_path, timer):
+        """
+        Train on mini-batches streamed from the CSV and evaluate on the streamed
+        test split, keeping memory bounded by the loader's chunk size. Loading and
+        splitting are interleaved with training, so they count as train and eval time.
+        """
+        loader = self.data_loader
+        counts = {"train": 0}
+        # Early stopping validates on the first chunk of the test split, kept in memory
+        X_val = y_val = None
+        if self.early_stopping:
+            X_val, y_val = next(loader.iter_chunks(data_path, split="test"), (None, None))
+        self._start_epochs(X_val, y_val)
+        
+        def make_batches():
+            counts["train"] = 0
+            for X_batch, y_batch in loader.iter_batches(data_path, self.config["batch_size"], "train"):
+                counts["train"] += X_batch.shape[0]
+                yield X_batch, y_batch
+            self.stopper.samples_per_epoch = counts["train"]
+        
+        # Model training using SGD (Bottou, 2010)
+        with timer.phase("train"):
+            self.model.train_stream(make_batches)
+            self.stopper.finish()
+        
+        # Model evaluation on the streamed test split
+        correct = total = 0
+        with timer.phase("eval"):
+            for X_test, y_test in loader.iter_chunks(data_path, split="test"):
+                correct += int(np.sum(self.model.predict(X_test) == y_test))
+                total += X_test.shape[0]
+        accuracy = correct / total if total else 0.0
+        print(f"Streamed {counts['train']} training and {total} test samples from {data_path}")
+        return accuracy, counts["train"]
+    
     def get_weights(self):
         """
         Get model weights for upload.
@@ -0,0 +1,209 @@
+"""
+Model weights as one contiguous buffer with a named layer manifest, shared by
+the models, client storage and the server.
+
+A layout is a sequence of (name, shape) pairs in buffer order, e.g. for the MLP
+
+    (("W_ih", (10, 32)), ("b_h", (1, 32)), ("W_ho", (32, 1)), ("b_o", (1, 1)))
+
+or, for a contract with "hidden_layers": [64, 32],
+
+    (("W_h1", (10, 64)), ("b_h1", (1, 64)), ("W_h2", (64, 32)), ("b_h2", (1, 32)),
+     ("W_ho", (32, 1)), ("b_o", (1, 1)))
+
+A WeightVector is the flat float64 array itself (an ndarray subclass carrying
+its layout), so it is averaged, delta-encoded and sent in the wire format as
+is. layer(name) and unpack() return reshaped views into it: a model trains on
+the views and its flat weights are always up to date, without concatenating.
+Weights become Python float lists only at the JSON edge (wire.json_default).
+
+The server and the models both build a contract's layout with layout_for and
+its initial weights with init_weights, so the two cannot drift apart.
+Initialization: Glorot, X., & Bengio, Y. (2010). "Understanding the difficulty of training deep
+feedforward neural networks." AISTATS; He, K., Zhang, X., Ren, S., & Sun, J. (2015). "Delving Deep
+into Rectifiers." ICCV.
+"""
+import math
+import numpy as np
+
+# Weight matrices (W_*, beta) are initialized uniformly in [-limit, limit]; biases start at zero.
+# The limit is INIT_SCALE before sigmoid units, Glorot's for tanh and He's for ReLU
+INIT_SCALE = 0.1
+ACTIVATIONS = ("sigmoid", "tanh", "relu")
+
+# layout -> ((name, start, stop, shape), ...), computed once per layout
+_offsets = {}
+
+
+def normalize_layout(layout):
+    """Layout as a hashable tuple of (name, shape tuple), e.g. after a JSON round trip."""
+    return tuple((name, tuple(int(d) for d in shape)) for name, shape in layout)
+
+
+def layout_offsets(layout):
+    entry = _offsets.get(layout)
+    if entry is None:
+        entry, start = [], 0
+        for name, shape in layout:
+            stop = start + int(np.prod(shape, dtype=np.int64))
+            entry.append((name, start, stop, shape))
+            start = stop
+        entry = _offsets[layout] = tuple(entry)
+    return entry
+
+
+def layout_size(layout):
+    offsets = layout_offsets(normalize_layout(layout))
+    return offsets[-1][2] if offsets else 0
+
+
+def mlp_stack(config):
+    """
+    The MLP's hidden layers as (units, activation) pairs, from the contract's
+    "hidden_layers": a list of widths, all with the contract's "activation"
+    (default "sigmoid"), or of {"units": ..., "activation": ...} dicts. Without
+    it, one sigmoid layer of "hidden_size" units. The output is always one sigmoid unit.
+    """
+    hidden_layers = config.get("hidden_layers")
+    default = config.get("activation", "sigmoid")
+    if hidden_layers is None:
+        hidden_layers = [config.get("hidden_size", 32)]
+    stack = []
+    for layer in hidden_layers:
+        if isinstance(layer, dict):
+            units, activation = layer["units"], layer.get("activation", default)
+        else:
+            units, activation = layer, default
+        if activation not in ACTIVATIONS:
+            raise ValueError(f"Unknown activation: {activation} (expected one of {', '.join(ACTIVATIONS)})")
+        if int(units) <= 0:
+            raise ValueError(f"Hidden layers need at least one unit, got {units}")
+        stack.append((int(units), activation))
+    if not stack:
+        raise ValueError("The MLP needs at least one hidden layer")
+    return stack
+
+
+def mlp_layout(input_size, hidden_sizes):
+    """
+    Layout of an MLP with hidden layers of the given widths (an int for one layer).
+    One hidden layer keeps the original W_ih/b_h names; deeper stacks number them W_h1, b_h1, ...
+    """
+    if isinstance(hidden_sizes, int):
+        hidden_sizes = [hidden_sizes]
+    if len(hidden_sizes) == 1:
+        names = [("W_ih", "b_h")]
+    else:
+        names = [(f"W_h{k}", f"b_h{k}") for k in range(1, len(hidden_sizes) + 1)]
+    layout, fan_in = [], input_size
+    for (weight, bias), units in zip(names, hidden_sizes):
+        layout += [(weight, (fan_in, units)), (bias, (1, units))]
+        fan_in = units
+    return tuple(layout) + (("W_ho", (fan_in, 1)), ("b_o", (1, 1)))
+
+
+def logistic_regression_layout(input_size):
+    return (("beta", (input_size, 1)), ("beta_0", (1,)))
+
+
+def layout_for(config):
+    """The weight layout of the model a contract describes."""
+    model_type = config["model_type"]
+    input_size = config.get("input_size", 10)
+    if model_type == "mlp":
+        return mlp_layout(input_size, [units for units, _ in mlp_stack(config)])
+    if model_type == "logistic_regression":
+        return logistic_regression_layout(input_size)
+    raise ValueError(f"Unknown model type: {model_type}")
+
+
+def init_limit(activation, fan_in, fan_out):
+    """Half-width of the uniform initialization of a weight matrix followed by activation."""
+    if activation == "relu":
+        return math.sqrt(6.0 / fan_in)
+    if activation == "tanh":
+        return math.sqrt(6.0 / (fan_in + fan_out))
+    return INIT_SCALE
+
+
+class WeightVector(np.ndarray):
+    """
+    Flat model weights with a layer manifest. WeightVector(layout, data) wraps
+    data (a 1-D array, list or raw float64 buffer of the layout's size) without
+    copying when it already is a float64 array; without data it is all zeros.
+    Slices and other derived arrays of a different size drop the layout.
+    """
+    def __new__(cls, layout, data=None, dtype=np.float64):
+        layout = normalize_layout(layout)
+        size = layout_size(layout)
+        if data is None:
+            flat = np.zeros(size, dtype=dtype)
+        else:
+            if isinstance(data, (bytes, bytearray, memoryview)):
+                data = np.frombuffer(data, dtype="<f8")
+            flat = np.asarray(data, dtype=dtype).reshape(-1)
+            if flat.size != size:
+                raise ValueError(f"Expected {size} weights for layout {[n for n, _ in layout]}, got {flat.size}")
+        obj = flat.view(cls)
+        obj.layout = layout
+        return obj
+
+    def __array_finalize__(self, obj):
+        layout = getattr(obj, "layout", None)
+        self.layout = layout if layout is not None and self.shape == obj.shape else None
+
+    def __array_wrap__(self, arr, context=None, return_scalar=False):
+        # Reductions (sum, max, ...) give scalars rather than 0-d weight vectors
+        if arr.ndim == 0:
+            return arr[()]
+        return super().__array_wrap__(arr, context)
+
+    def __reduce__(self):
+        # Pickle the plain buffer and the layout; ndarray.__reduce__ would drop the layout
+        return (WeightVector, (self.layout, np.asarray(self), self.dtype))
+
+    def layer(self, name):
+        """Zero-copy view of one layer, in its shape."""
+        for layer_name, start, stop, shape in layout_offsets(self.layout):
+            if layer_name == name:
+                return self[start:stop].view(np.ndarray).reshape(shape)
+        raise KeyError(name)
+
+    def unpack(self):
+        """Zero-copy views of all layers, in layout order."""
+        flat = self.view(np.ndarray)
+        return [flat[start:stop].reshape(shape) for _, start, stop, shape in layout_offsets(self.layout)]
+
+    def like(self, data):
+        """data (of the same size) as a WeightVector with this layout."""
+        return WeightVector(self.layout, data, dtype=self.dtype)
+
+
+def random_weights(layout, limits=None):
+    """
+    Weights of layout with every weight matrix uniform in [-limit, limit], the
+    limit taken from limits (layer name -> limit) or INIT_SCALE, and zero biases.
+    """
+    limits = limits or {}
+    weights = WeightVector(layout)
+    for (name, _), view in zip(weights.layout, weights.unpack()):
+        if name.startswith("W_") or name == "beta":
+            limit = limits.get(name, INIT_SCALE)
+            view[...] = np.random.uniform(-limit, limit, view.shape)
+    return weights
+
+
+def mlp_init_limits(layout, activations):
+    """Initialization limits of an MLP layout's weight matrices, given the activation after each."""
+    matrices = [(name, shape) for name, shape in layout if name.startswith("W_")]
+    return {name: init_limit(activation, fan_in, fan_out)
+            for (name, (fan_in, fan_out)), activation in zip(matrices, activations)}
+
+
+def init_weights(config):
+    """Random initial weights of the model a contract describes."""
+    layout = layout_for(config)
+    if config["model_type"] == "mlp":
+        activations = [activation for _, activation in mlp_stack(config)] + ["sigmoid"]
+        return random_weights(layout, mlp_init_limits(layout, activations))
+    return random_weights(layout)
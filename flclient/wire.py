@@ -0,0 +1,120 @@
+"""
+Binary wire format shared by the client and the server.
+
+A message is a JSON-compatible dict whose NumPy array values are sent as raw
+little-endian buffers instead of JSON float lists:
+
+    b"FLW1" | uint32 header length | JSON header | padding | array buffers
+
+The header holds the message fields, with each array replaced by
+{"__array__": i}, plus the dtype, shape and offset of every buffer. Buffers are
+8-byte aligned so they can be read zero-copy with np.frombuffer.
+"""
+import json
+import struct
+import numpy as np
+
+CONTENT_TYPE = "application/x-flaas"
+JSON_CONTENT_TYPE = "application/json"
+MAGIC = b"FLW1"
+_ALIGN = 8
+
+
+def _pad(n):
+    return (-n) % _ALIGN
+
+
+def encode(message):
+    """Encode a dict into the binary wire format."""
+    arrays = []
+
+    def extract(value):
+        if isinstance(value, np.ndarray):
+            arrays.append(np.ascontiguousarray(value, dtype=value.dtype.newbyteorder("<")))
+            return {"__array__": len(arrays) - 1}
+        if isinstance(value, dict):
+            return {k: extract(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [extract(v) for v in value]
+        return value
+
+    fields = extract(message)
+    specs = []
+    offset = 0
+    for arr in arrays:
+        specs.append({"dtype": arr.dtype.str, "shape": list(arr.shape), "offset": offset})
+        offset += arr.nbytes + _pad(arr.nbytes)
+    header = json.dumps({"fields": fields, "arrays": specs}, default=json_default).encode("utf-8")
+    prefix_len = len(MAGIC) + 4 + len(header)
+    parts = [MAGIC, struct.pack("<I", len(header)), header, b"\0" * _pad(prefix_len)]
+    for arr in arrays:
+        parts.append(arr.tobytes())
+        parts.append(b"\0" * _pad(arr.nbytes))
+    return b"".join(parts)
+
+
+def decode(buf):
+    """
+    Decode a binary wire message. Arrays are read-only views into buf.
+    Raises ValueError (or KeyError, struct.error) for a malformed message.
+    """
+    buf = memoryview(buf)
+    if bytes(buf[:4]) != MAGIC:
+        raise ValueError("Not a FLaaS wire message")
+    (header_len,) = struct.unpack_from("<I", buf, 4)
+    header_end = 8 + header_len
+    header = json.loads(bytes(buf[8:header_end]).decode("utf-8"))
+    if not isinstance(header, dict) or not isinstance(header.get("arrays"), list):
+        raise ValueError("Wire header must be an object with an arrays list")
+    data_start = header_end + _pad(header_end)
+    arrays = []
+    for spec in header["arrays"]:
+        if not isinstance(spec, dict):
+            raise ValueError("Wire array spec must be an object")
+        try:
+            dtype = np.dtype(spec["dtype"])
+            count = int(np.prod(spec["shape"], dtype=np.int64))
+            arr = np.frombuffer(buf, dtype=dtype, count=count, offset=data_start + spec["offset"])
+            arrays.append(arr.reshape(spec["shape"]))
+        except TypeError as e:
+            raise ValueError(f"Bad wire array spec: {e}") from e
+
+    def restore(value):
+        if isinstance(value, dict):
+            if set(value) == {"__array__"}:
+                index = value["__array__"]
+                if isinstance(index, bool) or not isinstance(index, int) or not 0 <= index < len(arrays):
+                    raise ValueError(f"Bad wire array index: {index!r}")
+                return arrays[index]
+            return {k: restore(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [restore(v) for v in value]
+        return value
+
+    fields = restore(header["fields"])
+    if not isinstance(fields, dict):
+        raise ValueError("Wire message fields must be an object")
+    return fields
+
+
+def json_default(obj):
+    """json.dump hook that converts NumPy values at the JSON edge."""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def as_weight_array(flat_weights):
+    """
+    Return flat weights as a writable float64 array.
+    Accepts a list, an ndarray (e.g. a read-only wire view) or raw little-endian float64 bytes.
+    """
+    if isinstance(flat_weights, (bytes, bytearray, memoryview)):
+        flat_weights = np.frombuffer(flat_weights, dtype="<f8")
+    flat = np.asarray(flat_weights, dtype=np.float64)
+    # Never hand out the caller's buffer: asarray of a WeightVector or other float64 array is a view of it
+    if not flat.flags.writeable or (isinstance(flat_weights, np.ndarray) and np.may_share_memory(flat, flat_weights)):
+        flat = flat.copy()
+    return flat.reshape(-1)
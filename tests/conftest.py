@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+# The server runs as a script from Server/, importing its modules as siblings
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "Server"))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def server_client():
+    import server
+    return server.app.test_client()
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from aggregation import FedAvg, Median, TrimmedMean
+
+
+@pytest.mark.parametrize("aggregator", [TrimmedMean(trim_ratio=0.25), Median()])
+def test_coordinate_wise_rejects_mismatched_update(aggregator):
+    aggregator.add(np.ones(4))
+    aggregator.add(np.ones(4))
+    with pytest.raises(ValueError):
+        aggregator.add(np.ones(5))
+    np.testing.assert_array_equal(aggregator.aggregate(np.zeros(4)), np.ones(4))
+
+
+@pytest.mark.parametrize("aggregator", [TrimmedMean(trim_ratio=0.25), Median()])
+def test_coordinate_wise_resizes_between_rounds(aggregator):
+    aggregator.add(np.ones(4))
+    aggregator.aggregate(np.zeros(4))
+    aggregator.reset()
+    for value in (1.0, 2.0, 3.0):
+        aggregator.add(np.full(5, value))
+    np.testing.assert_array_equal(aggregator.aggregate(np.zeros(5)), np.full(5, 2.0))
+
+
+def test_coordinate_wise_matches_numpy():
+    updates = np.random.default_rng(0).standard_normal((20, 7))
+    median = Median(capacity=2)
+    trimmed = TrimmedMean(trim_ratio=0.1, capacity=2)
+    for update in updates:
+        median.add(update)
+        trimmed.add(update)
+    np.testing.assert_allclose(median.aggregate(None), np.median(updates, axis=0))
+    expected = np.sort(updates, axis=0)[2:18].mean(axis=0)
+    np.testing.assert_allclose(trimmed.aggregate(None), expected)
+
+
+def test_fedavg_rejects_mismatched_update():
+    aggregator = FedAvg()
+    aggregator.add(np.ones(4))
+    with pytest.raises(ValueError):
+        aggregator.add(np.ones(5))
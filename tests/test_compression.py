@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from flclient.compression import compress_update, decompress_update
+
+
+@pytest.mark.parametrize("scheme", ["delta", "float16", "int8", "topk"])
+def test_roundtrip(scheme):
+    delta = np.random.default_rng(0).standard_normal(1000)
+    payload, residual = compress_update(delta, scheme, block_size=64, topk_ratio=0.1)
+    restored = decompress_update(payload)
+    assert restored.shape == delta.shape
+    if residual is None:
+        np.testing.assert_array_equal(restored, delta)
+    else:
+        np.testing.assert_allclose(restored + residual, delta)
+
+
+@pytest.mark.parametrize("payload", [
+    [1],
+    "int8",
+    {"scheme": "int8", "size": 4, "block_size": 0, "values": [1, 2, 3, 4], "scales": [1.0]},
+    {"scheme": "int8", "size": 4, "block_size": -2, "values": [1, 2, 3, 4], "scales": [1.0]},
+])
+def test_malformed_payload_raises_value_error(payload):
+    with pytest.raises(ValueError):
+        decompress_update(payload)
+
+
+@pytest.mark.parametrize("compressed_update", [
+    [1],
+    {"scheme": "int8", "block_size": 0, "values": [1], "scales": [1.0]},
+    {"scheme": "int8", "size": 4},
+])
+def test_server_rejects_malformed_compressed_update(server_client, compressed_update):
+    import server
+    server_client.post("/join", json={"join_code": "ABC123"})
+    round_id = server.state.round_id
+    if isinstance(compressed_update, dict) and "size" not in compressed_update:
+        compressed_update = dict(compressed_update, size=server.state.global_weights.size)
+    response = server_client.post("/upload", json={
+        "client_id": "c1", "round_id": round_id, "weights_tag": server.state.tag(round_id),
+        "compressed_update": compressed_update, "training_metadata": {"num_samples": 10},
+    })
+    assert response.status_code == 400
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from flclient.models.mlp import MLPModel
+
+
+def make_model(**training_params):
+    return MLPModel({"input_size": 3, "hidden_size": 4, "learning_rate": 0.1, "epochs": 2,
+                     "batch_size": 8, "training_params": training_params})
+
+
+@pytest.mark.parametrize("training_params", [{}, {"lr_schedule": "cosine"}, {"optimizer": "adam"}])
+def test_train_on_empty_split(training_params):
+    model = make_model(**training_params)
+    before = model.get_flat_weights().copy()
+    model.train(np.zeros((0, 3)), np.zeros(0))
+    assert model.is_trained
+    assert model.epochs_run == 2
+    assert model.steps_run == 0
+    np.testing.assert_array_equal(model.get_flat_weights(), before)
+
+
+def test_train_learns_separable_data():
+    rng = np.random.default_rng(0)
+    X = rng.standard_normal((400, 3))
+    y = (X[:, 0] > 0).astype(int)
+    np.random.seed(0)
+    model = make_model()
+    model.epochs = 20
+    model.verbose = False
+    model.train(X, y)
+    assert (model.predict(X).reshape(-1) == y).mean() > 0.9
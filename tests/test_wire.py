@@ -0,0 +1,51 @@
+import json
+import struct
+
+import numpy as np
+import pytest
+
+from flclient import wire
+
+
+def raw_message(header):
+    """A wire message with the given header and no array buffers."""
+    data = json.dumps(header).encode("utf-8")
+    return wire.MAGIC + struct.pack("<I", len(data)) + data
+
+
+def test_roundtrip():
+    message = {"client_id": "c1", "weights": np.arange(5.0), "nested": [{"a": np.ones((2, 2), dtype=np.float32)}]}
+    decoded = wire.decode(wire.encode(message))
+    assert decoded["client_id"] == "c1"
+    np.testing.assert_array_equal(decoded["weights"], message["weights"])
+    np.testing.assert_array_equal(decoded["nested"][0]["a"], message["nested"][0]["a"])
+
+
+@pytest.mark.parametrize("header", [
+    [1],
+    {"fields": {"weights": {"__array__": 3}}, "arrays": []},
+    {"fields": {"weights": {"__array__": "0"}}, "arrays": []},
+    {"fields": {}, "arrays": {}},
+    {"fields": {}, "arrays": [1]},
+    {"fields": {}, "arrays": [{"dtype": "nonsense", "shape": [1], "offset": 0}]},
+    {"fields": [1], "arrays": []},
+])
+def test_malformed_header_raises_value_error(header):
+    with pytest.raises(ValueError):
+        wire.decode(raw_message(header))
+
+
+@pytest.mark.parametrize("route", ["/join", "/sync", "/upload"])
+@pytest.mark.parametrize("header", [
+    [1],
+    {"fields": {"join_code": "ABC123", "weights": {"__array__": 3}}, "arrays": []},
+])
+def test_server_rejects_malformed_wire_body(server_client, route, header):
+    response = server_client.post(route, data=raw_message(header), content_type=wire.CONTENT_TYPE)
+    assert response.status_code in (400, 415)
+
+
+@pytest.mark.parametrize("route", ["/join", "/upload"])
+def test_server_rejects_non_object_json_body(server_client, route):
+    response = server_client.post(route, json=[1])
+    assert response.status_code in (400, 415)